@@ -0,0 +1,33 @@
+"""add keyset index on audit_logs resource timeline
+
+Revision ID: h2i3j4k5l6m7
+Revises: g1h2i3j4k5l6
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'h2i3j4k5l6m7'
+down_revision: Union[str, None] = 'g1h2i3j4k5l6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Serves cursor pagination of a resource's audit trail
+    # (newest first, id as tie-breaker)
+    op.create_index(
+        'idx_audit_logs_resource_created',
+        'audit_logs',
+        ['resource_type', 'resource_id', 'created_at', 'id'],
+        postgresql_ops={'created_at': 'DESC', 'id': 'DESC'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_audit_logs_resource_created', table_name='audit_logs')
@@ -0,0 +1,32 @@
+"""add index on invoice_items description for price history lookups
+
+Revision ID: i3j4k5l6m7n8
+Revises: h2i3j4k5l6m7
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'i3j4k5l6m7n8'
+down_revision: Union[str, None] = 'h2i3j4k5l6m7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Price alerts look up the history of every invoice item with
+    # description IN (...), which a B-tree index serves directly
+    op.create_index(
+        'idx_invoice_items_description',
+        'invoice_items',
+        ['description'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_invoice_items_description', table_name='invoice_items')
@@ -0,0 +1,48 @@
+"""add covering indexes for ai analyzer queries
+
+Revision ID: j4k5l6m7n8o9
+Revises: i3j4k5l6m7n8
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'j4k5l6m7n8o9'
+down_revision: Union[str, None] = 'i3j4k5l6m7n8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Per-user date-range scans (every analyzer stage) as index-only scans
+    op.create_index(
+        'idx_invoices_user_issue_date',
+        'invoices',
+        ['user_id', 'issue_date'],
+        postgresql_ops={'issue_date': 'DESC'},
+        postgresql_include=['merchant_id', 'total_value'],
+    )
+    # invoice -> items join used by the category/price aggregations
+    op.create_index(
+        'idx_invoice_items_invoice_covering',
+        'invoice_items',
+        ['invoice_id'],
+        postgresql_include=['category_name', 'total_price', 'unit_price'],
+    )
+    # Merchant peer comparison by category
+    op.create_index(
+        'idx_merchants_category',
+        'merchants',
+        ['category'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_merchants_category', table_name='merchants')
+    op.drop_index('idx_invoice_items_invoice_covering', table_name='invoice_items')
+    op.drop_index('idx_invoices_user_issue_date', table_name='invoices')
@@ -0,0 +1,38 @@
+"""index invoice_items by normalized description
+
+Revision ID: k5l6m7n8o9p0
+Revises: j4k5l6m7n8o9
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'k5l6m7n8o9p0'
+down_revision: Union[str, None] = 'j4k5l6m7n8o9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Price history now matches on lower(btrim(description)), so the plain
+    # description index is no longer used
+    op.drop_index('idx_invoice_items_description', table_name='invoice_items')
+    op.create_index(
+        'idx_invoice_items_description_key',
+        'invoice_items',
+        [sa.text('lower(btrim(description))')],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_invoice_items_description_key', table_name='invoice_items')
+    op.create_index(
+        'idx_invoice_items_description',
+        'invoice_items',
+        ['description'],
+    )
@@ -0,0 +1,31 @@
+"""add analyses user/type/created_at index
+
+Revision ID: l6m7n8o9p0q1
+Revises: k5l6m7n8o9p0
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'l6m7n8o9p0q1'
+down_revision: Union[str, None] = 'k5l6m7n8o9p0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Recent-analysis checks (monthly analyses, reusable purchase summaries)
+    op.create_index(
+        'idx_analyses_user_type_created',
+        'analyses',
+        ['user_id', 'type', 'created_at'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_analyses_user_type_created', table_name='analyses')
@@ -0,0 +1,43 @@
+"""add mv_user_month_totals materialized view
+
+Revision ID: m7n8o9p0q1r2
+Revises: l6m7n8o9p0q1
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'm7n8o9p0q1r2'
+down_revision: Union[str, None] = 'l6m7n8o9p0q1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Monthly spend per user, read by the AI analyzer for past months
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW mv_user_month_totals AS
+        SELECT user_id,
+               date_trunc('month', issue_date) AS month,
+               SUM(total_value) AS total
+        FROM invoices
+        GROUP BY 1, 2
+        """
+    )
+    # Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.create_index(
+        'uq_mv_user_month_totals_user_month',
+        'mv_user_month_totals',
+        ['user_id', 'month'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS mv_user_month_totals")
@@ -0,0 +1,35 @@
+"""add trigram index on invoice_items lower(description)
+
+Revision ID: n8o9p0q1r2s3
+Revises: m7n8o9p0q1r2
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'n8o9p0q1r2s3'
+down_revision: Union[str, None] = 'm7n8o9p0q1r2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Serves the keyword regex over past item descriptions (children
+    # spending history), which a btree cannot answer
+    op.create_index(
+        'idx_invoice_items_description_trgm',
+        'invoice_items',
+        [sa.text('lower(description) gin_trgm_ops')],
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    # pg_trgm is left installed; other objects may depend on it
+    op.drop_index('idx_invoice_items_description_trgm', table_name='invoice_items')
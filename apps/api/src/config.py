@@ -40,6 +40,7 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50  # Prompt cache pool size per worker
 
     # Database Connection Pool (Production optimization)
     DB_POOL_SIZE: int = 10  # Connections per worker (2 workers × 10 = 20 base)
@@ -63,14 +64,22 @@ class Settings(BaseSettings):
 
     # LLM Cache (Production optimization)
     LLM_CACHE_TTL: int = 86400  # Cache TTL in seconds (24 hours)
+    AI_ANALYSIS_CACHE_TTL: int = 604800  # Per-item analysis texts (7 days)
 
     # Rate Limiting (Production optimization)
     RATE_LIMIT_ENABLED: bool = True  # Master toggle for rate limiting
 
     # LLM Resilience (Production optimization)
     LLM_TIMEOUT_SECONDS: int = 60  # Timeout for LLM API calls (seconds)
+    LLM_MAX_CONCURRENCY: int = 8  # Concurrent LLM calls per analyzer
+    LLM_MAX_REQUESTS_PER_MINUTE: int = 500  # Client-side request budget
+    LLM_MAX_TOKENS_PER_MINUTE: int = 200000  # Client-side token budget
 
     # AI Analysis - Master flag + individual flags per analysis type
+    ANALYSIS_STAGE_CONCURRENCY: int = 4  # Analyzer stages (DB sessions) at once
+    MONTH_TOTALS_REFRESH_SECONDS: int = 3600  # mv_user_month_totals refresh interval
+    ANALYSIS_MONTHLY_VIA_BATCH: bool = False  # Monthly analyses via OpenAI Batch API
+    ANALYSIS_BATCH_POLL_SECONDS: int = 300  # Pending analysis_batches poll interval
     ENABLE_AI_ANALYSIS: bool = True
     ENABLE_ANALYSIS_PRICE_ALERT: bool = True
     ENABLE_ANALYSIS_CATEGORY_INSIGHT: bool = True
@@ -1,3 +1,7 @@
+from typing import Any
+
+import orjson
+from sqlalchemy import DDL, event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.pool import NullPool
@@ -5,6 +9,11 @@ from sqlalchemy.pool import NullPool
 from src.config import settings
 
 
+def _json_serializer(value: Any) -> str:
+    """Encode JSON columns (audit snapshots, preferences, details) with orjson."""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 # Create async engine
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -17,6 +26,7 @@ engine = create_async_engine(
     pool_pre_ping=True,  # Verify connections before using (detect stale connections)
     pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle connections after N seconds
     pool_timeout=settings.DB_POOL_TIMEOUT,  # Timeout when getting connection from pool
+    json_serializer=_json_serializer,  # Single orjson encode per JSON bind
 )
 
 # Create async session factory
@@ -30,6 +40,37 @@ AsyncSessionLocal = async_sessionmaker(
 # Base class for models
 Base = declarative_base()
 
+# create_all (init_db, tests) builds the trigram index on invoice_items, which
+# needs pg_trgm; migrations create it in n8o9p0q1r2s3
+event.listen(
+    Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+)
+
+# Same for mv_user_month_totals (migration m7n8o9p0q1r2), which reads invoices
+# and so must be dropped before drop_all removes it
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(
+        "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_month_totals AS "
+        "SELECT user_id, date_trunc('month', issue_date) AS month, "
+        "SUM(total_value) AS total FROM invoices GROUP BY 1, 2"
+    ),
+)
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_user_month_totals_user_month "
+        "ON mv_user_month_totals (user_id, month)"
+    ),
+)
+event.listen(
+    Base.metadata,
+    "before_drop",
+    DDL("DROP MATERIALIZED VIEW IF EXISTS mv_user_month_totals"),
+)
+
 
 async def get_db() -> AsyncSession:
     """Dependency to get database session."""
@@ -264,16 +264,59 @@ async def bootstrap_admin():
             )
 
 
+@app.on_event("startup")
+async def connect_prompt_cache() -> None:
+    """Connect the Redis-backed LLM prompt cache (no-op if Redis is down)."""
+    from src.services.cached_prompts import init_cache
+
+    await init_cache()
+
+
+@app.on_event("startup")
+async def start_month_totals_refresh() -> None:
+    """Keep the mv_user_month_totals materialized view fresh in background."""
+    import asyncio
+
+    from src.tasks.refresh_month_totals import run_month_totals_refresh_loop
+
+    app.state.month_totals_refresh = asyncio.create_task(
+        run_month_totals_refresh_loop()
+    )
+
+
+@app.on_event("startup")
+async def start_analysis_batches_completion() -> None:
+    """Complete monthly analyses deferred to the OpenAI Batch API."""
+    if not settings.ANALYSIS_MONTHLY_VIA_BATCH:
+        return
+
+    import asyncio
+
+    from src.tasks.complete_analysis_batches import run_analysis_batches_loop
+
+    app.state.analysis_batches = asyncio.create_task(run_analysis_batches_loop())
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Gracefully close database and Redis connections on shutdown."""
     logger.info("Shutting down gracefully...")
 
+    # Stop the materialized view refresh and analysis batch loops
+    app.state.month_totals_refresh.cancel()
+    if analysis_batches := getattr(app.state, "analysis_batches", None):
+        analysis_batches.cancel()
+
     # Dispose database engine (close all connections in pool)
     from src.database import engine
     await engine.dispose()
     logger.info("Database connections closed")
 
+    # Close the AI analyzer's shared HTTP pool
+    from src.services.ai_analyzer import analyzer
+    await analyzer.aclose()
+    logger.info("AI analyzer HTTP pool closed")
+
     # Close Redis connection if exists
     from src.services.cached_prompts import prompt_cache
     if prompt_cache.redis_client:
@@ -1,4 +1,5 @@
 from src.models.analysis import Analysis
+from src.models.analysis_batch import AnalysisBatch
 from src.models.category import Category
 from src.models.invoice import Invoice
 from src.models.invoice_item import InvoiceItem
@@ -20,6 +21,7 @@ __all__ = [
     "Product",
     "Category",
     "Analysis",
+    "AnalysisBatch",
     "PurchasePattern",
     "InvoiceProcessing",
     "Subscription",
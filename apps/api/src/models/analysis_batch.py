@@ -0,0 +1,32 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import JSON, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.database import Base
+
+
+class AnalysisBatch(Base):
+    """Análises mensais adiadas de um usuário, concluídas pela Batch API"""
+
+    __tablename__ = "analysis_batches"
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    # At most one pending batch per user, across every API process
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        ForeignKey("users.id"), unique=True, nullable=False
+    )
+    # OpenAI batch id; null until the batch is submitted
+    batch_id: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    # Chat requests as [custom_id, params] pairs
+    requests: Mapped[list] = mapped_column(JSON, nullable=False)
+    # Column values of the pending analyses; each description holds the
+    # custom_id of the request that fills it
+    analyses: Mapped[list] = mapped_column(JSON, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        default=datetime.utcnow, nullable=False
+    )
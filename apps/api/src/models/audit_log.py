@@ -57,6 +57,14 @@ class AuditLog(Base):
     __table_args__ = (
         Index("idx_audit_logs_created_at", "created_at"),
         Index("idx_audit_logs_resource", "resource_type", "resource_id"),
+        Index(
+            "idx_audit_logs_resource_created",
+            "resource_type",
+            "resource_id",
+            "created_at",
+            "id",
+            postgresql_ops={"created_at": "DESC", "id": "DESC"},
+        ),
         Index("idx_audit_logs_admin_user", "admin_user_id", "created_at"),
     )
 
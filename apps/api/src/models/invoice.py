@@ -7,10 +7,13 @@ from sqlalchemy import (
     JSON,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
     UniqueConstraint,
+    column,
+    table,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -32,6 +35,14 @@ class Invoice(Base):
         UniqueConstraint(
             "access_key", "user_id", name="uq_invoices_access_key_user_id"
         ),
+        # Covers the per-user date-range scans done by the AI analyzer
+        Index(
+            "idx_invoices_user_issue_date",
+            "user_id",
+            "issue_date",
+            postgresql_ops={"issue_date": "DESC"},
+            postgresql_include=["merchant_id", "total_value"],
+        ),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
@@ -114,3 +125,15 @@ class Invoice(Base):
     def products(self) -> list["InvoiceItem"]:
         """Alias for items to match schema"""
         return self.items
+
+
+# Materialized view of per-user monthly invoice totals (created by migration
+# m7n8o9p0q1r2 or the create_all hook in src.database, refreshed by
+# src.tasks.refresh_month_totals). Not part of Base.metadata so autogenerate
+# leaves it alone.
+user_month_totals = table(
+    "mv_user_month_totals",
+    column("user_id"),
+    column("month", DateTime),
+    column("total", Numeric(15, 2)),
+)
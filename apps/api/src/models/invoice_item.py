@@ -3,8 +3,19 @@ from datetime import datetime
 from decimal import Decimal
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import Float, ForeignKey, Numeric, String, Text
+from sqlalchemy import (
+    ColumnExpressionArgument,
+    Float,
+    ForeignKey,
+    Index,
+    Numeric,
+    String,
+    Text,
+    func,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.elements import ColumnElement
 
 from src.database import Base
 
@@ -15,6 +26,11 @@ if TYPE_CHECKING:
     from src.models.product import Product
 
 
+def description_key(description: ColumnExpressionArgument[str]) -> ColumnElement[str]:
+    """Chave de comparação de descrições: sem caixa e espaços nas pontas."""
+    return func.lower(func.btrim(description))
+
+
 class InvoiceItem(Base):
     """Item específico de uma nota fiscal (instância de compra)"""
 
@@ -76,3 +92,23 @@ class InvoiceItem(Base):
     category: Mapped[Optional["Category"]] = relationship(
         back_populates="invoice_items"
     )
+
+    __table_args__ = (
+        # Price-history lookups match items by normalized description
+        Index(
+            "idx_invoice_items_description_key",
+            description_key(text("description")),
+        ),
+        # Keyword regex searches over lower(description) (pg_trgm)
+        Index(
+            "idx_invoice_items_description_trgm",
+            text("lower(description) gin_trgm_ops"),
+            postgresql_using="gin",
+        ),
+        # Covers the invoice -> items join of the analyzer aggregations
+        Index(
+            "idx_invoice_items_invoice_covering",
+            "invoice_id",
+            postgresql_include=["category_name", "total_price", "unit_price"],
+        ),
+    )
@@ -345,12 +345,15 @@ async def get_user_activity(
     user_id: uuid.UUID,
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor from a previous page (keyset pagination)"
+    ),
     admin: User = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
 ):
     """Get audit log activity for a specific user."""
     service = AdminService(db, admin)
-    return await service.get_user_activity(user_id, page, per_page)
+    return await service.get_user_activity(user_id, page, per_page, cursor)
 
 
 # ============================================================================
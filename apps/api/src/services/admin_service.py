@@ -4,14 +4,17 @@ Admin service for user management and administrative operations.
 Provides business logic for admin operations with audit logging.
 """
 
+import asyncio
+import enum
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Sequence
 
 import structlog
 from fastapi import HTTPException, Request, status
-from sqlalchemy import select, update
+from sqlalchemy import bindparam, func, insert, or_, select, true, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from src.core.roles import AdminRole
 from src.models.audit_log import AuditLog
@@ -22,6 +25,66 @@ from src.utils.security import create_access_token
 
 logger = structlog.get_logger()
 
+_SUPER_ADMIN_VALUE = AdminRole.SUPER_ADMIN.value
+
+# Admin accounts are few and their emails effectively never change, so the
+# activity endpoints resolve admin_user_id -> email from this process-local
+# map instead of joining users on every request.
+_ADMIN_EMAIL_CACHE: dict[uuid.UUID, str] = {}
+
+# Statement templates reused across requests so SQLAlchemy's compiled cache
+# is hit instead of rebuilding the same AST on every call.
+_USER_ACTIVITY_FILTER = (
+    AuditLog.resource_type == "user",
+    AuditLog.resource_id == bindparam("user_id"),
+)
+
+# Total and requested page in one statement: the page CTE is outer-joined
+# to the count, so the total comes back even when the page is empty.
+_USER_ACTIVITY_TOTAL_CTE = (
+    select(func.count().label("total"))
+    .select_from(AuditLog)
+    .where(*_USER_ACTIVITY_FILTER)
+    .cte("total")
+)
+
+_USER_ACTIVITY_PAGE_CTE = (
+    select(AuditLog)
+    .where(*_USER_ACTIVITY_FILTER)
+    .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+    .offset(bindparam("offset"))
+    .limit(bindparam("limit"))
+    .cte("page")
+)
+
+_USER_ACTIVITY_PAGE = (
+    select(
+        _USER_ACTIVITY_TOTAL_CTE.c.total,
+        aliased(AuditLog, _USER_ACTIVITY_PAGE_CTE),
+    )
+    .select_from(_USER_ACTIVITY_TOTAL_CTE)
+    .outerjoin(_USER_ACTIVITY_PAGE_CTE, true())
+    .order_by(
+        _USER_ACTIVITY_PAGE_CTE.c.created_at.desc(),
+        _USER_ACTIVITY_PAGE_CTE.c.id.desc(),
+    )
+)
+
+_INSERT_AUDIT_LOG = insert(AuditLog)
+
+# Keyset variant: seeks past the (created_at, id) of the last row seen, so
+# deep pages cost the same as the first one and no COUNT is needed.
+_USER_ACTIVITY_AFTER = (
+    select(AuditLog)
+    .where(
+        *_USER_ACTIVITY_FILTER,
+        tuple_(AuditLog.created_at, AuditLog.id)
+        < tuple_(bindparam("cursor_created_at"), bindparam("cursor_id")),
+    )
+    .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+    .limit(bindparam("limit"))
+)
+
 
 class AdminService:
     """Service for administrative operations."""
@@ -30,6 +93,26 @@ class AdminService:
         self.db = db
         self.admin = admin
         self.request = request
+        self._user_cache: dict[uuid.UUID, User] = {}
+        self._is_super = admin.admin_role == _SUPER_ADMIN_VALUE
+
+        # Request metadata is fixed for the request, so read it once
+        self._request_metadata = {
+            "ip_address": (
+                request.client.host if request and request.client else None
+            ),
+            "user_agent": request.headers.get("user-agent") if request else None,
+            "request_id": request.headers.get("x-request-id") if request else None,
+        }
+
+    async def _get_user(self, user_id: uuid.UUID) -> Optional[User]:
+        """Fetch a user by id, reusing lookups made earlier in this request."""
+        user = self._user_cache.get(user_id)
+        if user is None:
+            user = await self.db.get(User, user_id)
+            if user is not None:
+                self._user_cache[user_id] = user
+        return user
 
     async def soft_delete_user(self, user_id: uuid.UUID) -> dict:
         """
@@ -51,34 +134,57 @@ class AdminService:
                 detail="Você não pode desativar sua própria conta.",
             )
 
-        result = await self.db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
-
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Usuário não encontrado.",
+        # Snapshot the pre-update values in the same statement, since
+        # RETURNING only sees the new row
+        previous = (
+            select(User.id, User.is_active, User.deleted_at)
+            .where(User.id == user_id)
+            .cte("previous")
+        )
+        stmt = (
+            update(User)
+            .where(User.id == previous.c.id)
+            # Transaction time in UTC, naive like the rest of the column
+            .values(is_active=False, deleted_at=func.timezone("utc", func.now()))
+            .returning(
+                User.email,
+                User.deleted_at,
+                previous.c.is_active.label("old_is_active"),
+                previous.c.deleted_at.label("old_deleted_at"),
             )
+            .execution_options(synchronize_session=False)
+        )
 
         # Prevent deleting another admin (super_admin can delete other admins)
-        if user.is_admin and self.admin.admin_role != AdminRole.SUPER_ADMIN.value:
+        if not self._is_super:
+            stmt = stmt.where(User.admin_role.is_(None))
+
+        row = (await self.db.execute(stmt)).first()
+
+        if row is None:
+            # Miss path only: tell a missing user apart from a protected admin
+            if await self._get_user(user_id) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Usuário não encontrado.",
+                )
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Apenas super_admin pode desativar outras contas administrativas.",
             )
 
+        # The UPDATE bypassed the ORM, so drop any cached copy of this user
+        self._user_cache.pop(user_id, None)
+
         # Capture old values for audit
         old_values = {
-            "is_active": user.is_active,
-            "deleted_at": user.deleted_at.isoformat() if user.deleted_at else None,
+            "is_active": row.old_is_active,
+            "deleted_at": (
+                row.old_deleted_at.isoformat() if row.old_deleted_at else None
+            ),
         }
 
-        # Perform soft delete
-        user.is_active = False
-        user.deleted_at = datetime.utcnow()
-        await self.db.commit()
-
-        # Create audit log
+        # Create audit log (commits the soft delete in the same transaction)
         await self.create_audit_log(
             action="delete",
             resource_type="user",
@@ -86,7 +192,7 @@ class AdminService:
             old_values=old_values,
             new_values={
                 "is_active": False,
-                "deleted_at": user.deleted_at.isoformat(),
+                "deleted_at": row.deleted_at.isoformat(),
             },
         )
 
@@ -95,7 +201,7 @@ class AdminService:
             admin_id=str(self.admin.id),
             admin_email=self.admin.email,
             user_id=str(user_id),
-            user_email=user.email,
+            user_email=row.email,
         )
 
         return {"message": "Usuário desativado com sucesso."}
@@ -110,8 +216,7 @@ class AdminService:
         Returns:
             Success message dict
         """
-        result = await self.db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
+        user = await self._get_user(user_id)
 
         if not user:
             raise HTTPException(
@@ -134,9 +239,8 @@ class AdminService:
         # Restore user
         user.is_active = True
         user.deleted_at = None
-        await self.db.commit()
 
-        # Create audit log
+        # Create audit log (commits the restore in the same transaction)
         await self.create_audit_log(
             action="restore",
             resource_type="user",
@@ -175,8 +279,7 @@ class AdminService:
                 detail="Você não pode alterar sua própria função administrativa.",
             )
 
-        result = await self.db.execute(select(User).where(User.id == user_id))
-        user = result.scalar_one_or_none()
+        user = await self._get_user(user_id)
 
         if not user:
             raise HTTPException(
@@ -184,7 +287,11 @@ class AdminService:
                 detail="Usuário não encontrado.",
             )
 
-        update_data = data.model_dump(exclude_unset=True)
+        # Only explicitly set fields, with enums (admin_role) stored by value
+        update_data = {}
+        for key in data.__pydantic_fields_set__:
+            value = getattr(data, key)
+            update_data[key] = value.value if isinstance(value, enum.Enum) else value
         if not update_data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -194,21 +301,23 @@ class AdminService:
         # Capture old values for audit
         old_values = {}
         for key in update_data.keys():
-            old_values[key] = getattr(user, key)
-            if hasattr(old_values[key], "value"):  # Handle enums
-                old_values[key] = old_values[key].value
-
-        # Convert enum to string value for admin_role
-        if "admin_role" in update_data and update_data["admin_role"] is not None:
-            update_data["admin_role"] = update_data["admin_role"].value
+            value = getattr(user, key)
+            old_values[key] = value.value if isinstance(value, enum.Enum) else value
 
         # Perform update
+        # The loaded user is not reused after this, so skip syncing the
+        # identity map (the cache entry is dropped below instead)
         await self.db.execute(
-            update(User).where(User.id == user_id).values(**update_data)
+            update(User)
+            .where(User.id == user_id)
+            .values(**update_data)
+            .execution_options(synchronize_session=False)
         )
-        await self.db.commit()
+        self._user_cache.pop(user_id, None)
+        if "admin_role" in update_data:
+            _ADMIN_EMAIL_CACHE.pop(user_id, None)
 
-        # Create audit log
+        # Create audit log (commits the update in the same transaction)
         await self.create_audit_log(
             action="update",
             resource_type="user",
@@ -240,8 +349,7 @@ class AdminService:
         Returns:
             Dict with access_token and user info
         """
-        result = await self.db.execute(select(User).where(User.id == user_id))
-        target_user = result.scalar_one_or_none()
+        target_user = await self._get_user(user_id)
 
         if not target_user:
             raise HTTPException(
@@ -256,8 +364,9 @@ class AdminService:
                 detail="Não é possível impersonar outro administrador.",
             )
 
-        # Generate impersonation token (30 minutes)
-        token = create_access_token(
+        # Generate impersonation token (30 minutes), signed off the event loop
+        token = await asyncio.to_thread(
+            create_access_token,
             data={
                 "sub": str(target_user.id),
                 "type": "access",
@@ -297,57 +406,38 @@ class AdminService:
         user_id: uuid.UUID,
         page: int = 1,
         per_page: int = 20,
+        cursor: Optional[str] = None,
     ) -> dict:
         """
         Get audit log activity for a specific user.
 
         Args:
             user_id: UUID of user to get activity for
-            page: Page number
+            page: Page number (ignored when cursor is given)
             per_page: Items per page
+            cursor: next_cursor from a previous response, for keyset paging
 
         Returns:
-            Paginated list of audit log entries
+            Paginated list of audit log entries. Cursor requests skip the
+            total count and only return logs, per_page and next_cursor.
         """
-        from sqlalchemy import func
+        if cursor is not None:
+            return await self._get_user_activity_after(user_id, cursor, per_page)
 
-        # Count total
-        count_query = select(func.count()).where(
-            AuditLog.resource_type == "user",
-            AuditLog.resource_id == user_id,
-        )
-        total = (await self.db.execute(count_query)).scalar() or 0
-
-        # Get logs with admin info
-        query = (
-            select(AuditLog, User.email.label("admin_email"))
-            .join(User, AuditLog.admin_user_id == User.id)
-            .where(
-                AuditLog.resource_type == "user",
-                AuditLog.resource_id == user_id,
-            )
-            .order_by(AuditLog.created_at.desc())
-            .offset((page - 1) * per_page)
-            .limit(per_page)
+        # Get logs and the total in a single round-trip
+        result = await self.db.execute(
+            _USER_ACTIVITY_PAGE,
+            {"user_id": user_id, "offset": (page - 1) * per_page, "limit": per_page},
         )
-
-        result = await self.db.execute(query)
         rows = result.all()
 
-        logs = []
-        for log, admin_email in rows:
-            logs.append({
-                "id": str(log.id),
-                "admin_user_id": str(log.admin_user_id),
-                "admin_email": admin_email,
-                "action": log.action,
-                "resource_type": log.resource_type,
-                "resource_id": str(log.resource_id) if log.resource_id else None,
-                "old_values": log.old_values,
-                "new_values": log.new_values,
-                "success": log.success,
-                "created_at": log.created_at.isoformat(),
-            })
+        # An empty page still yields one row carrying the total (log is None)
+        total = rows[0].total
+        page_logs = [log for _, log in rows if log is not None]
+
+        admin_emails = await self._get_admin_emails(page_logs)
+        logs = [self._activity_entry(log, admin_emails) for log in page_logs]
+        has_more = page * per_page < total
 
         return {
             "logs": logs,
@@ -355,8 +445,92 @@ class AdminService:
             "page": page,
             "per_page": per_page,
             "pages": (total + per_page - 1) // per_page,
+            "next_cursor": self._encode_cursor(page_logs[-1]) if has_more else None,
         }
 
+    async def _get_user_activity_after(
+        self, user_id: uuid.UUID, cursor: str, per_page: int
+    ) -> dict:
+        """Keyset page of a user's audit log, starting after the cursor."""
+        cursor_created_at, cursor_id = self._decode_cursor(cursor)
+
+        # Fetch one extra row to know whether another page exists
+        result = await self.db.execute(
+            _USER_ACTIVITY_AFTER,
+            {
+                "user_id": user_id,
+                "cursor_created_at": cursor_created_at,
+                "cursor_id": cursor_id,
+                "limit": per_page + 1,
+            },
+        )
+        page_logs = result.scalars().all()
+        has_more = len(page_logs) > per_page
+        page_logs = page_logs[:per_page]
+
+        admin_emails = await self._get_admin_emails(page_logs)
+        return {
+            "logs": [self._activity_entry(log, admin_emails) for log in page_logs],
+            "per_page": per_page,
+            "next_cursor": self._encode_cursor(page_logs[-1]) if has_more else None,
+        }
+
+    async def _get_admin_emails(
+        self, logs: Sequence[AuditLog]
+    ) -> dict[uuid.UUID, str]:
+        """Resolve the emails of the admins who wrote the given audit logs.
+
+        On a cache miss, every current admin is loaded in one query (plus
+        any former admin referenced by the logs), so later pages rarely
+        need to touch the users table.
+        """
+        missing = {
+            log.admin_user_id
+            for log in logs
+            if log.admin_user_id not in _ADMIN_EMAIL_CACHE
+        }
+        if missing:
+            result = await self.db.execute(
+                select(User.id, User.email).where(
+                    or_(User.admin_role.isnot(None), User.id.in_(missing))
+                )
+            )
+            _ADMIN_EMAIL_CACHE.update(result.tuples().all())
+        return _ADMIN_EMAIL_CACHE
+
+    @staticmethod
+    def _activity_entry(log: AuditLog, admin_emails: dict[uuid.UUID, str]) -> dict:
+        """Serialize one audit log row for the activity endpoints."""
+        return {
+            "id": str(log.id),
+            "admin_user_id": str(log.admin_user_id),
+            "admin_email": admin_emails.get(log.admin_user_id),
+            "action": log.action,
+            "resource_type": log.resource_type,
+            "resource_id": str(log.resource_id) if log.resource_id else None,
+            "old_values": log.old_values,
+            "new_values": log.new_values,
+            "success": log.success,
+            "created_at": log.created_at.isoformat(),
+        }
+
+    @staticmethod
+    def _encode_cursor(log: AuditLog) -> str:
+        """Build an opaque keyset cursor from the last row of a page."""
+        return f"{log.created_at.isoformat()},{log.id}"
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+        """Parse a cursor produced by _encode_cursor."""
+        try:
+            created_at, log_id = cursor.split(",", 1)
+            return datetime.fromisoformat(created_at), uuid.UUID(log_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor de paginação inválido.",
+            ) from None
+
     async def create_audit_log(
         self,
         action: str,
@@ -366,9 +540,13 @@ class AdminService:
         new_values: Optional[dict] = None,
         success: bool = True,
         error_message: Optional[str] = None,
-    ) -> AuditLog:
+    ) -> uuid.UUID:
         """
-        Create an audit log entry.
+        Create an audit log entry and commit it.
+
+        Any pending change made by the caller in the same session is
+        committed together with the entry, so an action is never persisted
+        without its audit trail.
 
         Args:
             action: Action performed (create, update, delete, etc.)
@@ -380,10 +558,9 @@ class AdminService:
             error_message: Error message if action failed
 
         Returns:
-            Created AuditLog entry
+            ID of the audit log entry
         """
-        log = AuditLog(
-            admin_user_id=self.admin.id,
+        values = self._audit_values(
             action=action,
             resource_type=resource_type,
             resource_id=resource_id,
@@ -393,16 +570,39 @@ class AdminService:
             error_message=error_message,
         )
 
-        # Add request metadata if available
-        if self.request:
-            log.ip_address = self.request.client.host if self.request.client else None
-            log.user_agent = self.request.headers.get("user-agent")
-            log.request_id = self.request.headers.get("x-request-id")
-
-        self.db.add(log)
+        await self.db.execute(_INSERT_AUDIT_LOG.values(**values))
         await self.db.commit()
 
-        return log
+        audit_id: uuid.UUID = values["id"]
+        return audit_id
+
+    def _audit_values(
+        self,
+        action: str,
+        resource_type: str,
+        resource_id: Optional[uuid.UUID] = None,
+        old_values: Optional[dict] = None,
+        new_values: Optional[dict] = None,
+        success: bool = True,
+        error_message: Optional[str] = None,
+    ) -> dict:
+        """Build the column values for one audit log row.
+
+        The id is assigned here so create_audit_log can return it without
+        a RETURNING clause.
+        """
+        return {
+            "id": uuid.uuid4(),
+            "admin_user_id": self.admin.id,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "old_values": old_values,
+            "new_values": new_values,
+            "success": success,
+            "error_message": error_message,
+            **self._request_metadata,
+        }
 
 
 async def get_admin_service(
@@ -3,40 +3,596 @@ Serviço de IA para análise de compras e geração de insights.
 Utiliza OpenAI API para gerar análises inteligentes sobre notas fiscais.
 """
 
+import asyncio
+import hashlib
+import heapq
+import json
 import logging
+import re
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Iterable, Optional
 
+import httpx
+from cachetools import TTLCache
+from dateutil.relativedelta import relativedelta
 from openai import AsyncOpenAI
-from sqlalchemy import and_, func, or_, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import (
+    Text,
+    and_,
+    case,
+    column,
+    delete,
+    exists,
+    func,
+    literal,
+    null,
+    or_,
+    select,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from src.config import settings
+from src.database import AsyncSessionLocal
 from src.models.analysis import Analysis
-from src.models.invoice import Invoice
-from src.models.invoice_item import InvoiceItem
+from src.models.analysis_batch import AnalysisBatch
+from src.models.invoice import Invoice, user_month_totals
+from src.models.invoice_item import InvoiceItem, description_key
 from src.models.merchant import Merchant
 from src.models.product import Product
 from src.models.purchase_pattern import PurchasePattern
 from src.models.user import User
+from src.services.cached_prompts import prompt_cache
+from src.services.llm_rate_limiter import RateLimitedOpenAI
+from src.utils.datetime_utils import utcnow
 
 logger = logging.getLogger(__name__)
 
+# Mensagens de sistema por tipo de análise, montadas uma única vez
+_SYSTEM_MESSAGES: dict[str, dict[str, str]] = {
+    "global_summary": {
+        "role": "system",
+        "content": (
+            "Você é um consultor financeiro pessoal experiente que ajuda "
+            "pessoas a organizarem suas finanças domésticas."
+        ),
+    },
+    "price_alert": {
+        "role": "system",
+        "content": (
+            "Você é um analista de compras especializado em identificar "
+            "oportunidades de economia."
+        ),
+    },
+    "category_insight": {
+        "role": "system",
+        "content": (
+            "Você é um analista financeiro especializado em controle de "
+            "gastos."
+        ),
+    },
+    "merchant_pattern": {
+        "role": "system",
+        "content": (
+            "Você é um analista de compras especializado em comparação de "
+            "preços entre estabelecimentos."
+        ),
+    },
+    "summary": {
+        "role": "system",
+        "content": (
+            "Você é um assistente financeiro que ajuda usuários a "
+            "entenderem suas compras."
+        ),
+    },
+    "budget_health": {
+        "role": "system",
+        "content": (
+            "Você é um consultor financeiro pessoal especializado em "
+            "finanças domésticas brasileiras."
+        ),
+    },
+    "per_capita_spending": {
+        "role": "system",
+        "content": (
+            "Você é um consultor financeiro pessoal especializado em "
+            "finanças domésticas."
+        ),
+    },
+    "essential_ratio": {
+        "role": "system",
+        "content": (
+            "Você é um consultor de compras inteligentes especializado em "
+            "economia doméstica."
+        ),
+    },
+    "income_commitment": {
+        "role": "system",
+        "content": (
+            "Você é um consultor financeiro pessoal que ajuda famílias a "
+            "controlarem o orçamento mensal."
+        ),
+    },
+    "children_spending": {
+        "role": "system",
+        "content": (
+            "Você é um consultor de economia doméstica especializado em "
+            "famílias com crianças no Brasil."
+        ),
+    },
+    "wholesale_opportunity": {
+        "role": "system",
+        "content": (
+            "Você é um especialista em compras inteligentes no varejo "
+            "brasileiro."
+        ),
+    },
+    "shopping_frequency": {
+        "role": "system",
+        "content": (
+            "Você é um consultor de planejamento de compras especializado "
+            "em otimização de tempo e dinheiro."
+        ),
+    },
+    "seasonal_alert": {
+        "role": "system",
+        "content": (
+            "Você é um nutricionista e consultor de compras especializado "
+            "em sazonalidade de alimentos no Brasil."
+        ),
+    },
+    "savings_potential": {
+        "role": "system",
+        "content": (
+            "Você é um planejador financeiro pessoal que cria planos de "
+            "ação concretos e motivadores."
+        ),
+    },
+    "family_nutrition": {
+        "role": "system",
+        "content": (
+            "Você é um nutricionista que ajuda famílias brasileiras a comer "
+            "melhor com o orçamento disponível."
+        ),
+    },
+    "monthly_analyses": {
+        "role": "system",
+        "content": (
+            "Você é um consultor financeiro pessoal especializado em "
+            "finanças domésticas brasileiras."
+        ),
+    },
+}
+
+# Prompts em lote e suas linhas por item (str.format_map). As instruções
+# fixas vêm antes dos dados variáveis ({entries}), de modo que chamadas do
+# mesmo tipo compartilhem o prefixo e aproveitem o cache de prompt do
+# provedor
+_PRICE_ALERT_ITEM_TEMPLATE = (
+    "[{index}] Produto: {product}\n"
+    "Preço atual: R$ {current:.2f}\n"
+    "Preço médio histórico (últimas {count} compras): R$ {average:.2f}\n"
+    "Diferença: {diff:.1f}% acima da média"
+)
+_CATEGORY_INSIGHT_ITEM_TEMPLATE = (
+    "[{index}] Categoria: {category}\n"
+    "Gasto este mês: R$ {current:.2f}\n"
+    "Média mensal (últimos {count} meses): R$ {average:.2f}\n"
+    "Diferença: {diff:.1f}% acima da média"
+)
+_PRICE_ALERTS_PROMPT = (
+    "Para cada item, forneça uma análise concisa (máximo 3 frases) sobre:\n"
+    "1. Se este preço é justificável\n"
+    "2. Sugestões para economizar neste produto\n"
+    "3. Quando seria um bom momento para comprar novamente\n\n"
+    "Use linguagem amigável e direta.\n"
+    "{response_instructions}\n\n"
+    "Analise as seguintes situações de compra:\n\n"
+    "{entries}"
+)
+_CATEGORY_INSIGHTS_PROMPT = (
+    "Para cada categoria, forneça uma análise concisa (máximo 3 frases) sobre:\n"
+    "1. Possíveis causas deste aumento\n"
+    "2. Dicas para controlar gastos nesta categoria\n"
+    "3. Metas realistas para o próximo mês\n\n"
+    "Use linguagem amigável e motivadora.\n"
+    "{response_instructions}\n\n"
+    "Analise os seguintes padrões de gastos:\n\n"
+    "{entries}"
+)
+# Linha por item do resumo: (descrição, quantidade, preço unitário, total).
+# Só os itens de maior valor entram no prompt, para limitar os tokens
+_SUMMARY_ITEM_TEMPLATE = "- {0} ({1}x R$ {2:.2f} = R$ {3:.2f})"
+_SUMMARY_MAX_ITEMS = 20
+# Prompts das análises de perfil (str.format_map). Linhas condicionais
+# viram variantes do template, escolhidas uma vez por chamada
+_BUDGET_HEALTH_PROMPT = (
+    "Forneça uma análise concisa (máximo 3 frases):\n"
+    "1. Avaliação da proporção atual vs benchmark\n"
+    "2. Impacto no orçamento familiar\n"
+    "3. Uma ação concreta para o próximo mês\n\n"
+    "Use linguagem amigável de coach financeiro.\n"
+    "{response_instructions}\n\n"
+    "Analise a saúde do orçamento familiar:\n\n"
+    "Renda mensal: R$ {income:,.2f}\n"
+    "Gasto com compras este mês: R$ {month_spent:,.2f} "
+    "({pct_income:.1f}% da renda)\n"
+    "Média dos últimos 3 meses: R$ {avg_prev:,.2f}\n"
+    "Família: {adults_count} adulto(s) e {children_count} criança(s)\n"
+    "Referência DIEESE: famílias brasileiras gastam 20-35% da renda com "
+    "alimentação"
+)
+_PER_CAPITA_DATA = (
+    "Analise o gasto per capita desta família:\n\n"
+    "Gasto per capita este mês: R$ {per_capita:,.2f}\n"
+    "Média per capita últimos 3 meses: R$ {avg_per_capita:,.2f}\n"
+    "Variação: {change_pct:+.1f}%\n"
+    "Família: {adults_count} adulto(s) e {children_count} criança(s) "
+    "(peso OECD: {family_size:.1f} equivalentes)\n"
+)
+_PER_CAPITA_INSTRUCTIONS = (
+    "\nForneça uma análise concisa (máximo 3 frases):\n"
+    "1. Avaliação da evolução do gasto per capita\n"
+    "2. Se o aumento é proporcional ao tamanho da família\n"
+    "3. Dica prática para otimizar\n\n"
+    "Use linguagem amigável."
+)
+_PER_CAPITA_PROMPT = _PER_CAPITA_DATA + _PER_CAPITA_INSTRUCTIONS
+_PER_CAPITA_PROMPT_WITH_INCOME = (
+    _PER_CAPITA_DATA
+    + "Renda per capita: R$ {income_per_capita:,.2f}\n"
+    + _PER_CAPITA_INSTRUCTIONS
+)
+_INCOME_COMMITMENT_PROMPT = (
+    "Analise o comprometimento da renda com mercado este mês:\n\n"
+    "Renda mensal: R$ {income:,.2f}\n"
+    "Gasto acumulado (dia {days_elapsed} de {days_in_month}): "
+    "R$ {accumulated:,.2f} ({pct_accumulated:.1f}%)\n"
+    "Taxa diária: R$ {daily_rate:,.2f}/dia\n"
+    "Projeção para o mês: R$ {projected_total:,.2f} ({projected_pct:.1f}%)\n"
+    "Dias restantes: {days_remaining}\n"
+    "Família: {adults_count} adulto(s) e {children_count} criança(s)\n\n"
+    "Forneça uma análise concisa (máximo 3 frases):\n"
+    "1. Situação atual do comprometimento\n"
+    "2. Projeção e risco para o restante do mês\n"
+    "3. Ação imediata para controlar gastos\n\n"
+    "Use linguagem de alerta mas construtiva."
+)
+_SHOPPING_FREQUENCY_PROMPT = (
+    "Analise a frequência de compras e custos ocultos:\n\n"
+    "Compras este mês: {invoice_count}\n"
+    "Ticket médio: R$ {avg_ticket:.2f}\n"
+    "Estabelecimentos diferentes: {merchant_count}\n"
+    "Compras pequenas (<R$50): {small_purchase_count}\n"
+    "Família: {adults_count} adulto(s) e {children_count} criança(s)\n\n"
+    "Forneça uma análise concisa (máximo 3 frases):\n"
+    "1. Impacto das compras frequentes (impulso, deslocamento, tempo)\n"
+    "2. Calendário otimizado de compras para este perfil familiar\n"
+    "3. Economia estimada ao consolidar compras\n\n"
+    "Use linguagem prática e motivadora."
+)
+
+# Análises mensais pedidas juntas quando não vão para a Batch API: cada
+# pedido vira uma seção numerada (ver AIAnalyzer._complete_combined)
+_COMBINED_PROMPT = (
+    "Produza cada uma das análises numeradas abaixo, seguindo as "
+    "instruções de cada uma.\n"
+    "{response_instructions}\n\n"
+    "{entries}"
+)
+
+# Formato de resposta das chamadas que analisam vários itens de uma vez
+_BATCH_RESPONSE_INSTRUCTIONS = (
+    'Responda apenas em JSON no formato {"analyses": [{"id": <número do item>, '
+    '"analysis": "<texto>"}]}, com uma entrada para cada item numerado.'
+)
+_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "analyses",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "analyses": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "analysis": {"type": "string"},
+                        },
+                        "required": ["id", "analysis"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["analyses"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Formato de resposta das chamadas que geram um único texto
+_DESCRIPTION_RESPONSE_INSTRUCTIONS = (
+    'Responda apenas em JSON no formato {"description": "<texto>"}.'
+)
+_DESCRIPTION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "description",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"description": {"type": "string"}},
+            "required": ["description"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Classificação essenciais vs supérfluos (ver _analyze_essential_ratio).
+# As palavras-chave viram uma alternação para o operador ~* do Postgres
+_ESSENTIAL_CATEGORIES = (
+    "alimentos", "alimentos básicos", "carnes", "frutas", "verduras",
+    "legumes", "laticínios", "padaria", "cereais", "grãos",
+    "higiene", "higiene pessoal", "limpeza", "bebê", "infantil",
+)
+_NON_ESSENTIAL_CATEGORIES = (
+    "bebidas alcoólicas", "snacks", "doces", "guloseimas",
+    "conveniência", "petiscos", "refrigerantes", "cervejas",
+)
+_NON_ESSENTIAL_PATTERN = "|".join((
+    "cerveja", "vinho", "whisky", "vodka", "refrigerante", "salgadinho",
+    "chocolate", "sorvete", "biscoito recheado", "energetico", "energy",
+))
+
+# Produtos infantis (ver _analyze_children_spending), casados contra a
+# descrição em uma única passada da expressão compilada
+_CHILD_KEYWORDS = (
+    "fralda", "fraldas", "leite", "papinha", "bebe", "bebê",
+    "infantil", "criança", "mamadeira", "chupeta", "lenço umedecido",
+    "toalha umedecida", "pomada", "talco", "mingau", "nan ",
+    "aptamil", "enfamil", "nestogeno", "mucilon",
+)
+_CHILD_KEYWORDS_RE = re.compile("|".join(map(re.escape, _CHILD_KEYWORDS)))
+# Alternação (regex do Postgres) usada no histórico; servida pelo índice
+# trigram em lower(description)
+_CHILD_HISTORY_PATTERN = "|".join(_CHILD_KEYWORDS[:10])
+
+# Calendário aproximado de safra no Brasil (meses em que cada produto está
+# mais barato) e sua máscara de bits (bit m ligado = mês m na safra)
+_SEASONAL_MONTHS: dict[str, tuple[int, ...]] = {
+    # Fruits - months when they are in season (cheaper)
+    "manga": (10, 11, 12, 1, 2),
+    "morango": (5, 6, 7, 8, 9),
+    "uva": (1, 2, 3, 12),
+    "pêssego": (10, 11, 12, 1),
+    "melancia": (10, 11, 12, 1, 2),
+    "abacaxi": (10, 11, 12, 1),
+    "caqui": (3, 4, 5),
+    "maçã": (1, 2, 3, 4),
+    "laranja": (5, 6, 7, 8),
+    "tangerina": (4, 5, 6, 7),
+    "mexerica": (4, 5, 6, 7),
+    "ponkan": (4, 5, 6, 7),
+    "abacate": (3, 4, 5, 6, 7),
+    "goiaba": (2, 3, 4),
+    "mamão": (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12),  # year-round
+    "banana": (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12),  # year-round
+    # Vegetables
+    "tomate": (1, 2, 3, 4),
+    "abobrinha": (9, 10, 11, 12, 1),
+    "berinjela": (3, 4, 5, 6),
+    "couve-flor": (5, 6, 7, 8),
+    "brócolis": (5, 6, 7, 8),
+    "pepino": (9, 10, 11, 12, 1),
+    "pimentão": (9, 10, 11, 12),
+    "vagem": (5, 6, 7, 8),
+    "chuchu": (5, 6, 7, 8, 9),
+    "milho": (1, 2, 3),
+}
+_SEASON_MASK: dict[str, int] = {
+    name: sum(1 << month for month in months)
+    for name, months in _SEASONAL_MONTHS.items()
+}
+# Todos os produtos do calendário em uma alternação: a descrição é varrida
+# uma única vez
+_SEASONAL_RE = re.compile("|".join(map(re.escape, _SEASONAL_MONTHS)))
+# Categorias de hortifrúti consideradas no alerta sazonal
+_PRODUCE_CATEGORIES = frozenset({
+    "frutas", "verduras", "legumes", "hortifruti", "hortifrutigranjeiros",
+    "frutas e verduras",
+})
+
+# Grupos alimentares por palavras-chave da categoria (ver
+# _analyze_family_nutrition) e os essenciais para crianças
+_FOOD_GROUPS: dict[str, tuple[str, ...]] = {
+    "proteínas": ("carnes", "carne", "frango", "peixe", "ovos", "ovo", "proteína"),
+    "carboidratos": (
+        "arroz", "macarrão", "pão", "padaria", "cereais", "grãos", "massas",
+    ),
+    "frutas_verduras": (
+        "frutas", "verduras", "legumes", "hortifruti", "hortifrutigranjeiros",
+    ),
+    "laticínios": ("laticínios", "leite", "queijo", "iogurte", "lácteos"),
+    "processados": (
+        "processados", "congelados", "instantâneo", "embutidos", "snacks",
+    ),
+}
+_FOOD_GROUP_PATTERNS: dict[str, str] = {
+    group: "|".join(keywords) for group, keywords in _FOOD_GROUPS.items()
+}
+_CHILD_CRITICAL_GROUPS = frozenset({"frutas_verduras", "laticínios"})
+
+# Pedidos de chat guardados para a Batch API enquanto um estágio roda em
+# modo adiado (ver AIAnalyzer._deferring); None no fluxo normal
+_deferred_requests: ContextVar[Optional[list[tuple[str, dict[str, Any]]]]] = (
+    ContextVar("deferred_requests", default=None)
+)
+
+# Análises executadas por analyze_invoice: (tipo, método, argumentos,
+# requisito). Os argumentos são nomes resolvidos por nota em
+# analyze_invoice; o requisito descarta a análise antes de agendá-la
+# quando a sua pré-condição mais barata não é atendida: "children" e
+# "income" (perfil), "items" e "produce" (itens da nota), "history" e
+# "frequent" (totais do mês) ou None
+_AnalysisEntry = tuple[str, str, tuple[str, ...], Optional[str]]
+_INVOICE_ANALYSES: tuple[_AnalysisEntry, ...] = (
+    ("price_alert", "_detect_price_alerts",
+     ("invoice", "items", "user_history"), None),
+    ("category_insight", "_generate_category_insights",
+     ("invoice", "items", "user_history"), None),
+    ("merchant_pattern", "_analyze_merchant",
+     ("invoice", "merchant", "user_history"), None),
+    ("summary", "_generate_purchase_summary",
+     ("invoice", "items", "merchant"), None),
+    ("essential_ratio", "_analyze_essential_ratio",
+     ("invoice", "items", "profile"), "items"),
+    ("seasonal_alert", "_analyze_seasonal_alert",
+     ("invoice", "items", "profile"), "produce"),
+    ("children_spending", "_analyze_children_spending",
+     ("invoice", "items", "profile"), "children"),
+)
+# Análises mensais: rodam só se não houve uma nos últimos 30 dias
+_MONTHLY_ANALYSES: tuple[_AnalysisEntry, ...] = (
+    ("budget_health", "_analyze_budget_health",
+     ("invoice", "profile", "month_totals"), "income"),
+    ("income_commitment", "_analyze_income_commitment",
+     ("invoice", "profile", "month_totals"), "income"),
+    ("per_capita_spending", "_analyze_per_capita_spending",
+     ("invoice", "profile", "month_totals"), "history"),
+    ("shopping_frequency", "_analyze_shopping_frequency",
+     ("invoice", "profile", "month_totals"), "frequent"),
+    ("wholesale_opportunity", "_analyze_wholesale_opportunity",
+     ("invoice", "profile"), None),
+    ("savings_potential", "_analyze_savings_potential",
+     ("invoice", "profile", "month_totals"), None),
+    ("family_nutrition", "_analyze_family_nutrition",
+     ("invoice", "profile"), None),
+)
+_MONTHLY_TYPES = tuple(analysis_type for analysis_type, *_ in _MONTHLY_ANALYSES)
+
+# Lotes da Batch API (análises mensais adiadas, ver analysis_batches)
+_BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# A janela do lote é de 24h; linhas mais velhas que isto são descartadas
+_BATCH_MAX_AGE = timedelta(hours=48)
+# batch_id de uma linha cujo envio à Batch API está em andamento
+_BATCH_SUBMITTING = "submitting"
+# Colunas de Analysis guardadas para as análises adiadas
+_DEFERRED_ANALYSIS_COLUMNS = (
+    "invoice_id",
+    "type",
+    "priority",
+    "title",
+    "description",
+    "details",
+    "reference_period_start",
+    "reference_period_end",
+    "related_categories",
+    "related_merchants",
+    "ai_model",
+    "confidence_score",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Profile:
+    """Perfil familiar do usuário, montado uma vez por análise."""
+
+    household_income: Optional[float]
+    adults_count: int
+    children_count: int
+    # Tamanho ponderado pela escala OECD (crianças valem 0,7)
+    family_size: float
+
+
+@dataclass(frozen=True, slots=True)
+class MonthTotals:
+    """Gastos do usuário no mês da nota e nos 3 meses fechados anteriores."""
+
+    month_spent: float
+    # Média mensal dos meses fechados com gasto (None se não houver)
+    prev_average: Optional[float]
+    # Notas do mês da nota: quantidade, abaixo de R$ 50 e estabelecimentos
+    invoice_count: int
+    small_purchase_count: int
+    merchant_count: int
+
 
 class AIAnalyzer:
     """Serviço de análise de compras usando OpenAI."""
 
-    def __init__(self):
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal):
+        # Cada estágio concorrente de analyze_invoice usa sua própria sessão
+        self._session_factory = session_factory
+        # Pool HTTP/2 compartilhado por todas as chamadas do analisador; as
+        # retentativas ficam a cargo do RateLimitedOpenAI (max_retries=0)
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=256,
+                max_keepalive_connections=64,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=5.0),
+        )
         if settings.OPENROUTER_API_KEY:
-            self.client = AsyncOpenAI(
+            client = AsyncOpenAI(
                 base_url=settings.OPENROUTER_BASE_URL,
                 api_key=settings.OPENROUTER_API_KEY,
+                http_client=self._http,
+                max_retries=0,
             )
             self.model = settings.OPENROUTER_MODEL
         else:
-            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=self._http,
+                max_retries=0,
+            )
             self.model = "gpt-4o-mini"
+        self.client = RateLimitedOpenAI(
+            client,
+            max_requests_per_minute=settings.LLM_MAX_REQUESTS_PER_MINUTE,
+            max_tokens_per_minute=settings.LLM_MAX_TOKENS_PER_MINUTE,
+        )
+        self._llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._stage_semaphore = asyncio.Semaphore(settings.ANALYSIS_STAGE_CONCURRENCY)
+        # Decisão das análises mensais por usuário, reaproveitada entre notas
+        # processadas em sequência (importação em lote)
+        self._monthly_due: TTLCache = TTLCache(maxsize=10000, ttl=60)
+        # Análises mensais vão pela Batch API, que a OpenRouter não oferece.
+        # Os lotes ficam em analysis_batches até complete_pending_batches
+        # concluí-los
+        self._monthly_via_batch = (
+            settings.ANALYSIS_MONTHLY_VIA_BATCH and not settings.OPENROUTER_API_KEY
+        )
+        # Análises habilitadas, resolvidas uma vez a partir das flags
+        self._invoice_analyses = self._enabled_analyses(_INVOICE_ANALYSES)
+        self._monthly_analyses = self._enabled_analyses(_MONTHLY_ANALYSES)
+
+    def _enabled_analyses(
+        self, registry: tuple[_AnalysisEntry, ...]
+    ) -> list[tuple[str, Callable[..., Awaitable[Any]], tuple[str, ...], Optional[str]]]:
+        """Filtra o registro pelas flags ENABLE_ANALYSIS_* e liga os métodos."""
+        return [
+            (name, getattr(self, method), args, requires)
+            for name, method, args, requires in registry
+            if settings.is_analysis_enabled(name)
+        ]
+
+    async def aclose(self) -> None:
+        """Fecha o pool HTTP da API de IA."""
+        await self._http.aclose()
 
     async def analyze_invoice(
         self,
@@ -49,7 +605,8 @@ class AIAnalyzer:
         Analisa uma nota fiscal específica e gera insights.
 
         Args:
-            invoice: Nota fiscal a ser analisada
+            invoice: Nota fiscal a ser analisada, com ``items`` e ``merchant``
+                já carregados (selectinload/joinedload)
             user_history: Histórico de compras do usuário
             db: Sessão do banco de dados
             user: Usuário com perfil (household_income, adults_count, children_count)
@@ -59,208 +616,219 @@ class AIAnalyzer:
         """
         analyses = []
 
-        # Buscar itens da nota
-        result = await db.execute(
-            select(InvoiceItem).where(InvoiceItem.invoice_id == invoice.id)
-        )
-        items = result.scalars().all()
-
-        # Buscar merchant
-        merchant = None
-        if invoice.merchant_id:
-            merchant_result = await db.execute(
-                select(Merchant).where(Merchant.id == invoice.merchant_id)
-            )
-            merchant = merchant_result.scalar_one_or_none()
+        # Itens e merchant já vêm carregados pelo chamador
+        items = invoice.items
+        merchant = invoice.merchant
 
         # Extract user profile data
         profile = self._get_user_profile(user)
 
-        # === Existing analyses (per-invoice) ===
-        if settings.is_analysis_enabled("price_alert"):
-            price_alerts = await self._detect_price_alerts(
-                invoice, items, user_history, db
-            )
-            analyses.extend(price_alerts)
+        # Todas as análises são independentes: rodam em paralelo, cada uma
+        # com sua própria sessão (ver _run_stage)
+        arguments = {
+            "invoice": invoice,
+            "items": items,
+            "merchant": merchant,
+            "user_history": user_history,
+            "profile": profile,
+        }
+        requirements = {
+            None: True,
+            "children": profile.children_count > 0,
+            "income": bool(
+                profile.household_income and profile.household_income > 0
+            ),
+            "items": len(items) >= 5,
+            "produce": sum(
+                (item.category_name or "").lower() in _PRODUCE_CATEGORIES
+                for item in items
+            ) >= 3,
+        }
+        stages = [
+            (name, stage, tuple(arguments[arg] for arg in args))
+            for name, stage, args, requires in self._invoice_analyses
+            if requirements[requires]
+        ]
 
-        if settings.is_analysis_enabled("category_insight"):
-            category_insights = await self._generate_category_insights(
-                invoice, items, user_history, db
+        # === Monthly analyses (run only if not run recently) ===
+        monthly_stages = []
+        if self._monthly_analyses and await self._should_run_monthly_analyses(
+            invoice.user_id, db
+        ):
+            # Totais do mês compartilhados pelas análises mensais, buscados
+            # uma única vez. Se a consulta falhar, só as análises mensais
+            # são puladas
+            needs_totals = any(
+                "month_totals" in args for _, _, args, _ in self._monthly_analyses
             )
-            analyses.extend(category_insights)
-
-        if settings.is_analysis_enabled("merchant_pattern"):
-            merchant_analysis = await self._analyze_merchant(
-                invoice, merchant, user_history, db
+            month_totals = (
+                await self._shared_month_totals(invoice) if needs_totals else None
             )
-            if merchant_analysis:
-                analyses.append(merchant_analysis)
-
-        if settings.is_analysis_enabled("summary"):
-            summary = await self._generate_purchase_summary(
-                invoice, items, merchant, db
+            if month_totals is not None:
+                arguments["month_totals"] = month_totals
+                requirements["history"] = month_totals.prev_average is not None
+                requirements["frequent"] = month_totals.invoice_count >= 8
+            if month_totals is not None or not needs_totals:
+                monthly_stages = [
+                    (name, stage, tuple(arguments[arg] for arg in args))
+                    for name, stage, args, requires in self._monthly_analyses
+                    if requirements[requires]
+                ]
+
+        # As análises mensais só montam seus pedidos aqui. Com
+        # ANALYSIS_MONTHLY_VIA_BATCH os textos vêm da Batch API em segundo
+        # plano; senão, de uma única chamada após os estágios
+        deferred_requests: list[tuple[str, dict[str, Any]]] = []
+        combined_requests: list[tuple[str, dict[str, Any]]] = []
+        monthly_requests = (
+            deferred_requests if self._monthly_via_batch else combined_requests
+        )
+        stages.extend(
+            (name, self._deferring(stage, monthly_requests), args)
+            for name, stage, args in monthly_stages
+        )
+
+        stage_results = await asyncio.gather(
+            *(self._run_stage(name, stage, *args) for name, stage, args in stages)
+        )
+        for stage_result in stage_results:
+            if isinstance(stage_result, list):
+                analyses.extend(stage_result)
+            elif stage_result:
+                analyses.append(stage_result)
+
+        if combined_requests:
+            texts = await self._complete_combined(combined_requests)
+            placeholders = {custom_id for custom_id, _ in combined_requests}
+            completed = []
+            for analysis in analyses:
+                if analysis.description in placeholders:
+                    text = texts.get(analysis.description)
+                    if not text:
+                        continue
+                    analysis.description = text
+                completed.append(analysis)
+            analyses = completed
+
+        if deferred_requests:
+            placeholders = {custom_id for custom_id, _ in deferred_requests}
+            deferred = [a for a in analyses if a.description in placeholders]
+            analyses = [a for a in analyses if a.description not in placeholders]
+            await self._defer_monthly(
+                invoice.user_id, deferred, deferred_requests, db
             )
-            if summary:
-                analyses.append(summary)
 
-        # === New per-invoice analyses ===
-        if settings.is_analysis_enabled("essential_ratio"):
-            try:
-                essential = await self._analyze_essential_ratio(
-                    invoice, items, profile, db
-                )
-                if essential:
-                    analyses.append(essential)
-            except Exception as e:
-                logger.warning("essential_ratio analysis failed: %s", e)
+        return analyses
 
-        if settings.is_analysis_enabled("seasonal_alert"):
-            try:
-                seasonal = await self._analyze_seasonal_alert(
-                    invoice, items, profile, db
-                )
-                analyses.extend(seasonal)
-            except Exception as e:
-                logger.warning("seasonal_alert analysis failed: %s", e)
+    async def _run_stage(
+        self, name: str, stage: Callable[..., Awaitable[Any]], *args: Any
+    ) -> Any:
+        """
+        Executa um estágio da análise com uma sessão própria.
 
-        if (
-            settings.is_analysis_enabled("children_spending")
-            and profile["children_count"]
-            and profile["children_count"] > 0
-        ):
-            try:
-                children = await self._analyze_children_spending(
-                    invoice, items, profile, db
-                )
-                if children:
-                    analyses.append(children)
-            except Exception as e:
-                logger.warning("children_spending analysis failed: %s", e)
+        AsyncSession não suporta uso concorrente, então cada estágio
+        disparado via asyncio.gather abre a sua. No máximo
+        ANALYSIS_STAGE_CONCURRENCY estágios rodam ao mesmo tempo, para não
+        esgotar o pool de conexões. Falhas são registradas e não
+        interrompem os demais estágios.
+        """
+        try:
+            async with self._stage_semaphore, self._session_factory() as stage_db:
+                return await stage(*args, stage_db)
+        except Exception as e:
+            logger.warning("%s analysis failed: %s", name, e)
+            return None
 
-        # === Monthly analyses (run only if not run recently) ===
-        should_run_monthly = await self._should_run_monthly_analyses(
-            invoice.user_id, db
-        )
-        if should_run_monthly:
-            if profile["household_income"] and profile["household_income"] > 0:
-                if settings.is_analysis_enabled("budget_health"):
-                    try:
-                        budget = await self._analyze_budget_health(
-                            invoice, profile, db
-                        )
-                        if budget:
-                            analyses.append(budget)
-                    except Exception as e:
-                        logger.warning("budget_health analysis failed: %s", e)
-
-                if settings.is_analysis_enabled("income_commitment"):
-                    try:
-                        commitment = await self._analyze_income_commitment(
-                            invoice, profile, db
-                        )
-                        if commitment:
-                            analyses.append(commitment)
-                    except Exception as e:
-                        logger.warning("income_commitment analysis failed: %s", e)
-
-            if settings.is_analysis_enabled("per_capita_spending"):
-                try:
-                    per_capita = await self._analyze_per_capita_spending(
-                        invoice, profile, db
-                    )
-                    if per_capita:
-                        analyses.append(per_capita)
-                except Exception as e:
-                    logger.warning("per_capita_spending analysis failed: %s", e)
-
-            if settings.is_analysis_enabled("shopping_frequency"):
-                try:
-                    frequency = await self._analyze_shopping_frequency(
-                        invoice, profile, db
-                    )
-                    if frequency:
-                        analyses.append(frequency)
-                except Exception as e:
-                    logger.warning("shopping_frequency analysis failed: %s", e)
-
-            if settings.is_analysis_enabled("wholesale_opportunity"):
-                try:
-                    wholesale = await self._analyze_wholesale_opportunity(
-                        invoice, profile, db
-                    )
-                    if wholesale:
-                        analyses.append(wholesale)
-                except Exception as e:
-                    logger.warning("wholesale_opportunity analysis failed: %s", e)
-
-            if settings.is_analysis_enabled("savings_potential"):
-                try:
-                    savings = await self._analyze_savings_potential(
-                        invoice, profile, db
-                    )
-                    if savings:
-                        analyses.append(savings)
-                except Exception as e:
-                    logger.warning("savings_potential analysis failed: %s", e)
-
-            if settings.is_analysis_enabled("family_nutrition"):
-                try:
-                    nutrition = await self._analyze_family_nutrition(
-                        invoice, profile, db
-                    )
-                    if nutrition:
-                        analyses.append(nutrition)
-                except Exception as e:
-                    logger.warning("family_nutrition analysis failed: %s", e)
+    async def _shared_month_totals(self, invoice: Invoice) -> Optional[MonthTotals]:
+        """
+        _month_totals com sessão própria, como os estágios, para que uma
+        falha (ex.: mv_user_month_totals ausente) não aborte a transação do
+        chamador. Falhas são registradas e devolvem None.
+        """
+        try:
+            async with self._session_factory() as totals_db:
+                return await self._month_totals(invoice, totals_db)
+        except Exception as e:
+            logger.warning("month totals failed, skipping monthly analyses: %s", e)
+            return None
 
-        return analyses
+    @staticmethod
+    def _deferring(
+        stage: Callable[..., Awaitable[Any]],
+        requests: list[tuple[str, dict[str, Any]]],
+    ) -> Callable[..., Awaitable[Any]]:
+        """
+        Envolve um estágio para que suas chamadas a _chat sejam guardadas em
+        ``requests`` em vez de executadas (Batch API ou _complete_combined).
+
+        Cada estágio do asyncio.gather roda em sua própria task, então o
+        ContextVar definido aqui não vaza para os estágios síncronos.
+        """
+        async def run(*args: Any) -> Any:
+            _deferred_requests.set(requests)
+            return await stage(*args)
 
-    def _get_user_profile(self, user: Optional[User]) -> dict[str, Any]:
+        return run
+
+    def _get_user_profile(self, user: Optional[User]) -> Profile:
         """Extract user profile data with safe defaults."""
         if not user:
-            return {
-                "household_income": None,
-                "adults_count": 1,
-                "children_count": 0,
-            }
-        return {
-            "household_income": (
+            return Profile(
+                household_income=None,
+                adults_count=1,
+                children_count=0,
+                family_size=1.0,
+            )
+        adults = user.adults_count or 1
+        children = user.children_count or 0
+        return Profile(
+            household_income=(
                 float(user.household_income) if user.household_income else None
             ),
-            "adults_count": user.adults_count or 1,
-            "children_count": user.children_count or 0,
-        }
-
-    def _get_weighted_family_size(self, profile: dict[str, Any]) -> float:
-        """Calculate OECD-weighted family size (children = 0.7 weight)."""
-        adults = profile.get("adults_count") or 1
-        children = profile.get("children_count") or 0
-        return float(adults) + float(children) * 0.7
+            adults_count=adults,
+            children_count=children,
+            family_size=float(adults) + float(children) * 0.7,
+        )
 
     async def _should_run_monthly_analyses(
         self, user_id: Any, db: AsyncSession
     ) -> bool:
-        """Check if monthly analyses should run (last run > 30 days ago)."""
-        monthly_types = [
-            "budget_health", "per_capita_spending", "income_commitment",
-            "shopping_frequency", "wholesale_opportunity", "savings_potential",
-            "family_nutrition",
-        ]
+        """
+        Check if monthly analyses should run (last run > 30 days ago).
+
+        The answer is memoized per user for 60 seconds. A positive answer
+        is flipped to False right away, since the caller schedules the
+        monthly analyses next and later invoices in the same burst must
+        not schedule them again. A user with a batch still pending in
+        analysis_batches is not due either, unless the batch is older than
+        _BATCH_MAX_AGE (e.g. left behind after the batch loop was turned
+        off).
+        """
+        due: Optional[bool] = self._monthly_due.get(user_id)
+        if due is not None:
+            return due
+        # Existência de uma análise recente em vez de MAX + subtração em
+        # Python: o banco para na primeira linha do índice
         result = await db.execute(
-            select(func.max(Analysis.created_at))
-            .where(
-                and_(
-                    Analysis.user_id == user_id,
-                    Analysis.type.in_(monthly_types),
+            select(
+                or_(
+                    exists().where(
+                        and_(
+                            Analysis.user_id == user_id,
+                            Analysis.type.in_(_MONTHLY_TYPES),
+                            Analysis.created_at >= utcnow() - timedelta(days=30),
+                        )
+                    ),
+                    exists().where(
+                        AnalysisBatch.user_id == user_id,
+                        AnalysisBatch.created_at >= utcnow() - _BATCH_MAX_AGE,
+                    ),
                 )
             )
         )
-        last_monthly = result.scalar()
-        if not last_monthly:
-            return True
-        if isinstance(last_monthly, datetime):
-            return (datetime.utcnow() - last_monthly).days >= 30
-        return True
+        due = not result.scalar()
+        self._monthly_due[user_id] = False
+        return due
 
     async def generate_global_summary(self, analyses: list[Analysis]) -> str:
         """
@@ -288,22 +856,8 @@ class AIAnalyzer:
         )
 
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Você é um consultor financeiro pessoal experiente "
-                            "que ajuda pessoas a organizarem suas finanças domésticas."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.7,
-                max_tokens=500,
-            )
-            return response.choices[0].message.content or "Não foi possível gerar o resumo."
+            ai_text = await self._chat("global_summary", prompt, max_tokens=500)
+            return ai_text or "Não foi possível gerar o resumo."
         except Exception as e:
             print(f"Erro ao gerar resumo global: {e}")
             return "Ocorreu um erro ao gerar seu relatório de insights. Tente novamente mais tarde."
@@ -318,76 +872,125 @@ class AIAnalyzer:
     ) -> list[Analysis]:
         """
         Detecta preços acima da média para produtos na nota.
+
+        O histórico dos últimos 90 dias de todos os produtos vem de uma
+        única consulta, e todos os itens sinalizados são analisados em uma
+        única chamada à IA.
         """
-        alerts = []
+        if not items:
+            return []
 
-        for item in items:
-            # Buscar histórico de preços para este produto
-            result = await db.execute(
-                select(InvoiceItem.unit_price, Invoice.merchant_id, Invoice.issue_date)
-                .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
-                .where(
-                    and_(
-                        InvoiceItem.description.ilike(f"%{item.description}%"),
-                        Invoice.user_id == invoice.user_id,
-                        Invoice.issue_date >= invoice.issue_date - timedelta(days=90),
-                    )
+        # Média das 10 compras mais recentes de cada produto, calculada no
+        # banco em uma única consulta. O histórico casa pela descrição
+        # normalizada (ver description_key), mas volta agrupado pela
+        # descrição exata de cada item da nota.
+        descriptions = {item.description for item in items}
+        targets = values(column("description", Text), name="targets").data(
+            [(description,) for description in descriptions]
+        )
+        recent = (
+            select(
+                targets.c.description,
+                InvoiceItem.unit_price,
+                func.row_number()
+                .over(
+                    partition_by=targets.c.description,
+                    order_by=Invoice.issue_date.desc(),
                 )
-                .order_by(Invoice.issue_date.desc())
-                .limit(10)
+                .label("position"),
+            )
+            .select_from(targets)
+            .join(
+                InvoiceItem,
+                description_key(InvoiceItem.description)
+                == description_key(targets.c.description),
+            )
+            .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
+            .where(
+                and_(
+                    Invoice.user_id == invoice.user_id,
+                    Invoice.issue_date >= invoice.issue_date - timedelta(days=90),
+                )
+            )
+            .subquery()
+        )
+        result = await db.execute(
+            select(
+                recent.c.description,
+                func.avg(recent.c.unit_price),
+                func.count(),
             )
-            price_history = result.all()
+            .where(recent.c.position <= 10)
+            .group_by(recent.c.description)
+        )
+        # Os valores só alimentam comparações e prompts, então são
+        # convertidos para float uma única vez
+        history = {
+            description: (float(avg_price), count)
+            for description, avg_price, count in result.tuples()
+        }
 
-            if len(price_history) < 2:
+        flagged = []
+        for item in items:
+            avg_price, history_count = history.get(item.description, (0.0, 0))
+            if history_count < 2:
                 continue
 
-            # Calcular preço médio
-            avg_price = sum(p[0] for p in price_history) / len(price_history)
-
             # Se preço atual for 20% acima da média, gerar alerta
-            if item.unit_price > avg_price * Decimal("1.2"):
-                # Usar IA para gerar descrição personalizada
-                prompt = self._build_price_alert_prompt(
-                    item.description, item.unit_price, avg_price, len(price_history)
-                )
+            current_price = float(item.unit_price)
+            if current_price > avg_price * 1.2:
+                flagged.append((item, current_price, avg_price, history_count))
 
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": (
-                                "Você é um analista de compras especializado "
-                                "em identificar oportunidades de economia."
-                            ),
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.7,
-                    max_tokens=300,
-                )
+        if not flagged:
+            return []
 
-                ai_text = response.choices[0].message.content
+        # Uma única chamada à IA para os itens sinalizados sem texto em
+        # cache; situações equivalentes (mesmo produto, preços arredondados
+        # e faixa de diferença) reaproveitam o texto
+        texts = await self._complete_batch_cached(
+            "price_alert",
+            _PRICE_ALERTS_PROMPT,
+            flagged,
+            [
+                (
+                    item.description.strip().lower(),
+                    round(current_price, 1),
+                    round(avg_price, 1),
+                    history_count,
+                    self._difference_bucket(current_price, avg_price),
+                )
+                for item, current_price, avg_price, history_count in flagged
+            ],
+            self._price_alert_entries,
+            max_tokens_per_entry=300,
+        )
 
-                alert = Analysis(
+        alerts = []
+        for index, (item, current_price, avg_price, history_count) in enumerate(
+            flagged, 1
+        ):
+            diff_percent = (current_price - avg_price) / avg_price * 100
+            alerts.append(
+                Analysis(
                     user_id=invoice.user_id,
                     invoice_id=invoice.id,
                     type="price_alert",
                     priority=(
                         "high"
-                        if item.unit_price > avg_price * Decimal("1.5")
+                        if current_price > avg_price * 1.5
                         else "medium"
                     ),
                     title=f"Preço acima da média: {item.description}",
-                    description=ai_text,
+                    description=texts.get(index) or (
+                        f"{item.description} está {diff_percent:.1f}% acima "
+                        f"do preço médio das suas últimas {history_count} compras."
+                    ),
                     details={
                         "product": item.description,
-                        "current_price": float(item.unit_price),
-                        "average_price": float(avg_price),
-                        "price_difference_percent": float(
-                            (item.unit_price - avg_price) / avg_price * 100
-                        ),
-                        "history_count": len(price_history),
+                        "current_price": current_price,
+                        "average_price": avg_price,
+                        "price_difference_percent": diff_percent,
+                        "history_count": history_count,
                         "quantity": item.quantity,
                     },
                     reference_period_start=invoice.issue_date - timedelta(days=90),
@@ -395,11 +998,263 @@ class AIAnalyzer:
                     ai_model=self.model,
                     confidence_score=0.8,
                 )
-
-                alerts.append(alert)
+            )
 
         return alerts
 
+    async def _cached_chat(self, **kwargs: Any) -> Optional[str]:
+        """
+        Chamada de chat com cache no Redis endereçado pelo conteúdo.
+
+        A chave é o SHA-256 do modelo, mensagens e parâmetros, então
+        prompts idênticos (mesmo produto e preços, nota reenviada) são
+        respondidos do cache durante LLM_CACHE_TTL.
+        """
+        request_hash = hashlib.sha256(
+            json.dumps([self.model, kwargs], sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        cached = await prompt_cache.get_completion(request_hash)
+        if cached is not None:
+            return cached
+
+        response = await self.client.chat.completions.create(
+            model=self.model, **kwargs
+        )
+        text: Optional[str] = response.choices[0].message.content
+        if text:
+            await prompt_cache.set_completion(request_hash, text)
+        return text
+
+    async def _limited_chat(self, request: dict[str, Any]) -> Optional[str]:
+        """_cached_chat com no máximo LLM_MAX_CONCURRENCY chamadas simultâneas."""
+        async with self._llm_semaphore:
+            return await self._cached_chat(**request)
+
+    async def _chat(
+        self,
+        analysis_type: str,
+        prompt: str,
+        **params: Any,
+    ) -> Optional[str]:
+        """
+        Texto da IA para uma análise do tipo ``analysis_type``.
+
+        Ponto único de chamada das análises: a resposta passa pelo cache
+        (_cached_chat) e as retentativas com backoff exponencial para 429,
+        5xx e falhas de conexão ficam no RateLimitedOpenAI. Em um estágio
+        adiado (ver _deferring) a chamada não é feita: o pedido fica
+        guardado e o retorno é o seu custom_id, trocado pelo texto quando
+        o pedido é concluído.
+
+        Os prompts destas análises trazem valores exatos do usuário (renda,
+        gastos), então o texto só é reaproveitado para o mesmo prompt; não
+        há cache por características como em _complete_batch_cached.
+        """
+        request = {
+            "messages": [
+                _SYSTEM_MESSAGES[analysis_type],
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.7,
+            **params,
+        }
+        deferred = _deferred_requests.get()
+        if deferred is not None:
+            custom_id = f"{analysis_type}-{len(deferred)}"
+            deferred.append((custom_id, request))
+            return custom_id
+
+        return await self._limited_chat(request)
+
+    async def _complete_batch_cached(
+        self,
+        analysis_type: str,
+        prompt_template: str,
+        flagged: list[tuple],
+        features: list[tuple],
+        build_entries: Callable[[list[tuple]], list[str]],
+        max_tokens_per_entry: int,
+    ) -> dict[int, str]:
+        """
+        _complete_batch com cache por item no Redis (AI_ANALYSIS_CACHE_TTL).
+
+        Cada item sinalizado é identificado pelo hash das suas
+        características arredondadas (``features``), de modo que situações
+        equivalentes em outras notas e usuários reaproveitam o texto. Só os
+        itens sem texto em cache vão para a IA, numerados por
+        ``build_entries``.
+        """
+        hashes = [self._feature_hash(item_features) for item_features in features]
+        cached = await prompt_cache.get_analysis_texts(analysis_type, hashes)
+        texts = {index: text for index, text in enumerate(cached, 1) if text}
+        missing = [
+            index for index in range(1, len(flagged) + 1) if index not in texts
+        ]
+        if not missing:
+            return texts
+
+        fresh = await self._complete_batch(
+            _SYSTEM_MESSAGES[analysis_type],
+            prompt_template,
+            build_entries([flagged[index - 1] for index in missing]),
+            max_tokens_per_entry,
+        )
+        new_texts = {}
+        for position, index in enumerate(missing, 1):
+            if position in fresh:
+                texts[index] = fresh[position]
+                new_texts[hashes[index - 1]] = fresh[position]
+        await prompt_cache.set_analysis_texts(analysis_type, new_texts)
+        return texts
+
+    @staticmethod
+    def _feature_hash(features: tuple) -> str:
+        """Hash curto (BLAKE2b de 128 bits) das características de um item."""
+        return hashlib.blake2b(
+            json.dumps(features, default=str).encode(), digest_size=16
+        ).hexdigest()
+
+    @staticmethod
+    def _difference_bucket(current: float, average: float) -> int:
+        """Faixa de 10 pontos percentuais da diferença para a média."""
+        return int((current - average) / average * 100 // 10) * 10
+
+    async def _complete_batch(
+        self,
+        system_message: dict[str, str],
+        prompt_template: str,
+        entries: list[str],
+        max_tokens_per_entry: int,
+    ) -> dict[int, str]:
+        """
+        Analisa vários itens numerados em uma única chamada à IA.
+
+        ``prompt_template`` recebe os itens em ``{entries}`` e o formato de
+        resposta em ``{response_instructions}``. A resposta
+        segue o schema estrito _BATCH_RESPONSE_FORMAT e é devolvida como
+        {número do item: texto}. Itens que faltarem na resposta (ou todos,
+        se o JSON for inválido ou a chamada falhar) são pedidos
+        individualmente.
+        """
+        content = None
+        try:
+            async with self._llm_semaphore:
+                content = await self._cached_chat(
+                    messages=[
+                        system_message,
+                        {
+                            "role": "user",
+                            "content": prompt_template.format(
+                                response_instructions=_BATCH_RESPONSE_INSTRUCTIONS,
+                                entries="\n\n".join(entries),
+                            ),
+                        },
+                    ],
+                    temperature=0.7,
+                    max_tokens=max_tokens_per_entry * len(entries),
+                    response_format=_BATCH_RESPONSE_FORMAT,
+                )
+        except Exception as e:
+            logger.warning("batched completion failed: %s", e)
+
+        texts: dict[int, str] = {}
+        try:
+            payload = json.loads(content or "{}")
+            texts = {
+                int(entry["id"]): str(entry["analysis"])
+                for entry in payload.get("analyses", [])
+            }
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning("batched completion returned invalid JSON: %s", e)
+
+        missing = [
+            index for index in range(1, len(entries) + 1) if index not in texts
+        ]
+        if missing:
+            results = await asyncio.gather(
+                *(
+                    self._complete_entry(
+                        system_message,
+                        prompt_template,
+                        entries[index - 1],
+                        max_tokens_per_entry,
+                    )
+                    for index in missing
+                ),
+                return_exceptions=True,
+            )
+            for index, result in zip(missing, results):
+                if isinstance(result, BaseException):
+                    logger.warning("per-item completion failed: %s", result)
+                elif result:
+                    texts[index] = result
+
+        return texts
+
+    async def _complete_combined(
+        self, requests: list[tuple[str, dict[str, Any]]]
+    ) -> dict[str, str]:
+        """
+        Conclui vários pedidos de análise em uma única chamada à IA.
+
+        Cada pedido vira uma seção numerada de _COMBINED_PROMPT e a
+        resposta segue _BATCH_RESPONSE_FORMAT; seções que faltarem são
+        refeitas individualmente por _complete_batch. Devolve
+        {custom_id: texto}; em caso de falha, um dicionário vazio.
+        """
+        entries = [
+            f"[{index}] "
+            + request["messages"][-1]["content"]
+            .replace(_DESCRIPTION_RESPONSE_INSTRUCTIONS, "")
+            .strip()
+            for index, (_, request) in enumerate(requests, 1)
+        ]
+        max_tokens = max(request.get("max_tokens") or 300 for _, request in requests)
+        try:
+            texts = await self._complete_batch(
+                _SYSTEM_MESSAGES["monthly_analyses"],
+                _COMBINED_PROMPT,
+                entries,
+                max_tokens,
+            )
+        except Exception as e:
+            logger.warning("combined monthly analyses failed: %s", e)
+            return {}
+        return {
+            custom_id: texts[index]
+            for index, (custom_id, _) in enumerate(requests, 1)
+            if index in texts
+        }
+
+    async def _complete_entry(
+        self,
+        system_message: dict[str, str],
+        prompt_template: str,
+        entry: str,
+        max_tokens: int,
+    ) -> Optional[str]:
+        """Analisa um único item de um lote (fallback de _complete_batch)."""
+        async with self._llm_semaphore:
+            content = await self._cached_chat(
+                messages=[
+                    system_message,
+                    {
+                        "role": "user",
+                        "content": prompt_template.format(
+                            response_instructions=(
+                                _DESCRIPTION_RESPONSE_INSTRUCTIONS
+                            ),
+                            entries=entry,
+                        ),
+                    },
+                ],
+                temperature=0.7,
+                max_tokens=max_tokens,
+                response_format=_DESCRIPTION_RESPONSE_FORMAT,
+            )
+        return self._parse_description(content)
+
     async def _generate_category_insights(
         self,
         invoice: Invoice,
@@ -410,101 +1265,114 @@ class AIAnalyzer:
         """
         Gera insights sobre gastos por categoria.
         """
-        insights = []
+        flagged = []
 
         # Agrupar itens por categoria
-        category_totals = {}
+        category_totals: defaultdict[str, float] = defaultdict(float)
         for item in items:
-            category = item.category_name or "Outros"
-            if category not in category_totals:
-                category_totals[category] = Decimal("0")
-            category_totals[category] += item.total_price
-
-        # Para cada categoria com valor significativo
-        for category, total in category_totals.items():
-            if total < Decimal("50"):
-                continue
-
-            # Buscar gastos mensais nesta categoria
-            month_start = invoice.issue_date.replace(day=1)
-            result = await db.execute(
-                select(func.sum(InvoiceItem.total_price))
-                .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
-                .where(
-                    and_(
-                        Invoice.user_id == invoice.user_id,
-                        InvoiceItem.category_name == category,
-                        Invoice.issue_date >= month_start,
-                    )
-                )
+            category_totals[item.category_name or "Outros"] += float(
+                item.total_price
             )
-            month_total = result.scalar() or Decimal("0")
 
-            # Buscar média dos últimos 3 meses
-            three_months_ago = month_start - timedelta(days=90)
-            month_trunc = func.date_trunc("month", Invoice.issue_date).label("month")
+        # Categorias com valor significativo
+        categories = [
+            category
+            for category, total in category_totals.items()
+            if total >= 50
+        ]
+        if not categories:
+            return []
 
-            result = await db.execute(
-                select(
-                    month_trunc,
-                    func.sum(InvoiceItem.total_price).label("total"),
-                )
-                .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
-                .where(
-                    and_(
-                        Invoice.user_id == invoice.user_id,
-                        InvoiceItem.category_name == category,
-                        Invoice.issue_date >= three_months_ago,
-                    )
+        # Totais mensais dos últimos 3 meses de todas as categorias em uma
+        # única consulta; o total do mês corrente vem de um agregado filtrado
+        month_start = invoice.issue_date.replace(day=1)
+        three_months_ago = month_start - timedelta(days=90)
+        month_trunc = func.date_trunc("month", Invoice.issue_date).label("month")
+
+        result = await db.execute(
+            select(
+                InvoiceItem.category_name,
+                month_trunc,
+                func.sum(InvoiceItem.total_price).label("total"),
+                func.sum(InvoiceItem.total_price)
+                .filter(Invoice.issue_date >= month_start)
+                .label("current_total"),
+            )
+            .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
+            .where(
+                and_(
+                    Invoice.user_id == invoice.user_id,
+                    InvoiceItem.category_name.in_(categories),
+                    Invoice.issue_date >= three_months_ago,
                 )
-                .group_by(month_trunc)
             )
-            monthly_totals = result.all()
+            .group_by(InvoiceItem.category_name, month_trunc)
+        )
+        monthly_by_category: defaultdict[str, list[float]] = defaultdict(list)
+        current_by_category: defaultdict[str, float] = defaultdict(float)
+        for category, _, total, current_total in result.tuples():
+            monthly_by_category[category].append(float(total))
+            current_by_category[category] += float(current_total or 0)
 
+        for category in categories:
+            monthly_totals = monthly_by_category[category]
             if len(monthly_totals) < 2:
                 continue
 
-            avg_monthly = sum(m[1] for m in monthly_totals) / len(monthly_totals)
+            month_total = current_by_category[category]
+            avg_monthly = sum(monthly_totals) / len(monthly_totals)
 
             # Se gasto atual for 30% acima da média, gerar insight
-            if month_total > avg_monthly * Decimal("1.3"):
-                prompt = self._build_category_insight_prompt(
-                    category, month_total, avg_monthly, len(monthly_totals)
+            if month_total > avg_monthly * 1.3:
+                flagged.append(
+                    (category, month_total, avg_monthly, len(monthly_totals))
                 )
 
-                response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": (
-                                "Você é um analista financeiro especializado "
-                                "em controle de gastos."
-                            ),
-                        },
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.7,
-                    max_tokens=300,
-                )
+        if not flagged:
+            return []
 
-                ai_text = response.choices[0].message.content
+        # Uma única chamada à IA para as categorias sinalizadas sem texto
+        # em cache
+        texts = await self._complete_batch_cached(
+            "category_insight",
+            _CATEGORY_INSIGHTS_PROMPT,
+            flagged,
+            [
+                (
+                    category,
+                    round(month_total),
+                    round(avg_monthly),
+                    months,
+                    self._difference_bucket(month_total, avg_monthly),
+                )
+                for category, month_total, avg_monthly, months in flagged
+            ],
+            self._category_insight_entries,
+            max_tokens_per_entry=300,
+        )
 
-                insight = Analysis(
+        insights = []
+        for index, (category, month_total, avg_monthly, months) in enumerate(
+            flagged, 1
+        ):
+            diff_percent = (month_total - avg_monthly) / avg_monthly * 100
+            insights.append(
+                Analysis(
                     user_id=invoice.user_id,
                     invoice_id=invoice.id,
                     type="category_insight",
                     priority="medium",
                     title=f"Gasto elevado em {category}",
-                    description=ai_text,
+                    description=texts.get(index) or (
+                        f"Seus gastos com {category} este mês estão "
+                        f"{diff_percent:.1f}% acima da média mensal."
+                    ),
                     details={
                         "category": category,
-                        "current_month_total": float(month_total),
-                        "average_monthly": float(avg_monthly),
-                        "difference_percent": float(
-                            (month_total - avg_monthly) / avg_monthly * 100
-                        ),
-                        "months_analyzed": len(monthly_totals),
+                        "current_month_total": month_total,
+                        "average_monthly": avg_monthly,
+                        "difference_percent": diff_percent,
+                        "months_analyzed": months,
                     },
                     reference_period_start=three_months_ago,
                     reference_period_end=invoice.issue_date,
@@ -512,8 +1380,7 @@ class AIAnalyzer:
                     ai_model=self.model,
                     confidence_score=0.75,
                 )
-
-                insights.append(insight)
+            )
 
         return insights
 
@@ -527,102 +1394,86 @@ class AIAnalyzer:
         """
         Analisa o estabelecimento e gera insights.
         """
-        if not merchant:
+        if not merchant or not merchant.category:
             return None
 
-        # Buscar histórico de compras neste merchant
-        result = await db.execute(
+        # Ticket médio e visitas de cada merchant da categoria, com a média
+        # da categoria e o número de merchants calculados por janela
+        peers = (
             select(
+                Merchant.id.label("merchant_id"),
                 func.count(Invoice.id).label("visit_count"),
-                func.sum(Invoice.total_value).label("total_spent"),
                 func.avg(Invoice.total_value).label("avg_ticket"),
-            ).where(
+                func.avg(func.avg(Invoice.total_value)).over().label("category_avg"),
+                func.count().over().label("peer_count"),
+            )
+            .join(Invoice, Invoice.merchant_id == Merchant.id)
+            .where(
                 and_(
                     Invoice.user_id == invoice.user_id,
-                    Invoice.merchant_id == merchant.id,
+                    Merchant.category == merchant.category,
                 )
             )
+            .group_by(Merchant.id)
+            .subquery()
+        )
+        result = await db.execute(
+            select(peers).where(peers.c.merchant_id == merchant.id)
         )
         merchant_stats = result.first()
 
-        if not merchant_stats or merchant_stats.visit_count < 3:
+        if (
+            not merchant_stats
+            or merchant_stats.visit_count < 3
+            or merchant_stats.peer_count < 2
+        ):
             return None
 
-        # Comparar com outros merchants da mesma categoria
-        if merchant.category:
-            result = await db.execute(
-                select(Merchant.name, func.avg(Invoice.total_value).label("avg_ticket"))
-                .join(Invoice, Invoice.merchant_id == Merchant.id)
-                .where(
-                    and_(
-                        Invoice.user_id == invoice.user_id,
-                        Merchant.category == merchant.category,
-                    )
-                )
-                .group_by(Merchant.id)
-                .order_by(func.avg(Invoice.total_value).asc())
-            )
-            category_merchants = result.all()
+        current_avg = float(merchant_stats.avg_ticket)
+        category_avg = float(merchant_stats.category_avg)
 
-            if len(category_merchants) > 1:
-                # Encontrar posição deste merchant
-                current_avg = float(merchant_stats.avg_ticket)
-                category_avg = sum(m[1] for m in category_merchants) / len(
-                    category_merchants
-                )
-
-                # Se ticket médio for 20% acima da categoria
-                if current_avg > category_avg * 1.2:
-                    prompt = self._build_merchant_insight_prompt(
-                        merchant.name,
-                        merchant.category,
-                        current_avg,
-                        category_avg,
-                        merchant_stats.visit_count,
-                    )
+        # Se ticket médio for 20% acima da categoria
+        if current_avg <= category_avg * 1.2:
+            return None
 
-                    response = await self.client.chat.completions.create(
-                        model=self.model,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": (
-                                    "Você é um analista de compras "
-                                    "especializado em comparação de preços "
-                                    "entre estabelecimentos."
-                                ),
-                            },
-                            {"role": "user", "content": prompt},
-                        ],
-                        temperature=0.7,
-                        max_tokens=300,
-                    )
+        prompt = self._build_merchant_insight_prompt(
+            merchant.name,
+            merchant.category,
+            current_avg,
+            category_avg,
+            merchant_stats.visit_count,
+        )
 
-                    ai_text = response.choices[0].message.content
-
-                    return Analysis(
-                        user_id=invoice.user_id,
-                        invoice_id=invoice.id,
-                        type="merchant_pattern",
-                        priority="medium",
-                        title=f"Preços acima da média em {merchant.name}",
-                        description=ai_text,
-                        details={
-                            "merchant_name": merchant.name,
-                            "merchant_category": merchant.category,
-                            "current_avg_ticket": current_avg,
-                            "category_avg_ticket": category_avg,
-                            "difference_percent": (
-                                (current_avg - category_avg) / category_avg * 100
-                            ),
-                            "visit_count": merchant_stats.visit_count,
-                        },
-                        related_merchants=[merchant.id],
-                        ai_model=self.model,
-                        confidence_score=0.7,
-                    )
+        ai_text = self._parse_description(
+            await self._chat(
+                "merchant_pattern",
+                prompt,
+                max_tokens=300,
+                response_format=_DESCRIPTION_RESPONSE_FORMAT,
+            )
+        )
 
-        return None
+        return Analysis(
+            user_id=invoice.user_id,
+            invoice_id=invoice.id,
+            type="merchant_pattern",
+            priority="medium",
+            title=f"Preços acima da média em {merchant.name}",
+            description=ai_text,
+            details={
+                "merchant_name": merchant.name,
+                "merchant_category": merchant.category,
+                "current_avg_ticket": current_avg,
+                "category_avg_ticket": category_avg,
+                "difference_percent": (
+                    (current_avg - category_avg) / category_avg * 100
+                ),
+                "visit_count": merchant_stats.visit_count,
+            },
+            related_merchants=[merchant.id],
+            ai_model=self.model,
+            confidence_score=0.7,
+        )
 
     async def _generate_purchase_summary(
         self,
@@ -633,47 +1484,329 @@ class AIAnalyzer:
     ) -> Optional[Analysis]:
         """
         Gera um resumo da compra com insights gerais.
+
+        Se a mesma cesta (itens, quantidades, preços e estabelecimento) já
+        foi resumida para o usuário nos últimos 30 dias, reaproveita o texto
+        em vez de chamar a IA.
         """
         if len(items) < 3:
             return None
 
-        # Preparar dados para a IA
-        items_summary = [
-            {
-                "description": item.description,
-                "quantity": item.quantity,
-                "unit_price": float(item.unit_price),
-                "total_price": float(item.total_price),
-                "category": item.category_name,
-            }
-            for item in items
+        result = await db.execute(
+            select(Analysis.description)
+            .where(
+                and_(
+                    Analysis.user_id == invoice.user_id,
+                    Analysis.type == "summary",
+                    Analysis.details["basket_hash"].as_string()
+                    == self._basket_hash(items, merchant),
+                    Analysis.created_at >= utcnow() - timedelta(days=30),
+                )
+            )
+            .order_by(Analysis.created_at.desc())
+            .limit(1)
+        )
+        ai_text = result.scalar()
+
+        if ai_text is None:
+            ai_text = self._parse_description(
+                await self._chat(
+                    "summary",
+                    self._summary_prompt(invoice, items, merchant),
+                    max_tokens=400,
+                    response_format=_DESCRIPTION_RESPONSE_FORMAT,
+                )
+            )
+
+        return self._summary_analysis(invoice, items, merchant, ai_text)
+
+    async def _defer_monthly(
+        self,
+        user_id: Any,
+        analyses: list[Analysis],
+        requests: list[tuple[str, dict[str, Any]]],
+        db: AsyncSession,
+    ) -> None:
+        """
+        Guarda as análises mensais adiadas em analysis_batches.
+
+        ``analyses`` trazem o custom_id do seu pedido em ``description``. A
+        linha é gravada pelo commit do chamador, junto com as demais
+        análises da nota; se o usuário já tiver um lote pendente (de
+        qualquer instância), esta é descartada.
+        """
+        await db.execute(
+            pg_insert(AnalysisBatch)
+            .values(
+                user_id=user_id,
+                requests=[list(request) for request in requests],
+                analyses=[self._dump_analysis(analysis) for analysis in analyses],
+            )
+            .on_conflict_do_nothing(index_elements=[AnalysisBatch.user_id])
+        )
+
+    async def complete_pending_batches(self) -> None:
+        """
+        Avança os lotes de análises mensais gravados em analysis_batches.
+
+        Chamado periodicamente por tasks/complete_analysis_batches. As
+        chamadas à OpenAI rodam sem transação aberta; só a gravação final
+        trava a linha (SKIP LOCKED), então várias instâncias da API podem
+        rodar isto ao mesmo tempo sem concluir um lote duas vezes.
+        """
+        async with self._session_factory() as db:
+            batch_ids = (await db.execute(select(AnalysisBatch.id))).scalars().all()
+        for batch_id in batch_ids:
+            try:
+                await self._advance_batch(batch_id)
+            except Exception as e:
+                logger.warning("analysis batch %s failed: %s", batch_id, e)
+
+    async def _advance_batch(self, batch_id: Any) -> None:
+        """
+        Dá o próximo passo de um lote: envia, consulta ou conclui.
+
+        Lotes ainda não enviados sobem para a Batch API. Quando o lote
+        termina, os pedidos que ele não resolveu são feitos um a um pelo
+        fluxo normal. Nada disso segura conexão ou trava: a linha só é
+        travada de novo para gravar as análises concluídas e removê-la na
+        mesma transação. Linhas mais velhas que _BATCH_MAX_AGE são
+        descartadas.
+        """
+        async with self._session_factory() as db:
+            row = (
+                await db.execute(
+                    select(AnalysisBatch).where(AnalysisBatch.id == batch_id)
+                )
+            ).scalar_one_or_none()
+        if row is None:
+            # Concluído em outra instância
+            return
+
+        if utcnow() - row.created_at > _BATCH_MAX_AGE:
+            logger.warning("analysis batch %s expired", row.id)
+            async with self._session_factory() as db:
+                await db.execute(delete(AnalysisBatch).where(AnalysisBatch.id == row.id))
+                await db.commit()
+            return
+
+        requests = [(custom_id, request) for custom_id, request in row.requests]
+        if row.batch_id is None:
+            await self._submit_pending_batch(row.id, requests)
+            return
+        if row.batch_id == _BATCH_SUBMITTING:
+            # Envio em andamento em outra instância
+            return
+
+        batch = await self.client.batches.retrieve(row.batch_id)
+        if batch.status not in _BATCH_TERMINAL_STATUSES:
+            return
+        texts = await self._batch_texts(batch)
+
+        missing = [
+            (custom_id, request)
+            for custom_id, request in requests
+            if custom_id not in texts
         ]
+        results = await asyncio.gather(
+            *(self._limited_chat(request) for _, request in missing),
+            return_exceptions=True,
+        )
+        for (custom_id, _), chat_result in zip(missing, results):
+            if isinstance(chat_result, BaseException):
+                logger.warning("deferred completion failed: %s", chat_result)
+            elif description := self._parse_description(chat_result):
+                texts[custom_id] = description
+
+        async with self._session_factory() as db:
+            locked = await db.execute(
+                select(AnalysisBatch.id)
+                .where(AnalysisBatch.id == row.id)
+                .with_for_update(skip_locked=True)
+            )
+            if locked.scalar_one_or_none() is None:
+                # Concluído ou sendo gravado por outra instância
+                return
+            for values in row.analyses:
+                text = texts.get(values["description"])
+                if text:
+                    db.add(
+                        self._load_analysis(
+                            row.user_id, {**values, "description": text}
+                        )
+                    )
+            await db.execute(delete(AnalysisBatch).where(AnalysisBatch.id == row.id))
+            await db.commit()
+
+    async def _submit_pending_batch(
+        self, row_id: Any, requests: list[tuple[str, dict[str, Any]]]
+    ) -> None:
+        """
+        Envia o lote de uma linha ainda não enviada.
+
+        A linha é reservada antes com um UPDATE condicional (batch_id de
+        NULL para _BATCH_SUBMITTING), para que só uma instância envie, e o
+        envio roda sem transação aberta. Se o envio falhar a reserva é
+        desfeita; se o processo cair no meio, a linha expira em
+        _BATCH_MAX_AGE.
+        """
+        async with self._session_factory() as db:
+            claimed = await db.execute(
+                update(AnalysisBatch)
+                .where(AnalysisBatch.id == row_id, AnalysisBatch.batch_id.is_(None))
+                .values(batch_id=_BATCH_SUBMITTING)
+            )
+            await db.commit()
+        if claimed.rowcount != 1:
+            return
+
+        submitted = None
+        try:
+            submitted = await self._submit_batch(requests)
+        finally:
+            # Grava o id do lote, ou desfaz a reserva se o envio falhou
+            async with self._session_factory() as db:
+                await db.execute(
+                    update(AnalysisBatch)
+                    .where(AnalysisBatch.id == row_id)
+                    .values(batch_id=submitted)
+                )
+                await db.commit()
+
+    async def _submit_batch(self, requests: list[tuple[str, dict[str, Any]]]) -> str:
+        """
+        Envia pedidos de chat para a Batch API da OpenAI.
 
-        prompt = self._build_summary_prompt(
+        Sobe os pedidos (custom_id, parâmetros) como JSONL e devolve o id do
+        lote, que termina em até 24h.
+        """
+        requests_jsonl = "\n".join(
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {"model": self.model, **request},
+                },
+                ensure_ascii=False,
+            )
+            for custom_id, request in requests
+        )
+        batch_file = await self.client.files.create(
+            file=("requests.jsonl", requests_jsonl.encode()),
+            purpose="batch",
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return str(batch.id)
+
+    async def _batch_texts(self, batch: Any) -> dict[str, str]:
+        """{custom_id: texto} dos pedidos concluídos com sucesso no lote."""
+        if batch.status != "completed":
+            logger.warning("batch %s ended as %s", batch.id, batch.status)
+        # Lotes expirados também trazem as respostas que ficaram prontas
+        if not batch.output_file_id:
+            return {}
+
+        output = await self.client.files.content(batch.output_file_id)
+        texts: dict[str, str] = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if response.get("status_code") == 200 and (
+                description := self._parse_description(
+                    response["body"]["choices"][0]["message"]["content"]
+                )
+            ):
+                texts[entry["custom_id"]] = description
+        return texts
+
+    @staticmethod
+    def _dump_analysis(analysis: Analysis) -> dict[str, Any]:
+        """Valores de uma análise adiada, serializáveis em JSON."""
+        values: dict[str, Any] = json.loads(
+            json.dumps(
+                {
+                    name: value
+                    for name in _DEFERRED_ANALYSIS_COLUMNS
+                    if (value := getattr(analysis, name)) is not None
+                },
+                default=str,
+            )
+        )
+        return values
+
+    @staticmethod
+    def _load_analysis(user_id: Any, values: dict[str, Any]) -> Analysis:
+        """Recria uma análise adiada a partir de _dump_analysis."""
+        values = dict(values)
+        for name in ("reference_period_start", "reference_period_end"):
+            if name in values:
+                values[name] = datetime.fromisoformat(values[name]).date()
+        if "invoice_id" in values:
+            values["invoice_id"] = uuid.UUID(values["invoice_id"])
+        return Analysis(user_id=user_id, **values)
+
+    def _summary_prompt(
+        self,
+        invoice: Invoice,
+        items: list[InvoiceItem],
+        merchant: Optional[Merchant],
+    ) -> str:
+        """Monta o prompt de resumo da compra com os itens mais caros."""
+        top_items = heapq.nlargest(
+            _SUMMARY_MAX_ITEMS, items, key=lambda item: item.total_price
+        )
+
+        return self._build_summary_prompt(
             invoice.total_value,
-            items_summary,
+            (
+                (item.description, item.quantity, item.unit_price, item.total_price)
+                for item in top_items
+            ),
+            len(items),
             merchant.name if merchant else None,
             merchant.category if merchant else None,
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Você é um assistente financeiro que ajuda "
-                        "usuários a entenderem suas compras."
-                    ),
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=400,
+    @staticmethod
+    def _basket_hash(
+        items: list[InvoiceItem], merchant: Optional[Merchant]
+    ) -> str:
+        """Hash da cesta de compras, independente da ordem dos itens."""
+        basket = sorted(
+            f"{item.description}:{item.quantity}:{item.unit_price}"
+            for item in items
         )
+        basket.append(str(merchant.id) if merchant else "")
+        return hashlib.sha256("\n".join(basket).encode()).hexdigest()
+
+    @staticmethod
+    def _parse_description(content: Optional[str]) -> Optional[str]:
+        """Extrai o texto de uma resposta {"description": ...}.
 
-        ai_text = response.choices[0].message.content
+        Se a resposta não for o JSON esperado, usa o conteúdo bruto.
+        """
+        if content is None:
+            return None
+        try:
+            return str(json.loads(content)["description"])
+        except (ValueError, TypeError, KeyError):
+            return content
 
+    def _summary_analysis(
+        self,
+        invoice: Invoice,
+        items: list[InvoiceItem],
+        merchant: Optional[Merchant],
+        ai_text: Optional[str],
+    ) -> Analysis:
+        """Cria a análise do tipo "summary" a partir do texto da IA."""
         return Analysis(
             user_id=invoice.user_id,
             invoice_id=invoice.id,
@@ -686,8 +1819,9 @@ class AIAnalyzer:
                 "item_count": len(items),
                 "merchant": merchant.name if merchant else None,
                 "categories": list(
-                    set(item.category_name for item in items if item.category_name)
+                    {item.category_name for item in items if item.category_name}
                 ),
+                "basket_hash": self._basket_hash(items, merchant),
             },
             ai_model=self.model,
             confidence_score=0.85,
@@ -697,53 +1831,105 @@ class AIAnalyzer:
     # New profile-aware analyses
     # =========================================================================
 
+    async def _month_totals(
+        self, invoice: Invoice, db: AsyncSession
+    ) -> MonthTotals:
+        """
+        Agregados do mês da nota e média dos 3 meses fechados anteriores.
+
+        Uma única ida ao banco: os agregados ao vivo do mês corrente (soma,
+        contagens filtradas) e a média calculada sobre a view materializada
+        vêm juntos em um UNION ALL de duas linhas; na linha da média as
+        contagens vêm nulas.
+        """
+        month_query = self._month_spent_query(invoice).add_columns(
+            func.count(),
+            func.count().filter(Invoice.total_value < 50),
+            func.count(func.distinct(Invoice.merchant_id)),
+            literal(True).label("current"),
+        )
+        previous_query = self._previous_months_average_query(invoice).add_columns(
+            null(), null(), null(), literal(False).label("current")
+        )
+        result = await db.execute(union_all(month_query, previous_query))
+
+        month = (0.0, 0, 0, 0)
+        prev_average = None
+        for total, count, small_count, merchant_count, current in result.tuples():
+            if current:
+                month = (float(total or 0), count, small_count, merchant_count)
+            elif total is not None:
+                prev_average = float(total)
+        month_spent, invoice_count, small_purchase_count, merchant_count = month
+        return MonthTotals(
+            month_spent,
+            prev_average,
+            invoice_count,
+            small_purchase_count,
+            merchant_count,
+        )
+
+    @staticmethod
+    def _month_spent_query(invoice: Invoice) -> Any:
+        """Soma das notas do usuário no mês da nota."""
+        return select(func.sum(Invoice.total_value)).where(
+            and_(
+                Invoice.user_id == invoice.user_id,
+                Invoice.issue_date >= invoice.issue_date.replace(day=1),
+            )
+        )
+
+    @staticmethod
+    def _previous_months_average_query(invoice: Invoice) -> Any:
+        """
+        Média mensal gasta pelo usuário nos 3 meses fechados anteriores.
+
+        Lê a view materializada mv_user_month_totals em vez de agregar as
+        notas a cada análise; o mês corrente continua sendo somado ao vivo
+        (_month_spent_query).
+        """
+        first_month, current_month = AIAnalyzer._previous_months_bounds(
+            invoice.issue_date
+        )
+        return select(func.avg(user_month_totals.c.total)).where(
+            and_(
+                user_month_totals.c.user_id == invoice.user_id,
+                user_month_totals.c.month >= first_month,
+                user_month_totals.c.month < current_month,
+            )
+        )
+
+    @staticmethod
+    def _previous_months_bounds(issue_date: datetime) -> tuple[datetime, datetime]:
+        """Início do 3º mês fechado anterior à nota e início do mês da nota."""
+        current_month = issue_date.replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        return current_month - relativedelta(months=3), current_month
+
     async def _analyze_budget_health(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
+        month_totals: MonthTotals,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Avalia proporção dos gastos com compras vs renda mensal (DIEESE benchmarks)."""
-        income = profile["household_income"]
+        income = profile.household_income
         if not income or income <= 0:
             return None
 
         month_start = invoice.issue_date.replace(day=1)
-        result = await db.execute(
-            select(func.sum(Invoice.total_value)).where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= month_start,
-                )
-            )
-        )
-        month_spent = float(result.scalar() or 0)
-
-        # Also get last 3 months average for trend
-        three_months_ago = month_start - timedelta(days=90)
-        result = await db.execute(
-            select(
-                func.date_trunc("month", Invoice.issue_date).label("month"),
-                func.sum(Invoice.total_value).label("total"),
-            )
-            .where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= three_months_ago,
-                    Invoice.issue_date < month_start,
-                )
-            )
-            .group_by("month")
-        )
-        prev_months = result.all()
+        # Current month and last 3 months (for trend)
+        month_spent = month_totals.month_spent
         avg_prev = (
-            float(sum(m.total for m in prev_months) / len(prev_months))
-            if prev_months
+            month_totals.prev_average
+            if month_totals.prev_average is not None
             else month_spent
         )
 
         pct_income = (month_spent / income) * 100
-        family_size = self._get_weighted_family_size(profile)
+        family_size = profile.family_size
 
         # DIEESE benchmarks: 20-35% for food. Adjust threshold by family size
         threshold = 25 + (family_size - 1) * 2  # bigger families naturally spend more %
@@ -759,31 +1945,23 @@ class AIAnalyzer:
         else:
             priority = "low"
 
-        prompt = (
-            f"Analise a saúde do orçamento familiar:\n\n"
-            f"Renda mensal: R$ {income:,.2f}\n"
-            f"Gasto com compras este mês: R$ {month_spent:,.2f} ({pct_income:.1f}% da renda)\n"
-            f"Média dos últimos 3 meses: R$ {avg_prev:,.2f}\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n"
-            f"Referência DIEESE: famílias brasileiras gastam 20-35% da renda com alimentação\n\n"
-            f"Forneça uma análise concisa (máximo 3 frases):\n"
-            f"1. Avaliação da proporção atual vs benchmark\n"
-            f"2. Impacto no orçamento familiar\n"
-            f"3. Uma ação concreta para o próximo mês\n\n"
-            f"Use linguagem amigável de coach financeiro."
-        )
-
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um consultor financeiro pessoal especializado em finanças domésticas brasileiras.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
+        prompt = _BUDGET_HEALTH_PROMPT.format_map({
+            "response_instructions": _DESCRIPTION_RESPONSE_INSTRUCTIONS,
+            "income": income,
+            "month_spent": month_spent,
+            "pct_income": pct_income,
+            "avg_prev": avg_prev,
+            "adults_count": profile.adults_count,
+            "children_count": profile.children_count,
+        })
+
+        ai_text = self._parse_description(
+            await self._chat(
+                "budget_health",
+                prompt,
+                max_tokens=300,
+                response_format=_DESCRIPTION_RESPONSE_FORMAT,
+            )
         )
 
         return Analysis(
@@ -791,7 +1969,7 @@ class AIAnalyzer:
             type="budget_health",
             priority=priority,
             title="Saúde do Orçamento Familiar",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "month_spent": month_spent,
                 "household_income": income,
@@ -809,49 +1987,24 @@ class AIAnalyzer:
     async def _analyze_per_capita_spending(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
+        month_totals: MonthTotals,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Calcula gasto mensal per capita usando escala OECD."""
-        family_size = self._get_weighted_family_size(profile)
+        family_size = profile.family_size
         if family_size <= 0:
             return None
 
-        month_start = invoice.issue_date.replace(day=1)
-        result = await db.execute(
-            select(func.sum(Invoice.total_value)).where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= month_start,
-                )
-            )
-        )
-        month_spent = float(result.scalar() or 0)
+        month_spent = month_totals.month_spent
         per_capita = month_spent / family_size
 
         # Get 3 month average per capita
-        three_months_ago = month_start - timedelta(days=90)
-        result = await db.execute(
-            select(
-                func.date_trunc("month", Invoice.issue_date).label("month"),
-                func.sum(Invoice.total_value).label("total"),
-            )
-            .where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= three_months_ago,
-                    Invoice.issue_date < month_start,
-                )
-            )
-            .group_by("month")
-        )
-        prev_months = result.all()
-        if not prev_months:
+        three_months_ago, _ = self._previous_months_bounds(invoice.issue_date)
+        if month_totals.prev_average is None:
             return None
 
-        avg_per_capita = float(
-            sum(m.total for m in prev_months) / len(prev_months) / family_size
-        )
+        avg_per_capita = month_totals.prev_average / family_size
         change_pct = ((per_capita - avg_per_capita) / avg_per_capita * 100) if avg_per_capita > 0 else 0
 
         if abs(change_pct) < 20 and per_capita < 500:
@@ -865,34 +2018,25 @@ class AIAnalyzer:
             priority = "low"
 
         income_per_capita = None
-        if profile["household_income"] and profile["household_income"] > 0:
-            income_per_capita = profile["household_income"] / family_size
-
-        prompt = (
-            f"Analise o gasto per capita desta família:\n\n"
-            f"Gasto per capita este mês: R$ {per_capita:,.2f}\n"
-            f"Média per capita últimos 3 meses: R$ {avg_per_capita:,.2f}\n"
-            f"Variação: {change_pct:+.1f}%\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s) "
-            f"(peso OECD: {family_size:.1f} equivalentes)\n"
-            + (f"Renda per capita: R$ {income_per_capita:,.2f}\n" if income_per_capita else "")
-            + f"\nForneça uma análise concisa (máximo 3 frases):\n"
-            f"1. Avaliação da evolução do gasto per capita\n"
-            f"2. Se o aumento é proporcional ao tamanho da família\n"
-            f"3. Dica prática para otimizar\n\n"
-            f"Use linguagem amigável."
-        )
-
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um consultor financeiro pessoal especializado em finanças domésticas.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
+        if profile.household_income and profile.household_income > 0:
+            income_per_capita = profile.household_income / family_size
+
+        template = (
+            _PER_CAPITA_PROMPT_WITH_INCOME if income_per_capita else _PER_CAPITA_PROMPT
+        )
+        prompt = template.format_map({
+            "per_capita": per_capita,
+            "avg_per_capita": avg_per_capita,
+            "change_pct": change_pct,
+            "adults_count": profile.adults_count,
+            "children_count": profile.children_count,
+            "family_size": family_size,
+            "income_per_capita": income_per_capita,
+        })
+
+        ai_text = await self._chat(
+            "per_capita_spending",
+            prompt,
             max_tokens=300,
         )
 
@@ -901,7 +2045,7 @@ class AIAnalyzer:
             type="per_capita_spending",
             priority=priority,
             title="Gasto Por Pessoa da Família",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "per_capita_current": round(per_capita, 2),
                 "per_capita_avg_3m": round(avg_per_capita, 2),
@@ -919,42 +2063,34 @@ class AIAnalyzer:
         self,
         invoice: Invoice,
         items: list[InvoiceItem],
-        profile: dict[str, Any],
+        profile: Profile,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Classifica itens entre essenciais e não-essenciais."""
         if len(items) < 5:
             return None
 
-        essential_categories = {
-            "alimentos", "alimentos básicos", "carnes", "frutas", "verduras",
-            "legumes", "laticínios", "padaria", "cereais", "grãos",
-            "higiene", "higiene pessoal", "limpeza", "bebê", "infantil",
-        }
-        non_essential_categories = {
-            "bebidas alcoólicas", "snacks", "doces", "guloseimas",
-            "conveniência", "petiscos", "refrigerantes", "cervejas",
-        }
-        non_essential_keywords = [
-            "cerveja", "vinho", "whisky", "vodka", "refrigerante", "salgadinho",
-            "chocolate", "sorvete", "biscoito recheado", "energetico", "energy",
-        ]
-
-        essential_total = Decimal("0")
-        non_essential_total = Decimal("0")
-        total = Decimal("0")
-
-        for item in items:
-            total += item.total_price
-            cat = (item.category_name or "").lower().strip()
-            desc = (item.description or "").lower()
-
-            if cat in non_essential_categories or any(
-                kw in desc for kw in non_essential_keywords
-            ):
-                non_essential_total += item.total_price
-            elif cat in essential_categories:
-                essential_total += item.total_price
+        # Classificação feita pelo Postgres em uma única agregação; supérfluo
+        # tem precedência sobre essencial, como na categoria
+        category = func.lower(func.btrim(InvoiceItem.category_name))
+        non_essential = or_(
+            category.in_(_NON_ESSENTIAL_CATEGORIES),
+            InvoiceItem.description.op("~*")(_NON_ESSENTIAL_PATTERN),
+        )
+        essential = and_(~non_essential, category.in_(_ESSENTIAL_CATEGORIES))
+        result = await db.execute(
+            select(
+                func.coalesce(
+                    func.sum(case((essential, InvoiceItem.total_price), else_=0)), 0
+                ),
+                func.coalesce(
+                    func.sum(case((non_essential, InvoiceItem.total_price), else_=0)),
+                    0,
+                ),
+                func.coalesce(func.sum(InvoiceItem.total_price), 0),
+            ).where(InvoiceItem.invoice_id == invoice.id)
+        )
+        essential_total, non_essential_total, total = result.one()
 
         if total == 0:
             return None
@@ -963,7 +2099,7 @@ class AIAnalyzer:
         if non_essential_pct < 35:
             return None
 
-        income = profile["household_income"]
+        income = profile.household_income
         income_pct = None
         if income and income > 0:
             income_pct = float(non_essential_total) / income * 100
@@ -978,7 +2114,7 @@ class AIAnalyzer:
             f"Total da compra: R$ {total:.2f}\n"
             f"Itens essenciais: R$ {essential_total:.2f}\n"
             f"Itens não-essenciais: R$ {non_essential_total:.2f} ({non_essential_pct:.1f}%)\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n"
+            f"Família: {profile.adults_count} adulto(s) e {profile.children_count} criança(s)\n"
             + (f"Representa {income_pct:.1f}% da renda em supérfluos\n" if income_pct else "")
             + f"\nForneça uma análise concisa (máximo 3 frases):\n"
             f"1. Avaliação do equilíbrio essenciais/supérfluos\n"
@@ -987,16 +2123,9 @@ class AIAnalyzer:
             f"Use linguagem amigável e sem julgamento."
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um consultor de compras inteligentes especializado em economia doméstica.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
+        ai_text = await self._chat(
+            "essential_ratio",
+            prompt,
             max_tokens=300,
         )
 
@@ -1006,7 +2135,7 @@ class AIAnalyzer:
             type="essential_ratio",
             priority=priority,
             title="Proporção Essenciais vs Supérfluos",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "total_value": float(total),
                 "essential_total": float(essential_total),
@@ -1024,26 +2153,19 @@ class AIAnalyzer:
     async def _analyze_income_commitment(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
+        month_totals: MonthTotals,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Rastreia acumulado do mês e projeta se ultrapassará limites."""
-        income = profile["household_income"]
+        income = profile.household_income
         if not income or income <= 0:
             return None
 
         month_start = invoice.issue_date.replace(day=1)
         today = invoice.issue_date
 
-        result = await db.execute(
-            select(func.sum(Invoice.total_value)).where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= month_start,
-                )
-            )
-        )
-        accumulated = float(result.scalar() or 0)
+        accumulated = month_totals.month_spent
         pct_accumulated = (accumulated / income) * 100
 
         # Calculate days elapsed and remaining (issue_date is datetime)
@@ -1064,7 +2186,7 @@ class AIAnalyzer:
         projected_pct = (projected_total / income) * 100
 
         # Adjust threshold by family size
-        family_size = self._get_weighted_family_size(profile)
+        family_size = profile.family_size
         base_threshold = 30 + (family_size - 1) * 2
 
         if pct_accumulated < 20 and projected_pct < base_threshold:
@@ -1079,40 +2201,28 @@ class AIAnalyzer:
         else:
             priority = "low"
 
-        prompt = (
-            f"Analise o comprometimento da renda com mercado este mês:\n\n"
-            f"Renda mensal: R$ {income:,.2f}\n"
-            f"Gasto acumulado (dia {days_elapsed} de {days_in_month}): R$ {accumulated:,.2f} ({pct_accumulated:.1f}%)\n"
-            f"Taxa diária: R$ {daily_rate:,.2f}/dia\n"
-            f"Projeção para o mês: R$ {projected_total:,.2f} ({projected_pct:.1f}%)\n"
-            f"Dias restantes: {days_remaining}\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n\n"
-            f"Forneça uma análise concisa (máximo 3 frases):\n"
-            f"1. Situação atual do comprometimento\n"
-            f"2. Projeção e risco para o restante do mês\n"
-            f"3. Ação imediata para controlar gastos\n\n"
-            f"Use linguagem de alerta mas construtiva."
-        )
-
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um consultor financeiro pessoal que ajuda famílias a controlarem o orçamento mensal.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        prompt = _INCOME_COMMITMENT_PROMPT.format_map({
+            "income": income,
+            "days_elapsed": days_elapsed,
+            "days_in_month": days_in_month,
+            "accumulated": accumulated,
+            "pct_accumulated": pct_accumulated,
+            "daily_rate": daily_rate,
+            "projected_total": projected_total,
+            "projected_pct": projected_pct,
+            "days_remaining": days_remaining,
+            "adults_count": profile.adults_count,
+            "children_count": profile.children_count,
+        })
+
+        ai_text = await self._chat("income_commitment", prompt, max_tokens=300)
 
         return Analysis(
             user_id=invoice.user_id,
             type="income_commitment",
             priority=priority,
             title="Comprometimento da Renda com Mercado",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "accumulated": round(accumulated, 2),
                 "household_income": income,
@@ -1133,71 +2243,53 @@ class AIAnalyzer:
         self,
         invoice: Invoice,
         items: list[InvoiceItem],
-        profile: dict[str, Any],
+        profile: Profile,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Identifica e agrupa gastos com produtos infantis."""
-        if not profile["children_count"] or profile["children_count"] <= 0:
+        if not profile.children_count or profile.children_count <= 0:
             return None
 
-        child_keywords = [
-            "fralda", "fraldas", "leite", "papinha", "bebe", "bebê",
-            "infantil", "criança", "mamadeira", "chupeta", "lenço umedecido",
-            "toalha umedecida", "pomada", "talco", "mingau", "nan ",
-            "aptamil", "enfamil", "nestogeno", "mucilon",
+        child_items = [
+            item
+            for item in items
+            if _CHILD_KEYWORDS_RE.search((item.description or "").lower())
+            or "bebê" in (cat := (item.category_name or "").lower())
+            or "infantil" in cat
         ]
-
-        child_items = []
-        child_total = Decimal("0")
-        for item in items:
-            desc = (item.description or "").lower()
-            cat = (item.category_name or "").lower()
-            if any(kw in desc for kw in child_keywords) or "bebê" in cat or "infantil" in cat:
-                child_items.append(item)
-                child_total += item.total_price
-
         if len(child_items) < 2:
             return None
+        child_total = sum(item.total_price for item in child_items)
 
-        cost_per_child = float(child_total) / profile["children_count"]
-        income = profile["household_income"]
+        cost_per_child = float(child_total) / profile.children_count
+        income = profile.household_income
         income_pct = (float(child_total) / income * 100) if income and income > 0 else None
 
         # Get 3 month average for children spending
         month_start = invoice.issue_date.replace(day=1)
         three_months_ago = month_start - timedelta(days=90)
 
-        child_kw_filters = [
-            InvoiceItem.description.ilike(f"%{kw}%") for kw in child_keywords[:10]
-        ]
+        # Total and number of months that had data, in one query
         result = await db.execute(
-            select(func.sum(InvoiceItem.total_price))
+            select(
+                func.sum(InvoiceItem.total_price),
+                func.count(func.distinct(func.date_trunc("month", Invoice.issue_date))),
+            )
             .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
             .where(
                 and_(
                     Invoice.user_id == invoice.user_id,
                     Invoice.issue_date >= three_months_ago,
                     Invoice.issue_date < month_start,
-                    or_(*child_kw_filters),
+                    func.lower(InvoiceItem.description).op("~")(
+                        _CHILD_HISTORY_PATTERN
+                    ),
                 )
             )
         )
-        prev_total = float(result.scalar() or 0)
+        prev_total, prev_months_count = result.one()
         # Average over months that had data
-        result2 = await db.execute(
-            select(func.count(func.distinct(func.date_trunc("month", Invoice.issue_date))))
-            .join(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
-            .where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= three_months_ago,
-                    Invoice.issue_date < month_start,
-                    or_(*child_kw_filters),
-                )
-            )
-        )
-        prev_months_count = result2.scalar() or 1
-        avg_prev = prev_total / max(prev_months_count, 1)
+        avg_prev = float(prev_total or 0) / max(prev_months_count or 0, 1)
 
         change_pct = ((float(child_total) - avg_prev) / avg_prev * 100) if avg_prev > 0 else 0
 
@@ -1216,7 +2308,7 @@ class AIAnalyzer:
             f"Analise os gastos com produtos infantis nesta compra:\n\n"
             f"Total com produtos infantis: R$ {child_total:.2f}\n"
             f"Itens: {items_text}\n"
-            f"Número de crianças: {profile['children_count']}\n"
+            f"Número de crianças: {profile.children_count}\n"
             f"Custo por criança nesta compra: R$ {cost_per_child:.2f}\n"
             f"Média mensal anterior: R$ {avg_prev:.2f}\n"
             + (f"Representa {income_pct:.1f}% da renda\n" if income_pct else "")
@@ -1227,18 +2319,7 @@ class AIAnalyzer:
             f"Use linguagem empática e prática."
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um consultor de economia doméstica especializado em famílias com crianças no Brasil.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        ai_text = await self._chat("children_spending", prompt, max_tokens=300)
 
         return Analysis(
             user_id=invoice.user_id,
@@ -1246,12 +2327,12 @@ class AIAnalyzer:
             type="children_spending",
             priority=priority,
             title="Gastos com Crianças",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "child_items_count": len(child_items),
                 "child_total": float(child_total),
                 "cost_per_child": round(cost_per_child, 2),
-                "children_count": profile["children_count"],
+                "children_count": profile.children_count,
                 "avg_previous_months": round(avg_prev, 2),
                 "change_percent": round(change_pct, 1),
                 "income_percent": round(income_pct, 1) if income_pct else None,
@@ -1265,7 +2346,7 @@ class AIAnalyzer:
     async def _analyze_wholesale_opportunity(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Identifica produtos comprados frequentemente que seriam mais baratos no atacado."""
@@ -1285,33 +2366,49 @@ class AIAnalyzer:
         if len(patterns) < 3:
             return None
 
-        # Get product details for frequent purchases
+        # Product details for frequent purchases, in one query
+        frequent = [
+            p for p in patterns
+            if p.frequency and p.frequency.value in ("weekly", "biweekly")
+        ]
+        if not frequent:
+            return None
+        prod_result = await db.execute(
+            select(
+                Product.id,
+                Product.description,
+                Product.normalized_name,
+                Product.average_price,
+            ).where(Product.id.in_([p.target_id for p in frequent]))
+        )
+        products = {
+            product_id: (description, normalized_name, average_price)
+            for product_id, description, normalized_name, average_price
+            in prod_result.tuples()
+        }
+
         weekly_products = []
-        for p in patterns:
-            if p.frequency and p.frequency.value in ("weekly", "biweekly"):
-                # Get product info
-                prod_result = await db.execute(
-                    select(Product).where(Product.id == p.target_id)
-                )
-                product = prod_result.scalar_one_or_none()
-                if product:
-                    weekly_products.append({
-                        "name": product.description or product.normalized_name,
-                        "frequency": p.frequency.value,
-                        "avg_price": float(product.average_price) if product.average_price else 0,
-                        "occurrences": p.occurrence_count,
-                    })
+        for p in frequent:
+            product = products.get(p.target_id)
+            if product:
+                description, normalized_name, average_price = product
+                weekly_products.append({
+                    "name": description or normalized_name,
+                    "frequency": p.frequency.value if p.frequency else None,
+                    "avg_price": float(average_price) if average_price else 0,
+                    "occurrences": p.occurrence_count,
+                })
 
         if not weekly_products:
             return None
 
-        family_size = self._get_weighted_family_size(profile)
+        family_size = profile.family_size
         estimated_monthly_savings = sum(
             p["avg_price"] * 0.15 * (4 if p["frequency"] == "weekly" else 2)
             for p in weekly_products
         )
 
-        income = profile["household_income"]
+        income = profile.household_income
         if income and income > 0:
             savings_pct = estimated_monthly_savings / income * 100
         else:
@@ -1332,7 +2429,7 @@ class AIAnalyzer:
         prompt = (
             f"Analise oportunidades de compra no atacado/atacarejo:\n\n"
             f"Produtos comprados frequentemente em supermercado:\n{products_text}\n\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n"
+            f"Família: {profile.adults_count} adulto(s) e {profile.children_count} criança(s)\n"
             f"Economia estimada comprando no atacado: ~R$ {estimated_monthly_savings:.2f}/mês\n"
             + (f"Isso representa {savings_pct:.1f}% da renda mensal\n" if savings_pct else "")
             + f"\nForneça uma análise concisa (máximo 3 frases):\n"
@@ -1342,25 +2439,14 @@ class AIAnalyzer:
             f"Use linguagem prática e direta."
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um especialista em compras inteligentes no varejo brasileiro.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        ai_text = await self._chat("wholesale_opportunity", prompt, max_tokens=300)
 
         return Analysis(
             user_id=invoice.user_id,
             type="wholesale_opportunity",
             priority=priority,
             title="Oportunidade de Compra no Atacado",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "frequent_products": weekly_products[:6],
                 "estimated_monthly_savings": round(estimated_monthly_savings, 2),
@@ -1377,49 +2463,24 @@ class AIAnalyzer:
     async def _analyze_shopping_frequency(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
+        month_totals: MonthTotals,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Analisa frequência de visitas e custos ocultos das compras picadas."""
         month_start = invoice.issue_date.replace(day=1)
 
-        # Simpler approach: count invoices and get item counts
-        result = await db.execute(
-            select(Invoice.id, Invoice.total_value, Invoice.issue_date)
-            .where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= month_start,
-                )
-            )
-            .order_by(Invoice.issue_date)
-        )
-        month_invoices = result.all()
-        invoice_count = len(month_invoices)
-
+        invoice_count = month_totals.invoice_count
         if invoice_count < 8:
             return None
 
-        # Count distinct merchants
-        result = await db.execute(
-            select(func.count(func.distinct(Invoice.merchant_id))).where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= month_start,
-                    Invoice.merchant_id.isnot(None),
-                )
-            )
-        )
-        merchant_count = result.scalar() or 0
-
-        avg_ticket = float(
-            sum(inv.total_value for inv in month_invoices) / invoice_count
-        ) if invoice_count > 0 else 0
+        merchant_count = month_totals.merchant_count
+        avg_ticket = month_totals.month_spent / invoice_count
 
-        # Count small purchases (likely impulse)
-        small_purchase_count = sum(1 for inv in month_invoices if float(inv.total_value) < 50)
+        # Small purchases (likely impulse)
+        small_purchase_count = month_totals.small_purchase_count
 
-        family_size = self._get_weighted_family_size(profile)
+        family_size = profile.family_size
 
         if invoice_count >= 12 and avg_ticket < 80:
             priority = "high"
@@ -1428,39 +2489,23 @@ class AIAnalyzer:
         else:
             priority = "low"
 
-        prompt = (
-            f"Analise a frequência de compras e custos ocultos:\n\n"
-            f"Compras este mês: {invoice_count}\n"
-            f"Ticket médio: R$ {avg_ticket:.2f}\n"
-            f"Estabelecimentos diferentes: {merchant_count}\n"
-            f"Compras pequenas (<R$50): {small_purchase_count}\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n\n"
-            f"Forneça uma análise concisa (máximo 3 frases):\n"
-            f"1. Impacto das compras frequentes (impulso, deslocamento, tempo)\n"
-            f"2. Calendário otimizado de compras para este perfil familiar\n"
-            f"3. Economia estimada ao consolidar compras\n\n"
-            f"Use linguagem prática e motivadora."
-        )
+        prompt = _SHOPPING_FREQUENCY_PROMPT.format_map({
+            "invoice_count": invoice_count,
+            "avg_ticket": avg_ticket,
+            "merchant_count": merchant_count,
+            "small_purchase_count": small_purchase_count,
+            "adults_count": profile.adults_count,
+            "children_count": profile.children_count,
+        })
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um consultor de planejamento de compras especializado em otimização de tempo e dinheiro.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        ai_text = await self._chat("shopping_frequency", prompt, max_tokens=300)
 
         return Analysis(
             user_id=invoice.user_id,
             type="shopping_frequency",
             priority=priority,
             title="Frequência de Compras e Custos Ocultos",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "invoice_count": invoice_count,
                 "avg_ticket": round(avg_ticket, 2),
@@ -1478,84 +2523,69 @@ class AIAnalyzer:
         self,
         invoice: Invoice,
         items: list[InvoiceItem],
-        profile: dict[str, Any],
+        profile: Profile,
         db: AsyncSession,
     ) -> list[Analysis]:
         """Identifica produtos fora de temporada (mais caros) e sugere substituições."""
-        # Brazilian seasonal produce calendar (approximate)
-        seasonal_map: dict[str, list[int]] = {
-            # Fruits - months when they are in season (cheaper)
-            "manga": [10, 11, 12, 1, 2],
-            "morango": [5, 6, 7, 8, 9],
-            "uva": [1, 2, 3, 12],
-            "pêssego": [10, 11, 12, 1],
-            "melancia": [10, 11, 12, 1, 2],
-            "abacaxi": [10, 11, 12, 1],
-            "caqui": [3, 4, 5],
-            "maçã": [1, 2, 3, 4],
-            "laranja": [5, 6, 7, 8],
-            "tangerina": [4, 5, 6, 7],
-            "mexerica": [4, 5, 6, 7],
-            "ponkan": [4, 5, 6, 7],
-            "abacate": [3, 4, 5, 6, 7],
-            "goiaba": [2, 3, 4],
-            "mamão": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],  # year-round
-            "banana": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],  # year-round
-            # Vegetables
-            "tomate": [1, 2, 3, 4],
-            "abobrinha": [9, 10, 11, 12, 1],
-            "berinjela": [3, 4, 5, 6],
-            "couve-flor": [5, 6, 7, 8],
-            "brócolis": [5, 6, 7, 8],
-            "pepino": [9, 10, 11, 12, 1],
-            "pimentão": [9, 10, 11, 12],
-            "vagem": [5, 6, 7, 8],
-            "chuchu": [5, 6, 7, 8, 9],
-            "milho": [1, 2, 3],
-        }
-
         current_month = invoice.issue_date.month
         alerts = []
 
         produce_items = [
             item for item in items
-            if (item.category_name or "").lower() in (
-                "frutas", "verduras", "legumes", "hortifruti", "hortifrutigranjeiros",
-                "frutas e verduras",
-            )
+            if (item.category_name or "").lower() in _PRODUCE_CATEGORIES
         ]
 
         if len(produce_items) < 3:
             return []
 
-        off_season_items = []
+        # Off-season candidates first, so the historical prices come from a
+        # single query
+        candidates = []
         for item in produce_items:
             desc_lower = (item.description or "").lower()
-            for product_name, months in seasonal_map.items():
-                if product_name in desc_lower and current_month not in months:
-                    # Check if price is above historical min
-                    prod_result = await db.execute(
-                        select(Product.min_price, Product.average_price)
-                        .where(
-                            and_(
-                                Product.user_id == invoice.user_id,
-                                Product.description.ilike(f"%{product_name}%"),
-                            )
-                        )
-                        .limit(1)
-                    )
-                    prod = prod_result.first()
-                    min_price = float(prod.min_price) if prod and prod.min_price else None
-                    if min_price and float(item.unit_price) > min_price * 1.3:
-                        off_season_items.append({
-                            "name": item.description,
-                            "price": float(item.unit_price),
-                            "min_price": min_price,
-                            "season_months": months,
-                            "product_key": product_name,
-                        })
+            for match in _SEASONAL_RE.finditer(desc_lower):
+                product_name = match.group()
+                if not _SEASON_MASK[product_name] >> current_month & 1:
+                    candidates.append((item, product_name))
                     break
 
+        if not candidates:
+            return []
+
+        product_names = {product_name for _, product_name in candidates}
+        prod_result = await db.execute(
+            select(Product.description, Product.min_price).where(
+                and_(
+                    Product.user_id == invoice.user_id,
+                    Product.min_price.isnot(None),
+                    or_(*(
+                        Product.description.ilike(f"%{product_name}%")
+                        for product_name in product_names
+                    )),
+                )
+            )
+        )
+        # Historical min price of the first product matching each key
+        min_by_key: dict[str, float] = {}
+        for description, min_price in prod_result.tuples():
+            desc_lower = (description or "").lower()
+            for product_name in product_names:
+                if product_name in desc_lower:
+                    min_by_key.setdefault(product_name, float(min_price))
+
+        off_season_items = []
+        for item, product_name in candidates:
+            # Check if price is above historical min
+            min_price = min_by_key.get(product_name)
+            if min_price and float(item.unit_price) > min_price * 1.3:
+                off_season_items.append({
+                    "name": item.description,
+                    "price": float(item.unit_price),
+                    "min_price": min_price,
+                    "season_months": list(_SEASONAL_MONTHS[product_name]),
+                    "product_key": product_name,
+                })
+
         if not off_season_items:
             return []
 
@@ -1565,7 +2595,7 @@ class AIAnalyzer:
 
         if len(off_season_items) >= 3 and total_premium > 30:
             priority = "high"
-        elif profile["children_count"] and profile["children_count"] > 0:
+        elif profile.children_count and profile.children_count > 0:
             priority = "medium"
         else:
             priority = "low"
@@ -1580,7 +2610,7 @@ class AIAnalyzer:
             f"Mês atual: {current_month}\n"
             f"Produtos fora de safra:\n{items_text}\n"
             f"Sobrepreço total estimado: R$ {total_premium:.2f}\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n\n"
+            f"Família: {profile.adults_count} adulto(s) e {profile.children_count} criança(s)\n\n"
             f"Forneça uma análise concisa (máximo 3 frases):\n"
             f"1. Quais frutas/verduras estão fora de safra\n"
             f"2. Substitutos da estação (mais baratos e frescos)\n"
@@ -1588,18 +2618,7 @@ class AIAnalyzer:
             f"Use linguagem educativa e prática."
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um nutricionista e consultor de compras especializado em sazonalidade de alimentos no Brasil.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        ai_text = await self._chat("seasonal_alert", prompt, max_tokens=300)
 
         alert = Analysis(
             user_id=invoice.user_id,
@@ -1607,7 +2626,7 @@ class AIAnalyzer:
             type="seasonal_alert",
             priority=priority,
             title="Alerta Sazonal de Preços",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "off_season_items": off_season_items[:5],
                 "total_premium": round(total_premium, 2),
@@ -1625,38 +2644,32 @@ class AIAnalyzer:
     async def _analyze_savings_potential(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
+        month_totals: MonthTotals,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Consolida todas as oportunidades de economia em um plano priorizado."""
-        # Check if we have enough recent analyses
+        # Check if we have enough recent analyses (only the columns used
+        # below)
         result = await db.execute(
-            select(Analysis)
+            select(Analysis.type, Analysis.title, Analysis.description)
             .where(
                 and_(
                     Analysis.user_id == invoice.user_id,
-                    Analysis.created_at >= datetime.utcnow() - timedelta(days=60),
+                    Analysis.created_at >= utcnow() - timedelta(days=60),
                 )
             )
             .order_by(Analysis.created_at.desc())
             .limit(20)
         )
-        recent_analyses = result.scalars().all()
+        recent_analyses = result.all()
 
         if len(recent_analyses) < 5:
             return None
 
-        income = profile["household_income"]
+        income = profile.household_income
         month_start = invoice.issue_date.replace(day=1)
-        result = await db.execute(
-            select(func.sum(Invoice.total_value)).where(
-                and_(
-                    Invoice.user_id == invoice.user_id,
-                    Invoice.issue_date >= month_start,
-                )
-            )
-        )
-        month_spent = float(result.scalar() or 0)
+        month_spent = month_totals.month_spent
 
         # Summarize recent insights for AI
         insights_text = "\n".join(
@@ -1664,12 +2677,12 @@ class AIAnalyzer:
             for a in recent_analyses[:10]
         )
 
-        family_size = self._get_weighted_family_size(profile)
+        family_size = profile.family_size
 
         prompt = (
             f"Com base nos insights recentes, crie um plano de economia priorizado:\n\n"
             f"Gasto mensal atual: R$ {month_spent:,.2f}\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n"
+            f"Família: {profile.adults_count} adulto(s) e {profile.children_count} criança(s)\n"
             + (f"Renda mensal: R$ {income:,.2f}\n" if income else "")
             + f"\nInsights recentes:\n{insights_text}\n\n"
             f"Forneça um plano de ação conciso (máximo 4 frases):\n"
@@ -1679,18 +2692,7 @@ class AIAnalyzer:
             f"Use linguagem motivadora de coach financeiro."
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um planejador financeiro pessoal que cria planos de ação concretos e motivadores.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=400,
-        )
+        ai_text = await self._chat("savings_potential", prompt, max_tokens=400)
 
         if month_spent > 0 and income and income > 0 and (month_spent / income) > 0.10:
             priority = "high"
@@ -1704,7 +2706,7 @@ class AIAnalyzer:
             type="savings_potential",
             priority=priority,
             title="Potencial de Economia Mensal",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "month_spent": round(month_spent, 2),
                 "household_income": income,
@@ -1721,14 +2723,25 @@ class AIAnalyzer:
     async def _analyze_family_nutrition(
         self,
         invoice: Invoice,
-        profile: dict[str, Any],
+        profile: Profile,
         db: AsyncSession,
     ) -> Optional[Analysis]:
         """Avalia distribuição de categorias de alimentos e identifica lacunas nutricionais."""
-        # Get items from last 30 days
+        # Get items from last 30 days, totaled per category. Each category
+        # falls in the first food group whose keywords it contains (NULL
+        # when none), so the database returns one row per food group
         thirty_days_ago = invoice.issue_date - timedelta(days=30)
-        result = await db.execute(
-            select(InvoiceItem.category_name, func.sum(InvoiceItem.total_price).label("total"))
+        category_lower = func.lower(InvoiceItem.category_name)
+        by_category = (
+            select(
+                case(
+                    *(
+                        (category_lower.op("~")(pattern), literal(group))
+                        for group, pattern in _FOOD_GROUP_PATTERNS.items()
+                    ),
+                ).label("food_group"),
+                func.sum(InvoiceItem.total_price).label("total"),
+            )
             .join(Invoice, Invoice.id == InvoiceItem.invoice_id)
             .where(
                 and_(
@@ -1737,31 +2750,27 @@ class AIAnalyzer:
                 )
             )
             .group_by(InvoiceItem.category_name)
+            .subquery()
+        )
+        result = await db.execute(
+            select(
+                by_category.c.food_group,
+                func.sum(by_category.c.total),
+                func.count(),
+            ).group_by(by_category.c.food_group)
         )
-        cat_totals = result.all()
+        group_rows = result.tuples().all()
 
-        if len(cat_totals) < 3:
+        if sum(category_count for _, _, category_count in group_rows) < 3:
             return None
 
-        # Map categories to food groups
-        food_groups: dict[str, list[str]] = {
-            "proteínas": ["carnes", "carne", "frango", "peixe", "ovos", "ovo", "proteína"],
-            "carboidratos": ["arroz", "macarrão", "pão", "padaria", "cereais", "grãos", "massas"],
-            "frutas_verduras": ["frutas", "verduras", "legumes", "hortifruti", "hortifrutigranjeiros"],
-            "laticínios": ["laticínios", "leite", "queijo", "iogurte", "lácteos"],
-            "processados": ["processados", "congelados", "instantâneo", "embutidos", "snacks"],
-        }
-
-        group_totals: dict[str, float] = {g: 0.0 for g in food_groups}
+        group_totals: dict[str, float] = {g: 0.0 for g in _FOOD_GROUPS}
         total_food = 0.0
 
-        for cat_name, cat_total in cat_totals:
-            cat_lower = (cat_name or "").lower().strip()
-            total_food += float(cat_total)
-            for group, keywords in food_groups.items():
-                if any(kw in cat_lower for kw in keywords):
-                    group_totals[group] += float(cat_total)
-                    break
+        for food_group, group_total, _ in group_rows:
+            total_food += float(group_total)
+            if food_group is not None:
+                group_totals[food_group] = float(group_total)
 
         if total_food == 0:
             return None
@@ -1773,11 +2782,10 @@ class AIAnalyzer:
         if not missing_groups:
             return None
 
-        has_children = profile["children_count"] and profile["children_count"] > 0
+        has_children = profile.children_count and profile.children_count > 0
 
         # Priority: if children and missing key groups
-        child_critical = {"frutas_verduras", "laticínios"}
-        if has_children and child_critical.intersection(missing_groups):
+        if has_children and _CHILD_CRITICAL_GROUPS.intersection(missing_groups):
             priority = "high"
         elif len(missing_groups) >= 2:
             priority = "medium"
@@ -1786,17 +2794,17 @@ class AIAnalyzer:
 
         groups_text = "\n".join(
             f"- {g.replace('_', '/')}: R$ {group_totals[g]:.2f} ({group_pcts[g]:.1f}%)"
-            for g in food_groups
+            for g in _FOOD_GROUPS
         )
 
-        income = profile["household_income"]
+        income = profile.household_income
 
         prompt = (
             f"Analise o equilíbrio nutricional das compras dos últimos 30 dias:\n\n"
             f"Distribuição por grupo alimentar:\n{groups_text}\n\n"
             f"Total gasto em alimentos: R$ {total_food:.2f}\n"
             f"Grupos sub-representados (<5%): {', '.join(g.replace('_', '/') for g in missing_groups)}\n"
-            f"Família: {profile['adults_count']} adulto(s) e {profile['children_count']} criança(s)\n"
+            f"Família: {profile.adults_count} adulto(s) e {profile.children_count} criança(s)\n"
             + (f"Renda mensal: R$ {income:,.2f}\n" if income else "")
             + f"\nForneça uma análise concisa (máximo 3 frases):\n"
             f"1. Quais grupos alimentares estão faltando ou em excesso\n"
@@ -1805,25 +2813,14 @@ class AIAnalyzer:
             f"Use linguagem educativa e sem julgamento."
         )
 
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Você é um nutricionista que ajuda famílias brasileiras a comer melhor com o orçamento disponível.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=300,
-        )
+        ai_text = await self._chat("family_nutrition", prompt, max_tokens=300)
 
         return Analysis(
             user_id=invoice.user_id,
             type="family_nutrition",
             priority=priority,
             title="Equilíbrio Nutricional da Família",
-            description=response.choices[0].message.content,
+            description=ai_text,
             details={
                 "group_totals": {g: round(v, 2) for g, v in group_totals.items()},
                 "group_percentages": {g: round(v, 1) for g, v in group_pcts.items()},
@@ -1838,51 +2835,43 @@ class AIAnalyzer:
             confidence_score=0.60,
         )
 
-    def _build_price_alert_prompt(
-        self,
-        product: str,
-        current_price: Decimal,
-        avg_price: Decimal,
-        history_count: int,
-    ) -> str:
-        """Constrói prompt para alerta de preço."""
-        diff_percent = (current_price - avg_price) / avg_price * 100
-        return (
-            f"Analise a seguinte situação de compra:\n\n"
-            f"Produto: {product}\n"
-            f"Preço atual: R$ {current_price:.2f}\n"
-            f"Preço médio histórico (últimas {history_count} compras): "
-            f"R$ {avg_price:.2f}\n"
-            f"Diferença: {diff_percent:.1f}% acima da média\n\n"
-            f"Forneça uma análise concisa (máximo 3 frases) sobre:\n"
-            f"1. Se este preço é justificável\n"
-            f"2. Sugestões para economizar neste produto\n"
-            f"3. Quando seria um bom momento para comprar novamente\n\n"
-            f"Use linguagem amigável e direta."
-        )
+    def _price_alert_entries(
+        self, flagged: list[tuple[InvoiceItem, float, float, int]]
+    ) -> list[str]:
+        """Monta as linhas numeradas dos itens sinalizados para o prompt."""
+        return [
+            _PRICE_ALERT_ITEM_TEMPLATE.format_map(
+                {
+                    "index": index,
+                    "product": item.description,
+                    "current": current_price,
+                    "average": avg_price,
+                    "count": history_count,
+                    "diff": (current_price - avg_price) / avg_price * 100,
+                }
+            )
+            for index, (item, current_price, avg_price, history_count)
+            in enumerate(flagged, 1)
+        ]
 
-    def _build_category_insight_prompt(
-        self,
-        category: str,
-        current_month: Decimal,
-        avg_monthly: Decimal,
-        months_analyzed: int,
-    ) -> str:
-        """Constrói prompt para insight de categoria."""
-        diff_percent = (current_month - avg_monthly) / avg_monthly * 100
-        return (
-            f"Analise o seguinte padrão de gastos:\n\n"
-            f"Categoria: {category}\n"
-            f"Gasto este mês: R$ {current_month:.2f}\n"
-            f"Média mensal (últimos {months_analyzed} meses): "
-            f"R$ {avg_monthly:.2f}\n"
-            f"Diferença: {diff_percent:.1f}% acima da média\n\n"
-            f"Forneça uma análise concisa (máximo 3 frases) sobre:\n"
-            f"1. Possíveis causas deste aumento\n"
-            f"2. Dicas para controlar gastos nesta categoria\n"
-            f"3. Metas realistas para o próximo mês\n\n"
-            f"Use linguagem amigável e motivadora."
-        )
+    def _category_insight_entries(
+        self, flagged: list[tuple[str, float, float, int]]
+    ) -> list[str]:
+        """Monta as linhas numeradas das categorias sinalizadas para o prompt."""
+        return [
+            _CATEGORY_INSIGHT_ITEM_TEMPLATE.format_map(
+                {
+                    "index": index,
+                    "category": category,
+                    "current": current_month,
+                    "average": avg_monthly,
+                    "count": months_analyzed,
+                    "diff": (current_month - avg_monthly) / avg_monthly * 100,
+                }
+            )
+            for index, (category, current_month, avg_monthly, months_analyzed)
+            in enumerate(flagged, 1)
+        ]
 
     def _build_merchant_insight_prompt(
         self,
@@ -1895,35 +2884,39 @@ class AIAnalyzer:
         """Constrói prompt para insight de merchant."""
         diff_percent = (current_avg - category_avg) / category_avg * 100
         return (
+            f"Forneça uma análise concisa (máximo 3 frases) sobre:\n"
+            f"1. Se vale a pena continuar comprando neste estabelecimento\n"
+            f"2. Alternativas que podem ser mais econômicas\n"
+            f"3. Situações em que este estabelecimento pode ser vantajoso\n\n"
+            f"Use linguagem amigável e prática.\n"
+            f"{_DESCRIPTION_RESPONSE_INSTRUCTIONS}\n\n"
             f"Analise o seguinte estabelecimento:\n\n"
             f"Nome: {merchant_name}\n"
             f"Categoria: {merchant_category}\n"
             f"Ticket médio: R$ {current_avg:.2f}\n"
             f"Média da categoria: R$ {category_avg:.2f}\n"
             f"Diferença: {diff_percent:.1f}% acima da média\n"
-            f"Número de visitas: {visit_count}\n\n"
-            f"Forneça uma análise concisa (máximo 3 frases) sobre:\n"
-            f"1. Se vale a pena continuar comprando neste estabelecimento\n"
-            f"2. Alternativas que podem ser mais econômicas\n"
-            f"3. Situações em que este estabelecimento pode ser vantajoso\n\n"
-            f"Use linguagem amigável e prática."
+            f"Número de visitas: {visit_count}"
         )
 
     def _build_summary_prompt(
         self,
         total_value: Decimal,
-        items: list[dict[str, Any]],
+        items: Iterable[tuple[str, Decimal, Decimal, Decimal]],
+        item_count: int,
         merchant_name: Optional[str],
         merchant_category: Optional[str],
     ) -> str:
         """Constrói prompt para resumo da compra."""
         items_text = "\n".join(
-            [
-                f"- {item['description']} ({item['quantity']}x "
-                f"R$ {item['unit_price']:.2f} = R$ {item['total_price']:.2f})"
-                for item in items
-            ]
+            _SUMMARY_ITEM_TEMPLATE.format(*item) for item in items
         )
+        if item_count > _SUMMARY_MAX_ITEMS:
+            items_header = (
+                f"Itens ({_SUMMARY_MAX_ITEMS} de maior valor, de {item_count}):"
+            )
+        else:
+            items_header = "Itens:"
 
         merchant_info = (
             f"{merchant_name or 'Não informado'} "
@@ -1931,15 +2924,16 @@ class AIAnalyzer:
         )
 
         return (
-            f"Analise a seguinte compra e forneça um resumo útil:\n\n"
-            f"Valor total: R$ {total_value:.2f}\n"
-            f"Estabelecimento: {merchant_info}\n\n"
-            f"Itens:\n{items_text}\n\n"
             f"Forneça um resumo conciso (máximo 4 frases) que inclua:\n"
             f"1. Uma visão geral da compra\n"
             f"2. Destaque para itens mais relevantes\n"
             f"3. Uma dica rápida para economizar em compras similares\n\n"
-            f"Use linguagem amigável e informativa."
+            f"Use linguagem amigável e informativa.\n"
+            f"{_DESCRIPTION_RESPONSE_INSTRUCTIONS}\n\n"
+            f"Analise a seguinte compra e forneça um resumo útil:\n\n"
+            f"Valor total: R$ {total_value:.2f}\n"
+            f"Estabelecimento: {merchant_info}\n\n"
+            f"{items_header}\n{items_text}"
         )
 
 
@@ -1,8 +1,8 @@
 import hashlib
-import json
 import logging
 from typing import Optional
 
+import orjson
 import redis.asyncio as redis
 
 from src.config import settings
@@ -20,10 +20,16 @@ class PromptCache:
         self.ttl = settings.LLM_CACHE_TTL
 
     async def connect(self):
-        """Conecta ao Redis."""
+        """Conecta ao Redis.
+
+        As respostas vêm em bytes: as extrações vão direto para
+        orjson.loads, e só os textos de chat e de análise são decodificados.
+        """
         try:
             self.redis_client = redis.from_url(
-                settings.REDIS_URL, encoding="utf-8", decode_responses=True
+                settings.REDIS_URL,
+                decode_responses=False,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
             )
             await self.redis_client.ping()
             logger.info("Redis connection established for prompt cache")
@@ -32,19 +38,22 @@ class PromptCache:
             self.redis_client = None
 
     def _get_cache_key(self, provider: str, image_hash: str) -> str:
-        """Gera chave de cache."""
-        return f"invoice:extract:{provider}:{image_hash}"
+        """Gera chave de cache (v2: hash BLAKE2b, ver _hash_image)."""
+        return f"invoice:extract:v2:{provider}:{image_hash}"
 
     def _hash_image(self, image_bytes: bytes) -> str:
-        """Gera hash da imagem para cache."""
-        return hashlib.md5(image_bytes).hexdigest()
+        """Gera hash da imagem para cache (BLAKE2b de 128 bits)."""
+        return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
 
-    async def get(self, provider: str, image_bytes: bytes) -> Optional[dict]:
+    async def get(
+        self, provider: str, image_bytes: bytes, image_hash: Optional[str] = None
+    ) -> Optional[dict]:
         """Busca resultado em cache.
 
         Args:
             provider: Nome do provedor (gemini|openai)
             image_bytes: Bytes da imagem
+            image_hash: Hash já calculado da imagem (ver hash_extraction_image)
 
         Returns:
             Dict com resultado ou None se não encontrado
@@ -54,13 +63,13 @@ class PromptCache:
             return None
 
         try:
-            image_hash = self._hash_image(image_bytes)
+            image_hash = image_hash or self._hash_image(image_bytes)
             cache_key = self._get_cache_key(provider, image_hash)
 
             cached = await self.redis_client.get(cache_key)
             if cached:
                 logger.info(f"LLM cache HIT: {cache_key}")
-                return json.loads(cached)
+                return orjson.loads(cached)
 
             logger.info(f"LLM cache MISS: {cache_key}")
             return None
@@ -69,13 +78,20 @@ class PromptCache:
             logger.warning(f"Cache get error: {e}")
             return None
 
-    async def set(self, provider: str, image_bytes: bytes, result: dict) -> bool:
+    async def set(
+        self,
+        provider: str,
+        image_bytes: bytes,
+        result: dict,
+        image_hash: Optional[str] = None,
+    ) -> bool:
         """Salva resultado em cache.
 
         Args:
             provider: Nome do provedor
             image_bytes: Bytes da imagem
             result: Resultado a ser cacheado
+            image_hash: Hash já calculado da imagem (ver hash_extraction_image)
 
         Returns:
             True se sucesso, False caso contrário
@@ -85,11 +101,11 @@ class PromptCache:
             return False
 
         try:
-            image_hash = self._hash_image(image_bytes)
+            image_hash = image_hash or self._hash_image(image_bytes)
             cache_key = self._get_cache_key(provider, image_hash)
 
             await self.redis_client.setex(
-                cache_key, self.ttl, json.dumps(result, default=str)
+                cache_key, self.ttl, orjson.dumps(result, default=str)
             )
             ttl_hours = self.ttl / 3600
             logger.info(f"LLM cache STORED: {cache_key} (TTL: {ttl_hours:.1f}h)")
@@ -113,17 +129,119 @@ class PromptCache:
             logger.warning(f"Cache invalidate error: {e}")
             return False
 
+    def _get_completion_key(self, request_hash: str) -> str:
+        """Gera chave de cache para respostas de chat."""
+        return f"llm:chat:{request_hash}"
+
+    async def get_completion(self, request_hash: str) -> Optional[str]:
+        """Busca o texto de uma resposta de chat em cache.
+
+        Args:
+            request_hash: Hash do modelo, mensagens e parâmetros da chamada
+
+        Returns:
+            Texto da resposta ou None se não encontrado
+        """
+        if not self.redis_client:
+            return None
+
+        try:
+            cached = await self.redis_client.get(
+                self._get_completion_key(request_hash)
+            )
+            return cached.decode() if cached is not None else None
+        except Exception as e:
+            logger.warning(f"Cache get error: {e}")
+            return None
+
+    async def set_completion(self, request_hash: str, text: str) -> bool:
+        """Salva o texto de uma resposta de chat em cache."""
+        if not self.redis_client:
+            return False
+
+        try:
+            await self.redis_client.setex(
+                self._get_completion_key(request_hash), self.ttl, text
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Cache set error: {e}")
+            return False
+
+    def _get_analysis_key(self, analysis_type: str, feature_hash: str) -> str:
+        """Gera chave de cache para textos de análise por características."""
+        return f"ai:{analysis_type}:{feature_hash}"
+
+    async def get_analysis_texts(
+        self, analysis_type: str, feature_hashes: list[str]
+    ) -> list[Optional[str]]:
+        """Busca textos de análise em cache em uma única ida ao Redis.
+
+        Args:
+            analysis_type: Tipo da análise (price_alert, category_insight, ...)
+            feature_hashes: Hashes das características de cada item
+
+        Returns:
+            Lista na mesma ordem, com None para os itens não encontrados
+        """
+        if not self.redis_client or not feature_hashes:
+            return [None] * len(feature_hashes)
+
+        try:
+            cached = await self.redis_client.mget(
+                [
+                    self._get_analysis_key(analysis_type, feature_hash)
+                    for feature_hash in feature_hashes
+                ]
+            )
+            return [text.decode() if text is not None else None for text in cached]
+        except Exception as e:
+            logger.warning(f"Cache get error: {e}")
+            return [None] * len(feature_hashes)
+
+    async def set_analysis_texts(
+        self, analysis_type: str, texts: dict[str, str]
+    ) -> bool:
+        """Salva textos de análise ({hash das características: texto})."""
+        if not self.redis_client or not texts:
+            return False
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for feature_hash, text in texts.items():
+                    pipe.setex(
+                        self._get_analysis_key(analysis_type, feature_hash),
+                        settings.AI_ANALYSIS_CACHE_TTL,
+                        text,
+                    )
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Cache set error: {e}")
+            return False
+
     async def clear_all(self) -> int:
-        """Limpa todo o cache de extrações."""
+        """Limpa todo o cache de extrações.
+
+        Percorre as chaves com SCAN (KEYS bloquearia o Redis) e apaga em
+        lotes de 500, um DEL por lote.
+        """
         if not self.redis_client:
             return 0
 
         try:
-            pattern = "invoice:extract:*"
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                return await self.redis_client.delete(*keys)
-            return 0
+            deleted = 0
+            batch: list[bytes] = []
+            async for key in self.redis_client.scan_iter(
+                match="invoice:extract:*", count=500
+            ):
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted += await self.redis_client.delete(*batch)
+                    batch.clear()
+            if batch:
+                deleted += await self.redis_client.delete(*batch)
+            return deleted
         except Exception as e:
             logger.warning(f"Cache clear error: {e}")
             return 0
@@ -133,14 +251,26 @@ class PromptCache:
 prompt_cache = PromptCache()
 
 
-async def get_cached_extraction(provider: str, image_bytes: bytes) -> Optional[dict]:
+def hash_extraction_image(image_bytes: bytes) -> str:
+    """Hash da imagem, para calcular uma vez e reaproveitar no get e no set."""
+    return prompt_cache._hash_image(image_bytes)
+
+
+async def get_cached_extraction(
+    provider: str, image_bytes: bytes, image_hash: Optional[str] = None
+) -> Optional[dict]:
     """Wrapper para buscar extração em cache."""
-    return await prompt_cache.get(provider, image_bytes)
+    return await prompt_cache.get(provider, image_bytes, image_hash)
 
 
-async def cache_extraction(provider: str, image_bytes: bytes, result: dict) -> bool:
+async def cache_extraction(
+    provider: str,
+    image_bytes: bytes,
+    result: dict,
+    image_hash: Optional[str] = None,
+) -> bool:
     """Wrapper para salvar extração em cache."""
-    return await prompt_cache.set(provider, image_bytes, result)
+    return await prompt_cache.set(provider, image_bytes, result, image_hash)
 
 
 async def init_cache():
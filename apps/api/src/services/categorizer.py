@@ -7,6 +7,7 @@ Usa modelo de texto (barato) para classificar itens em categorias.
 import json
 import logging
 import re
+import unicodedata
 from typing import Optional
 
 from langchain_core.messages import HumanMessage
@@ -79,7 +80,7 @@ Dada a lista de produtos abaixo, classifique cada um usando APENAS as categorias
 3. Se não encontrar uma subcategoria exata, use a opção "Outros [Categoria]" (ex: "Outros Laticínios")
 4. Se o produto não se encaixar em nenhuma categoria, use "Outros" como categoria e "Diversos" como subcategoria
 
-Retorne APENAS um JSON array com objetos {index, category_name, subcategory}:
+Retorne APENAS um objeto JSON com a chave "items": um array de objetos {index, category_name, subcategory}:
 
 Exemplo de entrada:
 0: LEITE INTEGRAL PARMALAT 1L
@@ -87,15 +88,156 @@ Exemplo de entrada:
 2: FILE PEITO FRANGO KG
 
 Exemplo de saída:
-[
+{"items": [
   {"index": 0, "category_name": "Laticínios", "subcategory": "Leite"},
   {"index": 1, "category_name": "Limpeza", "subcategory": "Detergentes"},
   {"index": 2, "category_name": "Carnes e Aves", "subcategory": "Frango"}
-]
+]}
 
 Produtos para categorizar:
 """
 
+# Regras locais: produtos classificáveis pelo início da descrição, sem LLM.
+# Casam sem acentos e sem caixa; as mais específicas vêm antes (a alternação
+# tenta as regras na ordem). Só entram termos que não geram ambiguidade.
+_LOCAL_RULES: list[tuple[str, str, str]] = [
+    # Laticínios
+    (r"LEITE\s+COND(?:ENSADO)?", "Laticínios", "Leite Condensado"),
+    (r"CREME\s+DE\s+LEITE", "Laticínios", "Creme de Leite"),
+    (r"LEITE(?!\s+(?:DE\s+)?COCO|\s+INFANTIL)", "Laticínios", "Leite"),
+    (r"IOGURTES?", "Laticínios", "Iogurte"),
+    (r"MANTEIGA", "Laticínios", "Manteiga"),
+    (r"MARGARINA", "Laticínios", "Margarina"),
+    (r"REQUEIJAO", "Laticínios", "Requeijão"),
+    # Carnes e Aves
+    (
+        r"(?:PEITO|COXAS?|SOBRECOXAS?|FILE)\s+(?:DE\s+)?FRANGO",
+        "Carnes e Aves",
+        "Frango",
+    ),
+    (r"FRANGO(?!\s+EMPANADO)", "Carnes e Aves", "Frango"),
+    (
+        r"(?:ACEM|PATINHO|ALCATRA|PICANHA|MAMINHA|FRALDINHA|CONTRA\s*FILE|COXAO)",
+        "Carnes e Aves",
+        "Carne Bovina",
+    ),
+    (r"(?:PERNIL|BISTECA|LOMBO\s+SUINO)", "Carnes e Aves", "Carne Suína"),
+    (r"(?:TILAPIA|SALMAO|MERLUZA)", "Carnes e Aves", "Peixes"),
+    (r"LINGUICAS?", "Carnes e Aves", "Linguiças"),
+    # Frios
+    (r"PRESUNTO", "Frios", "Presunto"),
+    (r"MORTADELA", "Frios", "Mortadela"),
+    (r"SALSICHAS?", "Frios", "Salsicha"),
+    # Bebidas
+    (r"REFRIG(?:ERANTE)?", "Bebidas", "Refrigerantes"),
+    (r"SUCOS?", "Bebidas", "Sucos"),
+    (r"AGUA\s+(?:MIN(?:ERAL)?|COM\s+GAS|SEM\s+GAS)", "Bebidas", "Águas"),
+    (r"CERVEJAS?", "Bebidas", "Cervejas"),
+    (r"VINHOS?", "Bebidas", "Vinhos"),
+    (r"ENERGETICOS?", "Bebidas", "Energéticos"),
+    # Padaria
+    (
+        r"PAO\s+(?:FRANCES|DE\s+FORMA|DE\s+LEITE|INTEGRAL|BISNAGUINHA)",
+        "Padaria",
+        "Pães",
+    ),
+    (r"TORRADAS?", "Padaria", "Torradas"),
+    (r"BOLOS?", "Padaria", "Bolos"),
+    # Hortifruti
+    (
+        r"(?:BANANAS?|MACAS?|LARANJAS?|LIMAO|LIMOES|MAMAO|MELANCIA|MELAO|UVAS?|"
+        r"ABACAXI|MANGAS?|MORANGOS?|ABACATE|PERAS?|GOIABAS?|MARACUJA|"
+        r"TANGERINAS?|KIWI)",
+        "Hortifruti",
+        "Frutas",
+    ),
+    (
+        r"(?:ALFACE|COUVE|RUCULA|AGRIAO|ESPINAFRE|REPOLHO|ACELGA)",
+        "Hortifruti",
+        "Verduras",
+    ),
+    (
+        r"(?:TOMATES?(?!\s+PELADO)|CEBOLAS?|CENOURAS?|ABOBRINHA|ABOBORA|PEPINO|"
+        r"PIMENTAO|BERINJELA|CHUCHU|BETERRABA|MANDIOCA|"
+        r"BATATAS?(?!\s+(?:PALHA|FRITA|PRE)))",
+        "Hortifruti",
+        "Legumes",
+    ),
+    (
+        r"(?:ALHO|CHEIRO\s+VERDE|SALSINHA|CEBOLINHA|COENTRO|HORTELA|MANJERICAO)",
+        "Hortifruti",
+        "Temperos Frescos",
+    ),
+    # Mercearia
+    (r"ARROZ", "Mercearia", "Arroz"),
+    (r"FEIJAO", "Mercearia", "Feijão"),
+    (r"(?:MACARRAO|ESPAGUETE|MASSA\s+(?:PARA\s+)?LASANHA)", "Mercearia", "Massas"),
+    (
+        r"(?:OLEO\s+(?:DE\s+)?(?:SOJA|GIRASSOL|MILHO|CANOLA)|AZEITE)",
+        "Mercearia",
+        "Óleos",
+    ),
+    (r"ACUCAR", "Mercearia", "Açúcar"),
+    (r"SAL\s+(?:REFINADO|GROSSO|MARINHO|LIGHT)", "Mercearia", "Sal"),
+    (r"FARINHA", "Mercearia", "Farinhas"),
+    (r"(?:MOLHO|EXTRATO)\s+DE\s+TOMATE", "Mercearia", "Molhos"),
+    (r"(?:MAIONESE|KETCHUP|MOSTARDA)", "Mercearia", "Condimentos"),
+    # Limpeza
+    (r"DETERGENTE", "Limpeza", "Detergentes"),
+    (r"(?:SABAO\s+(?:EM\s+)?PO|LAVA\s+ROUPAS?)", "Limpeza", "Sabão em Pó"),
+    (r"AMACIANTE", "Limpeza", "Amaciantes"),
+    (r"DESINFETANTE", "Limpeza", "Desinfetantes"),
+    (r"AGUA\s+SANITARIA", "Limpeza", "Água Sanitária"),
+    (r"ESPONJAS?", "Limpeza", "Esponjas"),
+    (r"SACOS?\s+(?:DE\s+|P/?\s*|PARA\s+)?LIXO", "Limpeza", "Sacos de Lixo"),
+    (r"MULTIUSO", "Limpeza", "Multiuso"),
+    # Higiene Pessoal
+    (r"SABONETES?", "Higiene Pessoal", "Sabonetes"),
+    (r"SHAMPOOS?", "Higiene Pessoal", "Shampoos"),
+    (r"CONDICIONADOR", "Higiene Pessoal", "Condicionadores"),
+    (r"CREME\s+DENTAL", "Higiene Pessoal", "Cremes Dentais"),
+    (r"ESCOVA\s+(?:DENTAL|DE\s+DENTES?)", "Higiene Pessoal", "Escovas de Dente"),
+    (r"DESODORANTE", "Higiene Pessoal", "Desodorantes"),
+    (r"PAPEL\s+HIGIENICO", "Higiene Pessoal", "Papel Higiênico"),
+    (r"ABSORVENTES?", "Higiene Pessoal", "Absorventes"),
+    # Pet
+    (r"AREIA\s+(?:SANITARIA|HIGIENICA)", "Pet", "Areia Sanitária"),
+    # Snacks
+    (r"CHOCOLATE(?!\s+EM\s+PO)", "Snacks", "Chocolates"),
+    (r"BALAS?", "Snacks", "Balas"),
+    (r"CHICLETES?", "Snacks", "Chicletes"),
+    # Matinais
+    (r"ACHOCOLATADO", "Matinais", "Achocolatados"),
+    (r"AVEIA", "Matinais", "Aveia"),
+    (r"GRANOLA", "Matinais", "Granola"),
+    (r"MEL", "Matinais", "Mel"),
+    (r"GELEIA", "Matinais", "Geleias"),
+    # Congelados
+    (r"PIZZA", "Congelados", "Pizzas"),
+    (r"LASANHA", "Congelados", "Lasanhas"),
+    (r"SORVETES?", "Congelados", "Sorvetes"),
+    (r"NUGGETS?", "Congelados", "Nuggets"),
+    (r"HAMBURGUER", "Congelados", "Hambúrgueres"),
+    (r"POLPA(?!\s+DE\s+TOMATE)", "Congelados", "Polpas de Frutas"),
+    # Utilidades Domésticas
+    (r"PAPEL\s+TOALHA", "Utilidades Domésticas", "Papel Toalha"),
+    (r"GUARDANAPOS?", "Utilidades Domésticas", "Guardanapos"),
+    (r"PAPEL\s+ALUMINIO", "Utilidades Domésticas", "Papel Alumínio"),
+    (r"FILME\s+PVC", "Utilidades Domésticas", "Filme PVC"),
+    (r"FOSFOROS?", "Utilidades Domésticas", "Fósforos"),
+]
+
+# Uma única alternação ancorada no início: cada descrição é varrida uma vez
+_LOCAL_RULES_RE = re.compile(
+    "^(?:"
+    + "|".join(f"(?P<r{i}>{pattern})" for i, (pattern, _, _) in enumerate(_LOCAL_RULES))
+    + r")\b",
+    re.IGNORECASE,
+)
+
+# JSON mode: a resposta é sempre um objeto JSON válido, sem cercas de markdown
+_JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
 
 async def categorize_items(
     items: list[ExtractedItem],
@@ -105,6 +247,9 @@ async def categorize_items(
     Usa OpenRouter (ou fallback) para classificar itens em categorias.
     Não falha se a categorização der erro — retorna itens sem categoria.
 
+    Itens cobertos por _LOCAL_RULES são categorizados localmente; só os
+    demais vão ao LLM.
+
     Args:
         items: Lista de ExtractedItem com description preenchida
 
@@ -114,9 +259,13 @@ async def categorize_items(
     if not items:
         return items
 
+    residual = _categorize_locally(items)
+    if not residual:
+        return items
+
     # Construir lista de descrições (prefere normalized_name se disponível)
     descriptions = []
-    for i, item in enumerate(items):
+    for i, item in enumerate(residual):
         desc = item.normalized_name or item.description or "Item sem descrição"
         descriptions.append(f"{i}: {desc}")
 
@@ -129,22 +278,17 @@ async def categorize_items(
             return items
 
         message = HumanMessage(content=prompt_text)
-        response = await llm.ainvoke([message])
-        content = response.content.strip()
-
-        # Limpar markdown
-        if content.startswith("```"):
-            content = re.sub(r"^```(?:json)?\s*", "", content)
-            content = re.sub(r"\s*```$", "", content)
-
-        categories = json.loads(content)
+        response = await llm.ainvoke([message], response_format=_JSON_RESPONSE_FORMAT)
+        if not isinstance(response.content, str):
+            raise ValueError("resposta do LLM não é texto")
+        categories = json.loads(response.content)["items"]
 
         # Aplicar categorias
         for cat in categories:
             idx = cat.get("index")
-            if idx is not None and 0 <= idx < len(items):
-                items[idx].category_name = cat.get("category_name")
-                items[idx].subcategory = cat.get("subcategory")
+            if idx is not None and 0 <= idx < len(residual):
+                residual[idx].category_name = cat.get("category_name")
+                residual[idx].subcategory = cat.get("subcategory")
 
         logger.info(f"✓ Categorização completa: {len(categories)} itens categorizados")
 
@@ -155,6 +299,40 @@ async def categorize_items(
     return items
 
 
+def _categorize_locally(items: list[ExtractedItem]) -> list[ExtractedItem]:
+    """Aplica _LOCAL_RULES e retorna os itens que ainda precisam do LLM."""
+    residual = []
+    for item in items:
+        match = _match_local_rule(item.normalized_name) or _match_local_rule(
+            item.description
+        )
+        if match:
+            assert match.lastgroup  # toda alternativa é um grupo nomeado
+            _, item.category_name, item.subcategory = _LOCAL_RULES[
+                int(match.lastgroup[1:])
+            ]
+        else:
+            residual.append(item)
+
+    if len(residual) < len(items):
+        logger.info(
+            f"Categorização local: {len(items) - len(residual)}/{len(items)} itens"
+        )
+    return residual
+
+
+def _match_local_rule(description: Optional[str]) -> Optional[re.Match[str]]:
+    """Casa a descrição, sem acentos, com a alternação de _LOCAL_RULES."""
+    if not description:
+        return None
+    ascii_description = (
+        unicodedata.normalize("NFKD", description.strip())
+        .encode("ascii", "ignore")
+        .decode()
+    )
+    return _LOCAL_RULES_RE.match(ascii_description)
+
+
 def _get_categorization_llm() -> Optional[ChatOpenAI]:
     """Retorna LLM para categorização (texto puro, modelo barato)."""
     # Prefere OpenRouter (permite trocar modelo facilmente)
@@ -0,0 +1,121 @@
+"""
+Limitador de taxa para chamadas de chat à API da OpenAI/OpenRouter.
+
+Mantém dois baldes de tokens (requisições/minuto e tokens/minuto) e
+reexecuta com backoff exponencial e jitter quando a API responde 429,
+5xx ou a conexão falha.
+"""
+
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Balde de tokens reabastecido continuamente até a capacidade por minuto."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self._rate = per_minute / 60.0
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver ``amount`` tokens disponíveis (0 se já houver)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self._rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimitedOpenAI:
+    """
+    Envolve um AsyncOpenAI limitando ``chat.completions.create``.
+
+    Os demais atributos (files, batches, ...) são delegados ao cliente
+    original, então o objeto pode substituí-lo diretamente.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        max_requests_per_minute: int,
+        max_tokens_per_minute: int,
+    ):
+        self._client = client
+        self._requests = TokenBucket(max_requests_per_minute)
+        self._tokens = TokenBucket(max_tokens_per_minute)
+        self._lock = asyncio.Lock()
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self._create_chat_completion)
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    @staticmethod
+    def estimate_tokens(kwargs: dict[str, Any]) -> int:
+        """Estimativa de tokens da chamada: ~4 caracteres por token + saída."""
+        chars = sum(
+            len(message.get("content") or "")
+            for message in kwargs.get("messages", [])
+            if isinstance(message.get("content"), str)
+        )
+        return chars // 4 + (kwargs.get("max_tokens") or 0)
+
+    async def _acquire(self, tokens: int) -> None:
+        async with self._lock:
+            while True:
+                wait = max(
+                    self._requests.wait_time(1), self._tokens.wait_time(tokens)
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        retry=retry_if_exception_type(
+            (RateLimitError, APIConnectionError, InternalServerError)
+        ),
+        reraise=True,
+    )
+    async def _create_chat_completion(self, **kwargs: Any) -> Any:
+        await self._acquire(self.estimate_tokens(kwargs))
+        try:
+            return await self._client.chat.completions.create(**kwargs)
+        except (RateLimitError, APIConnectionError, InternalServerError) as e:
+            logger.warning("LLM call failed (%s), backing off", type(e).__name__)
+            raise
@@ -19,7 +19,11 @@ from tenacity import (
 
 from src.config import settings
 from src.schemas.invoice_processing import ExtractedInvoiceData
-from src.services.cached_prompts import cache_extraction, get_cached_extraction
+from src.services.cached_prompts import (
+    cache_extraction,
+    get_cached_extraction,
+    hash_extraction_image,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -696,10 +700,14 @@ class MultiProviderExtractor:
             f"{len(images)} imagem(ns), {image_size_mb:.2f}MB total"
         )
 
+        # Chave de cache baseada na primeira imagem, com hash calculado uma vez
+        cache_image = images[0][0]
+        cache_hash = hash_extraction_image(cache_image)
+
         # --- SMART SELECTION LOGIC ---
         # 1. Se tivermos os extratores otimizados configurados (via OpenRouter)
         if self.lite_extractor and self.standard_extractor:
-            result = await self._smart_extraction(images)
+            result = await self._smart_extraction(images, cache_hash)
             if result:
                 return result
             # Se _smart_extraction retornou None (ou falhou internamente e capturou),
@@ -708,15 +716,13 @@ class MultiProviderExtractor:
 
         # --- FALLBACK: Lista de provedores configurados ---
 
-
-        # Gerar cache key baseada na primeira imagem
-        cache_image = images[0][0]
-
         errors = []
 
         for provider_name, extractor in self.providers:
             # Verificar cache primeiro
-            cached = await get_cached_extraction(provider_name, cache_image)
+            cached = await get_cached_extraction(
+                provider_name, cache_image, cache_hash
+            )
             if cached:
                 logger.info(
                     f"✓ SUCESSO - Cache hit para {provider_name}",
@@ -733,7 +739,9 @@ class MultiProviderExtractor:
                 result = await extractor.extract_multiple(images)
 
                 # Salvar em cache
-                await cache_extraction(provider_name, cache_image, result.model_dump())
+                await cache_extraction(
+                    provider_name, cache_image, result.model_dump(), cache_hash
+                )
 
                 logger.info(
                     f"✓ SUCESSO - Extração completa com {provider_name.upper()}",
@@ -801,17 +809,21 @@ class MultiProviderExtractor:
         raise ValueError(f"Extração falhou: {errors}")
 
     async def _smart_extraction(
-        self, images: list[tuple[bytes, str]]
+        self, images: list[tuple[bytes, str]], cache_hash: str
     ) -> ExtractedInvoiceData | None:
-        """Tentativa otimizada de extração."""
-        # Gerar chave de cache para a primeira imagem
+        """Tentativa otimizada de extração.
+
+        ``cache_hash`` é o hash da primeira imagem, chave do cache.
+        """
         cache_image = images[0][0]
 
         # Caso 1: Apenas 1 imagem -> Tentar Lite
         if len(images) == 1:
             try:
                 # Verificar cache primeiro
-                cached = await get_cached_extraction("openrouter_lite", cache_image)
+                cached = await get_cached_extraction(
+                    "openrouter_lite", cache_image, cache_hash
+                )
                 if cached:
                     logger.info("✓ SUCESSO - Cache hit para openrouter_lite")
                     return ExtractedInvoiceData(**cached)
@@ -824,7 +836,9 @@ class MultiProviderExtractor:
                 result = await self.lite_extractor.extract_multiple(images)
 
                 # Salvar cache
-                await cache_extraction("openrouter_lite", cache_image, result.model_dump())
+                await cache_extraction(
+                    "openrouter_lite", cache_image, result.model_dump(), cache_hash
+                )
 
                 logger.info(f"✓ SUCESSO - Extração Lite completa com modelo: {self.lite_extractor.model_name}")
                 return result
@@ -835,7 +849,9 @@ class MultiProviderExtractor:
         # Caso 2: Múltiplas imagens OU falha no Lite -> Standard
         try:
             # Verificar cache (poderia usar chave diferente, mas ok)
-            cached = await get_cached_extraction("openrouter_standard", cache_image)
+            cached = await get_cached_extraction(
+                "openrouter_standard", cache_image, cache_hash
+            )
             if cached:
                 logger.info("✓ SUCESSO - Cache hit para openrouter_standard")
                 return ExtractedInvoiceData(**cached)
@@ -847,7 +863,9 @@ class MultiProviderExtractor:
             result = await self.standard_extractor.extract_multiple(images)
 
             # Salvar cache
-            await cache_extraction("openrouter_standard", cache_image, result.model_dump())
+            await cache_extraction(
+                "openrouter_standard", cache_image, result.model_dump(), cache_hash
+            )
 
             logger.info(f"✓ SUCESSO - Extração Standard completa com modelo: {self.standard_extractor.model_name}")
             return result
@@ -4,6 +4,7 @@ import uuid
 
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
 from src.database import AsyncSessionLocal
 from src.models.analysis import Analysis
@@ -35,9 +36,14 @@ async def run_ai_analysis(invoice_id: str, user_id: str) -> None:
     for attempt in range(len(RETRY_DELAYS) + 1):
         try:
             async with AsyncSessionLocal() as db:
-                # Load invoice
+                # Load invoice with its items and merchant in one go
                 result = await db.execute(
-                    select(Invoice).where(Invoice.id == uuid.UUID(invoice_id))
+                    select(Invoice)
+                    .where(Invoice.id == uuid.UUID(invoice_id))
+                    .options(
+                        selectinload(Invoice.items),
+                        joinedload(Invoice.merchant),
+                    )
                 )
                 invoice = result.scalar_one_or_none()
 
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+
+from src.config import settings
+from src.services.ai_analyzer import analyzer
+
+
+logger = logging.getLogger(__name__)
+
+
+async def run_analysis_batches_loop() -> None:
+    """Advance pending analysis_batches every ANALYSIS_BATCH_POLL_SECONDS.
+
+    Batches live in the database, so a restart only delays them until the
+    next tick. Runs for the lifetime of the app; failures are logged and
+    retried on the next tick.
+    """
+    while True:
+        try:
+            await analyzer.complete_pending_batches()
+        except Exception as e:
+            logger.error(
+                "analysis_batches_failed",
+                extra={"error": str(e)},
+            )
+        await asyncio.sleep(settings.ANALYSIS_BATCH_POLL_SECONDS)
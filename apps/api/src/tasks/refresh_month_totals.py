@@ -0,0 +1,52 @@
+import asyncio
+import logging
+
+from sqlalchemy import func, select, text
+
+from src.config import settings
+from src.database import AsyncSessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key shared by every API process ("mv_umt" in ASCII)
+_REFRESH_LOCK_KEY = 0x6D765F756D74
+
+
+async def refresh_user_month_totals() -> bool:
+    """Refresh the mv_user_month_totals materialized view.
+
+    Uses CONCURRENTLY so analyzer reads are not blocked while it rebuilds.
+    Every uvicorn worker runs the loop, so the refresh is guarded by a
+    transaction-level advisory lock: only one process refreshes per tick,
+    the others skip. Returns whether this process refreshed the view.
+    """
+    async with AsyncSessionLocal() as db:
+        locked = await db.scalar(
+            select(func.pg_try_advisory_xact_lock(_REFRESH_LOCK_KEY))
+        )
+        if not locked:
+            return False
+        await db.execute(
+            text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_user_month_totals")
+        )
+        await db.commit()
+    return True
+
+
+async def run_month_totals_refresh_loop() -> None:
+    """Refresh mv_user_month_totals every MONTH_TOTALS_REFRESH_SECONDS.
+
+    Runs for the lifetime of the app; failures are logged and retried on
+    the next tick.
+    """
+    while True:
+        try:
+            if await refresh_user_month_totals():
+                logger.info("month_totals_refreshed")
+        except Exception as e:
+            logger.error(
+                "month_totals_refresh_failed",
+                extra={"error": str(e)},
+            )
+        await asyncio.sleep(settings.MONTH_TOTALS_REFRESH_SECONDS)
@@ -1,8 +1,18 @@
+from typing import Any
+
+import orjson
 import structlog
 
 from src.config import settings
 
 
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    """Serialize log events with orjson (stdlib loggers still expect str)."""
+    return orjson.dumps(
+        obj, default=kwargs.get("default"), option=orjson.OPT_NON_STR_KEYS
+    ).decode()
+
+
 # Configure structlog
 structlog.configure(
     processors=[
@@ -14,7 +24,7 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
         if not settings.DEBUG
         else structlog.dev.ConsoleRenderer(),
     ],
@@ -1,4 +1,6 @@
 import asyncio
+import uuid
+
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
@@ -8,6 +10,7 @@ from sqlalchemy.pool import NullPool
 from src.main import app
 from src.database import Base, get_db
 from src.config import settings
+from src.models.user import User
 
 # Test database URL
 TEST_DATABASE_URL = settings.DATABASE_URL.replace(
@@ -72,13 +75,34 @@ async def setup_database(request):
 
 @pytest_asyncio.fixture
 async def db_session():
-    """Create a fresh database session for each test."""
-    async with AsyncSession(test_engine) as session:
+    """Create a fresh database session for each test.
+
+    Configured like AsyncSessionLocal (no expiry on commit, no autoflush).
+    """
+    async with AsyncSession(
+        test_engine, expire_on_commit=False, autoflush=False
+    ) as session:
         yield session
         # Clean up after test
         await session.rollback()
 
 
+async def create_user(db_session: AsyncSession, admin_role=None) -> User:
+    """Create a user with a unique email (the test tables are shared)."""
+    user = User(
+        id=uuid.uuid4(),
+        email=f"{uuid.uuid4().hex}@example.com",
+        full_name="Test User",
+        hashed_password="hashed_password",
+        is_active=True,
+        admin_role=admin_role,
+    )
+    db_session.add(user)
+    await db_session.commit()
+    await db_session.refresh(user)
+    return user
+
+
 @pytest_asyncio.fixture
 async def client():
     """Create a test client."""
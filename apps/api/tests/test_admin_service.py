@@ -0,0 +1,202 @@
+"""
+Unit tests for AdminService.
+
+Runs the service directly against the test database, without the HTTP layer.
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.audit_log import AuditLog
+from src.models.user import User
+from src.services.admin_service import AdminService
+from tests.conftest import create_user
+
+
+@pytest_asyncio.fixture
+async def super_admin(db_session: AsyncSession) -> User:
+    """Create a super admin user."""
+    return await create_user(db_session, "super_admin")
+
+
+@pytest_asyncio.fixture
+async def admin_user(db_session: AsyncSession) -> User:
+    """Create an admin user."""
+    return await create_user(db_session, "admin")
+
+
+@pytest_asyncio.fixture
+async def regular_user(db_session: AsyncSession) -> User:
+    """Create a regular user."""
+    return await create_user(db_session)
+
+
+class TestSoftDeleteUser:
+    """Tests for soft_delete_user."""
+
+    @pytest.mark.asyncio
+    async def test_soft_deletes_user_and_writes_audit_log(
+        self, db_session: AsyncSession, admin_user: User, regular_user: User
+    ):
+        """The user is deactivated and the audit log keeps the old values."""
+        service = AdminService(db_session, admin_user)
+
+        result = await service.soft_delete_user(regular_user.id)
+
+        assert result == {"message": "Usuário desativado com sucesso."}
+        await db_session.refresh(regular_user)
+        assert regular_user.is_active is False
+        assert regular_user.deleted_at is not None
+
+        log = (
+            await db_session.execute(
+                select(AuditLog).where(AuditLog.resource_id == regular_user.id)
+            )
+        ).scalar_one()
+        assert log.action == "delete"
+        assert log.admin_user_id == admin_user.id
+        assert log.old_values == {"is_active": True, "deleted_at": None}
+        assert log.new_values == {
+            "is_active": False,
+            "deleted_at": regular_user.deleted_at.isoformat(),
+        }
+
+    @pytest.mark.asyncio
+    async def test_missing_user_returns_404(
+        self, db_session: AsyncSession, admin_user: User
+    ):
+        """An unknown id is reported as not found."""
+        service = AdminService(db_session, admin_user)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.soft_delete_user(uuid.uuid4())
+
+        assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.asyncio
+    async def test_admin_cannot_delete_another_admin(
+        self, db_session: AsyncSession, admin_user: User
+    ):
+        """A non-super admin gets 403 and the target admin is untouched."""
+        other_admin = await create_user(db_session, "support")
+        service = AdminService(db_session, admin_user)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.soft_delete_user(other_admin.id)
+
+        assert exc_info.value.status_code == status.HTTP_403_FORBIDDEN
+        await db_session.refresh(other_admin)
+        assert other_admin.is_active is True
+        assert other_admin.deleted_at is None
+
+    @pytest.mark.asyncio
+    async def test_super_admin_can_delete_another_admin(
+        self, db_session: AsyncSession, super_admin: User, admin_user: User
+    ):
+        """super_admin is not subject to the admin_role guard."""
+        service = AdminService(db_session, super_admin)
+
+        await service.soft_delete_user(admin_user.id)
+
+        await db_session.refresh(admin_user)
+        assert admin_user.is_active is False
+        assert admin_user.deleted_at is not None
+
+
+class TestUserActivityPagination:
+    """Tests for get_user_activity offset and keyset (cursor) paging."""
+
+    @pytest_asyncio.fixture
+    async def activity(
+        self, db_session: AsyncSession, admin_user: User, regular_user: User
+    ) -> list[AuditLog]:
+        """Five audit logs for regular_user, two of them with equal created_at."""
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        offsets = [0, 1, 2, 2, 3]
+        logs = [
+            AuditLog(
+                id=uuid.uuid4(),
+                admin_user_id=admin_user.id,
+                action="update",
+                resource_type="user",
+                resource_id=regular_user.id,
+                created_at=base + timedelta(minutes=minutes),
+            )
+            for minutes in offsets
+        ]
+        db_session.add_all(logs)
+        await db_session.commit()
+        # Newest first, ties broken by id descending (the endpoint's order)
+        return sorted(logs, key=lambda log: (log.created_at, log.id), reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_cursor_pages_continue_the_first_page(
+        self,
+        db_session: AsyncSession,
+        admin_user: User,
+        regular_user: User,
+        activity: list[AuditLog],
+    ):
+        """Following next_cursor visits every log once, in order."""
+        service = AdminService(db_session, admin_user)
+
+        page = await service.get_user_activity(regular_user.id, per_page=2)
+        assert page["total"] == len(activity)
+        seen = [entry["id"] for entry in page["logs"]]
+
+        while page["next_cursor"] is not None:
+            page = await service.get_user_activity(
+                regular_user.id, per_page=2, cursor=page["next_cursor"]
+            )
+            assert "total" not in page
+            seen.extend(entry["id"] for entry in page["logs"])
+
+        assert seen == [str(log.id) for log in activity]
+
+    @pytest.mark.asyncio
+    async def test_last_full_page_has_no_cursor(
+        self,
+        db_session: AsyncSession,
+        admin_user: User,
+        regular_user: User,
+        activity: list[AuditLog],
+    ):
+        """A cursor page that reaches the end returns next_cursor=None."""
+        service = AdminService(db_session, admin_user)
+        first = await service.get_user_activity(regular_user.id, per_page=1)
+
+        rest = await service.get_user_activity(
+            regular_user.id, per_page=len(activity) - 1, cursor=first["next_cursor"]
+        )
+
+        assert [entry["id"] for entry in rest["logs"]] == [
+            str(log.id) for log in activity[1:]
+        ]
+        assert rest["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "cursor",
+        ["", "not-a-cursor", "2026-01-01T12:00:00,not-a-uuid", f",{uuid.uuid4()}"],
+    )
+    async def test_malformed_cursor_returns_400(
+        self,
+        db_session: AsyncSession,
+        admin_user: User,
+        regular_user: User,
+        cursor: str,
+    ):
+        """Cursors that _decode_cursor cannot parse are a client error."""
+        service = AdminService(db_session, admin_user)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.get_user_activity(regular_user.id, cursor=cursor)
+
+        assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
+        assert exc_info.value.__cause__ is None
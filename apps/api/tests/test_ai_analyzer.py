@@ -0,0 +1,670 @@
+"""Testes para o AIAnalyzer (chamadas à IA mockadas)."""
+
+import contextlib
+import json
+import re
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.models.analysis import Analysis
+from src.models.analysis_batch import AnalysisBatch
+from src.models.invoice import Invoice
+from src.models.invoice_item import InvoiceItem
+from src.models.user import User
+from src.services.ai_analyzer import (
+    _BATCH_RESPONSE_FORMAT,
+    AIAnalyzer,
+    MonthTotals,
+    Profile,
+)
+from src.tasks.refresh_month_totals import (
+    _REFRESH_LOCK_KEY,
+    refresh_user_month_totals,
+)
+from tests.conftest import create_user, test_engine
+
+
+def _response(content):
+    """Resposta no formato de chat.completions.create."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+    )
+
+
+def _batch(texts: dict[int, str]) -> str:
+    """Resposta de _BATCH_RESPONSE_FORMAT com os textos por número do item."""
+    return json.dumps(
+        {"analyses": [{"id": index, "analysis": text} for index, text in texts.items()]}
+    )
+
+
+@pytest_asyncio.fixture
+async def analyzer():
+    """AIAnalyzer sem cache no Redis e com o cliente da IA mockado."""
+    cache = MagicMock()
+    cache.get_completion = AsyncMock(return_value=None)
+    cache.set_completion = AsyncMock()
+    cache.get_analysis_texts = AsyncMock(
+        side_effect=lambda _type, hashes: [None] * len(hashes)
+    )
+    cache.set_analysis_texts = AsyncMock()
+    with patch("src.services.ai_analyzer.prompt_cache", cache):
+        analyzer = AIAnalyzer()
+        analyzer.client = MagicMock()
+        yield analyzer
+        await analyzer.aclose()
+
+
+def _use_responses(analyzer: AIAnalyzer, batch, per_item):
+    """
+    Configura o cliente: ``batch`` responde à chamada em lote e ``per_item``
+    às chamadas individuais. Exceções são levantadas em vez de devolvidas.
+    """
+
+    async def create(**kwargs):
+        if kwargs["response_format"] == _BATCH_RESPONSE_FORMAT:
+            content = batch
+        else:
+            content = per_item(kwargs["messages"][-1]["content"])
+        if isinstance(content, Exception):
+            raise content
+        return _response(content)
+
+    analyzer.client.chat.completions.create = AsyncMock(side_effect=create)
+
+
+def _per_item_description(prompt: str) -> str:
+    """Resposta individual que identifica o item pelo prompt."""
+    product = "ARROZ" if "ARROZ" in prompt else "CAFE"
+    return json.dumps({"description": f"individual {product}"})
+
+
+class TestPriceAlertsBatch:
+    """Testes de _complete_batch pelos alertas de preço."""
+
+    @pytest.fixture
+    def invoice(self) -> Invoice:
+        return Invoice(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            issue_date=datetime(2026, 3, 15, 10, 0),
+            total_value=Decimal("43.00"),
+        )
+
+    @pytest.fixture
+    def items(self, invoice: Invoice) -> list[InvoiceItem]:
+        return [
+            InvoiceItem(
+                invoice_id=invoice.id,
+                description="ARROZ 5KG",
+                quantity=Decimal("1"),
+                unit_price=Decimal("30.00"),
+                total_price=Decimal("30.00"),
+            ),
+            InvoiceItem(
+                invoice_id=invoice.id,
+                description="CAFE 500G",
+                quantity=Decimal("1"),
+                unit_price=Decimal("13.00"),
+                total_price=Decimal("13.00"),
+            ),
+        ]
+
+    @pytest.fixture
+    def db(self):
+        # Histórico: ARROZ a R$ 20 (+50%) e CAFE a R$ 10 (+30%)
+        result = MagicMock()
+        result.tuples.return_value = [("ARROZ 5KG", 20.0, 3), ("CAFE 500G", 10.0, 4)]
+        db = MagicMock()
+        db.execute = AsyncMock(return_value=result)
+        return db
+
+    async def _alerts(self, analyzer, invoice, items, db) -> dict[str, str]:
+        alerts = await analyzer._detect_price_alerts(invoice, items, {}, db)
+        assert [alert.type for alert in alerts] == ["price_alert", "price_alert"]
+        return {alert.details["product"]: alert.description for alert in alerts}
+
+    @pytest.mark.asyncio
+    async def test_valid_json_uses_single_call(self, analyzer, invoice, items, db):
+        _use_responses(
+            analyzer, _batch({1: "lote ARROZ", 2: "lote CAFE"}), _per_item_description
+        )
+
+        descriptions = await self._alerts(analyzer, invoice, items, db)
+
+        assert descriptions == {"ARROZ 5KG": "lote ARROZ", "CAFE 500G": "lote CAFE"}
+        analyzer.client.chat.completions.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_partial_json_requests_missing_items(
+        self, analyzer, invoice, items, db
+    ):
+        _use_responses(analyzer, _batch({1: "lote ARROZ"}), _per_item_description)
+
+        descriptions = await self._alerts(analyzer, invoice, items, db)
+
+        assert descriptions == {
+            "ARROZ 5KG": "lote ARROZ",
+            "CAFE 500G": "individual CAFE",
+        }
+        # Lote + 1 chamada individual
+        assert analyzer.client.chat.completions.create.await_count == len(items)
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_requests_every_item(
+        self, analyzer, invoice, items, db
+    ):
+        _use_responses(analyzer, "isto não é JSON", _per_item_description)
+
+        descriptions = await self._alerts(analyzer, invoice, items, db)
+
+        assert descriptions == {
+            "ARROZ 5KG": "individual ARROZ",
+            "CAFE 500G": "individual CAFE",
+        }
+        assert analyzer.client.chat.completions.create.await_count == len(items) + 1
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_call_requests_every_item(
+        self, analyzer, invoice, items, db
+    ):
+        _use_responses(analyzer, RuntimeError("API fora do ar"), _per_item_description)
+
+        descriptions = await self._alerts(analyzer, invoice, items, db)
+
+        assert descriptions == {
+            "ARROZ 5KG": "individual ARROZ",
+            "CAFE 500G": "individual CAFE",
+        }
+
+    @pytest.mark.asyncio
+    async def test_raising_client_falls_back_to_fixed_text(
+        self, analyzer, invoice, items, db
+    ):
+        error = RuntimeError("API fora do ar")
+        _use_responses(analyzer, error, lambda _prompt: error)
+
+        descriptions = await self._alerts(analyzer, invoice, items, db)
+
+        assert descriptions == {
+            "ARROZ 5KG": (
+                "ARROZ 5KG está 50.0% acima do preço médio das suas últimas "
+                "3 compras."
+            ),
+            "CAFE 500G": (
+                "CAFE 500G está 30.0% acima do preço médio das suas últimas "
+                "4 compras."
+            ),
+        }
+
+
+class MemoryPromptCache:
+    """prompt_cache em memória, para testes que dependem de acertos no cache."""
+
+    def __init__(self):
+        self.completions: dict[str, str] = {}
+        self.analysis_texts: dict[tuple[str, str], str] = {}
+
+    async def get_completion(self, request_hash):
+        return self.completions.get(request_hash)
+
+    async def set_completion(self, request_hash, text):
+        self.completions[request_hash] = text
+
+    async def get_analysis_texts(self, analysis_type, hashes):
+        return [self.analysis_texts.get((analysis_type, h)) for h in hashes]
+
+    async def set_analysis_texts(self, analysis_type, texts):
+        for feature_hash, cached_text in texts.items():
+            self.analysis_texts[analysis_type, feature_hash] = cached_text
+
+
+class TestProfileAnalysesCache:
+    """Textos com valores do usuário não são reaproveitados entre usuários."""
+
+    @pytest.fixture
+    def echo_amounts(self, analyzer: AIAnalyzer) -> AIAnalyzer:
+        """A IA repete no texto (ou no JSON pedido) o primeiro valor em R$ do prompt."""
+
+        async def create(**kwargs):
+            prompt = kwargs["messages"][-1]["content"]
+            amount = re.search(r"R\$ ([\d.,]+)", prompt).group(1)
+            text = f"Valor: R$ {amount}"
+            if "response_format" in kwargs:
+                text = json.dumps({"description": text})
+            return _response(text)
+
+        analyzer.client.chat.completions.create = AsyncMock(side_effect=create)
+        return analyzer
+
+    @pytest.fixture
+    def invoice(self) -> Invoice:
+        return Invoice(user_id=uuid.uuid4(), issue_date=datetime(2026, 5, 10, 9, 0))
+
+    @pytest.mark.asyncio
+    async def test_budget_health_with_same_buckets_and_other_income(
+        self, echo_amounts, invoice
+    ):
+        # Mesmos percentuais (30% da renda, +7% sobre a média) e mesma família
+        descriptions = []
+        with patch("src.services.ai_analyzer.prompt_cache", MemoryPromptCache()):
+            for income in (5000.0, 8000.0):
+                analysis = await echo_amounts._analyze_budget_health(
+                    invoice,
+                    Profile(income, 2, 1, 2.7),
+                    MonthTotals(income * 0.3, income * 0.28, 5, 1, 2),
+                    None,
+                )
+                descriptions.append(analysis.description)
+
+        assert descriptions == ["Valor: R$ 5,000.00", "Valor: R$ 8,000.00"]
+
+    @pytest.mark.asyncio
+    async def test_per_capita_with_same_buckets_and_other_spending(
+        self, echo_amounts, invoice
+    ):
+        # Per capita na mesma faixa de R$ 100 e mesma variação (+25%)
+        descriptions = []
+        with patch("src.services.ai_analyzer.prompt_cache", MemoryPromptCache()):
+            for month_spent in (1350.0, 1380.0):
+                analysis = await echo_amounts._analyze_per_capita_spending(
+                    invoice,
+                    Profile(None, 2, 1, 2.7),
+                    MonthTotals(month_spent, month_spent / 1.25, 5, 1, 2),
+                    None,
+                )
+                descriptions.append(analysis.description)
+
+        assert descriptions == ["Valor: R$ 500.00", "Valor: R$ 511.11"]
+
+
+class TestPreviousMonthsBounds:
+    """Testes da janela dos 3 meses fechados anteriores à nota."""
+
+    @pytest.mark.parametrize(
+        ("issue_date", "first_month", "current_month"),
+        [
+            (
+                datetime(2026, 5, 10, 14, 30),
+                datetime(2026, 2, 1),
+                datetime(2026, 5, 1),
+            ),
+            (
+                datetime(2026, 3, 31, 23, 59, 59),
+                datetime(2025, 12, 1),
+                datetime(2026, 3, 1),
+            ),
+            (
+                datetime(2026, 1, 1, 0, 0),
+                datetime(2025, 10, 1),
+                datetime(2026, 1, 1),
+            ),
+        ],
+    )
+    def test_covers_exactly_three_closed_months(
+        self, issue_date, first_month, current_month
+    ):
+        assert AIAnalyzer._previous_months_bounds(issue_date) == (
+            first_month,
+            current_month,
+        )
+
+
+class TestMonthTotals:
+    """Testes de _month_totals contra o banco de teste."""
+
+    def _invoice(self, user: User, issue_date: datetime, total: str) -> Invoice:
+        return Invoice(
+            id=uuid.uuid4(),
+            user_id=user.id,
+            access_key=uuid.uuid4().hex.ljust(44, "0"),
+            number="1",
+            series="1",
+            issue_date=issue_date,
+            issuer_name="Mercado Teste",
+            issuer_cnpj="12345678000190",
+            invoice_type="NFC-e",
+            source="manual",
+            total_value=Decimal(total),
+        )
+
+    @pytest.mark.asyncio
+    async def test_prev_average_covers_three_closed_months(self, db_session):
+        user = await create_user(db_session)
+        other_user = await create_user(db_session)
+        invoice = self._invoice(user, datetime(2026, 5, 10, 9, 0), "40.00")
+        db_session.add_all(
+            [
+                invoice,
+                self._invoice(user, datetime(2026, 5, 3, 18, 0), "50.00"),
+                # Fora da janela: 4º mês anterior e outro usuário
+                self._invoice(user, datetime(2026, 1, 31, 20, 0), "1000.00"),
+                self._invoice(other_user, datetime(2026, 3, 10), "999.00"),
+                # Fevereiro (dois dias), março e abril
+                self._invoice(user, datetime(2026, 2, 1, 0, 0), "60.00"),
+                self._invoice(user, datetime(2026, 2, 20), "40.00"),
+                self._invoice(user, datetime(2026, 3, 15), "200.00"),
+                self._invoice(user, datetime(2026, 4, 30, 23, 59), "300.00"),
+            ]
+        )
+        await db_session.commit()
+        await db_session.execute(text("REFRESH MATERIALIZED VIEW mv_user_month_totals"))
+
+        analyzer = AIAnalyzer()
+        try:
+            totals = await analyzer._month_totals(invoice, db_session)
+        finally:
+            await analyzer.aclose()
+
+        # Média de fevereiro (100), março (200) e abril (300)
+        assert totals.prev_average == pytest.approx(200.0)
+        assert totals.month_spent == pytest.approx(90.0)
+        assert (totals.invoice_count, totals.small_purchase_count) == (2, 1)
+
+
+    @pytest.mark.asyncio
+    async def test_refresh_skips_while_another_process_holds_the_lock(self):
+        sessions = async_sessionmaker(test_engine)
+        with patch("src.tasks.refresh_month_totals.AsyncSessionLocal", sessions):
+            async with sessions() as other:
+                await other.execute(
+                    select(func.pg_advisory_xact_lock(_REFRESH_LOCK_KEY))
+                )
+                assert await refresh_user_month_totals() is False
+            assert await refresh_user_month_totals() is True
+
+
+class TestAnalyzeInvoice:
+    """Falhas fora dos estágios não descartam as análises da nota."""
+
+    @pytest.mark.asyncio
+    async def test_month_totals_failure_keeps_invoice_analyses(
+        self, analyzer: AIAnalyzer
+    ):
+        invoice = Invoice(user_id=uuid.uuid4(), issue_date=datetime(2026, 5, 10))
+        invoice.items = []
+        price_alert = Analysis(user_id=invoice.user_id, type="price_alert")
+        budget_health = AsyncMock()
+        analyzer._invoice_analyses = [
+            ("price_alert", AsyncMock(return_value=price_alert), ("invoice",), None)
+        ]
+        analyzer._monthly_analyses = [
+            ("budget_health", budget_health, ("invoice", "month_totals"), None)
+        ]
+        analyzer._monthly_due[invoice.user_id] = True
+        analyzer._session_factory = contextlib.nullcontext
+        analyzer._month_totals = AsyncMock(
+            side_effect=RuntimeError('relation "mv_user_month_totals" does not exist')
+        )
+
+        analyses = await analyzer.analyze_invoice(invoice, {}, MagicMock())
+
+        assert analyses == [price_alert]
+        budget_health.assert_not_called()
+
+
+class TestAnalysisBatches:
+    """Testes dos lotes de análises mensais persistidos (analysis_batches)."""
+
+    @pytest.fixture
+    def batch_analyzer(self, analyzer: AIAnalyzer) -> AIAnalyzer:
+        analyzer._session_factory = async_sessionmaker(
+            test_engine, expire_on_commit=False
+        )
+        analyzer.client.files.create = AsyncMock(
+            return_value=SimpleNamespace(id="file-in")
+        )
+        analyzer.client.batches.create = AsyncMock(
+            return_value=SimpleNamespace(id="batch-1")
+        )
+        analyzer.client.chat.completions.create = AsyncMock(
+            return_value=_response(json.dumps({"description": "individual"}))
+        )
+        return analyzer
+
+    async def _pending_batch(
+        self,
+        db_session: AsyncSession,
+        user: User,
+        batch_id=None,
+        created_at=None,
+    ) -> AnalysisBatch:
+        """Lote com as análises budget_health e per_capita_spending."""
+        requests = [
+            (custom_id, {"messages": [{"role": "user", "content": custom_id}]})
+            for custom_id in ("budget_health-0", "per_capita_spending-1")
+        ]
+        analyses = [
+            AIAnalyzer._dump_analysis(
+                Analysis(
+                    type=custom_id.split("-")[0],
+                    priority="medium",
+                    title=f"Análise {custom_id}",
+                    description=custom_id,
+                    details={"custom_id": custom_id},
+                    reference_period_start=datetime(2026, 2, 1),
+                    reference_period_end=datetime(2026, 5, 10, 9, 0),
+                )
+            )
+            for custom_id, _ in requests
+        ]
+        batch = AnalysisBatch(
+            user_id=user.id,
+            batch_id=batch_id,
+            requests=[list(request) for request in requests],
+            analyses=analyses,
+            created_at=created_at or datetime.utcnow(),
+        )
+        db_session.add(batch)
+        await db_session.commit()
+        return batch
+
+    async def _batch_exists(
+        self, db_session: AsyncSession, batch: AnalysisBatch
+    ) -> bool:
+        result = await db_session.execute(
+            select(AnalysisBatch.id).where(AnalysisBatch.id == batch.id)
+        )
+        return result.scalar() is not None
+
+    async def _user_analyses(self, db_session: AsyncSession, user: User) -> dict:
+        result = await db_session.execute(
+            select(Analysis.type, Analysis.description).where(
+                Analysis.user_id == user.id
+            )
+        )
+        return dict(result.tuples().all())
+
+    @pytest.mark.asyncio
+    async def test_one_pending_batch_per_user(self, batch_analyzer, db_session):
+        user = await create_user(db_session)
+        for custom_id in ("budget_health-0", "shopping_frequency-0"):
+            analysis = Analysis(
+                type=custom_id.split("-")[0],
+                priority="low",
+                title="Análise",
+                description=custom_id,
+            )
+            await batch_analyzer._defer_monthly(
+                user.id, [analysis], [(custom_id, {"messages": []})], db_session
+            )
+            await db_session.commit()
+
+        result = await db_session.execute(
+            select(AnalysisBatch.requests).where(AnalysisBatch.user_id == user.id)
+        )
+        assert result.scalars().all() == [[["budget_health-0", {"messages": []}]]]
+
+    @pytest.mark.asyncio
+    async def test_unsubmitted_batch_is_sent(self, batch_analyzer, db_session):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(db_session, user)
+
+        await batch_analyzer._advance_batch(batch.id)
+
+        await db_session.refresh(batch)
+        assert batch.batch_id == "batch-1"
+        batch_analyzer.client.batches.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_running_batch_is_left_pending(self, batch_analyzer, db_session):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(db_session, user, batch_id="batch-1")
+        batch_analyzer.client.batches.retrieve = AsyncMock(
+            return_value=SimpleNamespace(
+                id="batch-1", status="in_progress", output_file_id=None
+            )
+        )
+
+        await batch_analyzer._advance_batch(batch.id)
+
+        assert await self._batch_exists(db_session, batch)
+        assert await self._user_analyses(db_session, user) == {}
+
+    @pytest.mark.asyncio
+    async def test_finished_batch_saves_analyses_and_removes_row(
+        self, batch_analyzer, db_session
+    ):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(db_session, user, batch_id="batch-1")
+        batch_analyzer.client.batches.retrieve = AsyncMock(
+            return_value=SimpleNamespace(
+                id="batch-1", status="completed", output_file_id="file-out"
+            )
+        )
+        # Só o primeiro pedido voltou do lote; o outro vai pelo fluxo normal
+        output = {
+            "custom_id": "budget_health-0",
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "choices": [
+                        {"message": {"content": json.dumps({"description": "lote"})}}
+                    ]
+                },
+            },
+        }
+        batch_analyzer.client.files.content = AsyncMock(
+            return_value=SimpleNamespace(text=json.dumps(output))
+        )
+
+        await batch_analyzer._advance_batch(batch.id)
+
+        assert not await self._batch_exists(db_session, batch)
+        assert await self._user_analyses(db_session, user) == {
+            "budget_health": "lote",
+            "per_capita_spending": "individual",
+        }
+        batch_analyzer.client.chat.completions.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_submit_releases_the_row(self, batch_analyzer, db_session):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(db_session, user)
+        batch_analyzer.client.batches.create = AsyncMock(
+            side_effect=RuntimeError("API fora do ar")
+        )
+
+        with pytest.raises(RuntimeError):
+            await batch_analyzer._advance_batch(batch.id)
+
+        await db_session.refresh(batch)
+        assert batch.batch_id is None
+
+    @pytest.mark.asyncio
+    async def test_row_is_not_locked_during_api_calls(
+        self, batch_analyzer, db_session
+    ):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(db_session, user, batch_id="batch-1")
+
+        async def retrieve(batch_id):
+            # Outra sessão consegue travar a linha enquanto a API responde
+            async with AsyncSession(test_engine) as other:
+                await other.execute(
+                    select(AnalysisBatch.id)
+                    .where(AnalysisBatch.id == batch.id)
+                    .with_for_update(nowait=True)
+                )
+            return SimpleNamespace(id=batch_id, status="failed", output_file_id=None)
+
+        batch_analyzer.client.batches.retrieve = AsyncMock(side_effect=retrieve)
+
+        await batch_analyzer._advance_batch(batch.id)
+
+        assert not await self._batch_exists(db_session, batch)
+        analyses = await self._user_analyses(db_session, user)
+        assert set(analyses.values()) == {"individual"}
+
+    @pytest.mark.asyncio
+    async def test_batch_completed_elsewhere_is_not_saved_again(
+        self, batch_analyzer, db_session
+    ):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(db_session, user, batch_id="batch-1")
+
+        async def retrieve(batch_id):
+            # Outra instância conclui o lote enquanto esta consulta a API
+            async with AsyncSession(test_engine) as other:
+                await other.execute(
+                    delete(AnalysisBatch).where(AnalysisBatch.id == batch.id)
+                )
+                await other.commit()
+            return SimpleNamespace(id=batch_id, status="failed", output_file_id=None)
+
+        batch_analyzer.client.batches.retrieve = AsyncMock(side_effect=retrieve)
+
+        await batch_analyzer._advance_batch(batch.id)
+
+        assert await self._user_analyses(db_session, user) == {}
+
+    @pytest.mark.asyncio
+    async def test_stale_batch_is_dropped(self, batch_analyzer, db_session):
+        user = await create_user(db_session)
+        batch = await self._pending_batch(
+            db_session,
+            user,
+            batch_id="batch-1",
+            created_at=datetime.utcnow() - timedelta(days=3),
+        )
+
+        await batch_analyzer._advance_batch(batch.id)
+
+        assert not await self._batch_exists(db_session, batch)
+        assert await self._user_analyses(db_session, user) == {}
+
+    @pytest.mark.asyncio
+    async def test_pending_batch_blocks_monthly_analyses(
+        self, batch_analyzer, db_session
+    ):
+        user = await create_user(db_session)
+        other_user = await create_user(db_session)
+        await self._pending_batch(db_session, user)
+
+        assert await batch_analyzer._should_run_monthly_analyses(
+            user.id, db_session
+        ) is False
+        assert await batch_analyzer._should_run_monthly_analyses(
+            other_user.id, db_session
+        ) is True
+
+    @pytest.mark.asyncio
+    async def test_stale_batch_does_not_block_monthly_analyses(
+        self, batch_analyzer, db_session
+    ):
+        user = await create_user(db_session)
+        await self._pending_batch(
+            db_session, user, created_at=datetime.utcnow() - timedelta(days=3)
+        )
+
+        assert await batch_analyzer._should_run_monthly_analyses(
+            user.id, db_session
+        ) is True
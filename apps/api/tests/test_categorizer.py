@@ -0,0 +1,226 @@
+"""Testes para o categorizador de itens (LLM substituído por um stub)."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.schemas.invoice_processing import ExtractedItem
+from src.services import categorizer
+from src.services.categorizer import (
+    _LOCAL_RULES,
+    _categorize_locally,
+    _match_local_rule,
+    categorize_items,
+)
+
+
+class FakeLLM:
+    """Stub de ChatOpenAI: guarda os prompts e responde com ``categories``.
+
+    ``content`` substitui a resposta inteira; ``error`` é levantado.
+    """
+
+    def __init__(self, categories=None, error=None, content=None):
+        self.content = content or json.dumps({"items": categories or []})
+        self.error = error
+        self.prompts: list[str] = []
+        self.response_formats: list[dict] = []
+
+    async def ainvoke(self, messages, response_format=None):
+        self.prompts.append(messages[0].content)
+        self.response_formats.append(response_format)
+        if self.error:
+            raise self.error
+        return SimpleNamespace(content=self.content)
+
+
+@pytest.fixture
+def use_llm(monkeypatch):
+    """Instala um FakeLLM no lugar de _get_categorization_llm."""
+
+    def install(llm):
+        monkeypatch.setattr(categorizer, "_get_categorization_llm", lambda: llm)
+        return llm
+
+    return install
+
+
+def _items(count: int, prefix: str = "PRODUTO") -> list[ExtractedItem]:
+    """Itens que nenhuma regra local cobre (vão todos ao LLM)."""
+    return [ExtractedItem(description=f"{prefix} DESCONHECIDO {i}") for i in range(count)]
+
+
+class TestLlmCall:
+    """Só os itens sem regra local vão ao LLM, numa única chamada."""
+
+    @pytest.mark.asyncio
+    async def test_locally_categorized_items_skip_the_llm(self, use_llm):
+        llm = use_llm(FakeLLM())
+        items = [ExtractedItem(description="ARROZ TIPO 1 5KG"), *_items(1)]
+
+        await categorize_items(items)
+
+        assert items[0].category_name == "Mercearia"
+        (prompt,) = llm.prompts
+        assert "ARROZ" not in prompt
+        assert "0: PRODUTO DESCONHECIDO 0" in prompt
+        assert llm.response_formats == [{"type": "json_object"}]
+
+    @pytest.mark.asyncio
+    async def test_fully_local_invoice_makes_no_call(self, use_llm):
+        llm = use_llm(FakeLLM())
+
+        await categorize_items([ExtractedItem(description="LEITE INTEGRAL 1L")])
+
+        assert llm.prompts == []
+
+
+class TestResponseMapping:
+    """Aplicação da resposta do LLM aos itens pelo índice."""
+
+    @pytest.mark.asyncio
+    async def test_index_selects_the_residual_item(self, use_llm):
+        use_llm(
+            FakeLLM(
+                [
+                    {"index": 1, "category_name": "B", "subcategory": "b"},
+                    {"index": 0, "category_name": "A", "subcategory": "a"},
+                ]
+            )
+        )
+        items = [*_items(1, "A"), ExtractedItem(description="ARROZ"), *_items(1, "B")]
+
+        await categorize_items(items)
+
+        assert [item.category_name for item in items] == ["A", "Mercearia", "B"]
+        assert [item.subcategory for item in items] == ["a", "Arroz", "b"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("entry", [{"index": 5}, {"index": -1}, {}])
+    async def test_out_of_range_entries_are_ignored(self, use_llm, entry):
+        use_llm(
+            FakeLLM(
+                [
+                    {**entry, "category_name": "Errada", "subcategory": "x"},
+                    {"index": 1, "category_name": "B", "subcategory": "b"},
+                ]
+            )
+        )
+        items = _items(2)
+
+        await categorize_items(items)
+
+        assert [item.category_name for item in items] == [None, "B"]
+
+
+class TestFailures:
+    """Falhas do LLM deixam os itens sem categoria, sem propagar."""
+
+    @pytest.mark.asyncio
+    async def test_failing_call_leaves_items_uncategorized(self, use_llm):
+        use_llm(FakeLLM(error=RuntimeError("API fora do ar")))
+        items = _items(2)
+
+        assert await categorize_items(items) is items
+        assert all(item.category_name is None for item in items)
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_leaves_items_uncategorized(self, use_llm):
+        use_llm(FakeLLM(content="isto não é JSON"))
+        items = _items(2)
+
+        assert await categorize_items(items) is items
+        assert all(item.category_name is None for item in items)
+
+    @pytest.mark.asyncio
+    async def test_no_llm_configured(self, use_llm):
+        use_llm(None)
+        items = _items(1)
+
+        await categorize_items(items)
+
+        assert items[0].category_name is None
+
+
+class TestLocalRules:
+    """Regras locais (_LOCAL_RULES): acertos e descrições que devem ir ao LLM."""
+
+    @pytest.mark.parametrize(
+        ("description", "category", "subcategory"),
+        [
+            ("LEITE INTEGRAL 1L", "Laticínios", "Leite"),
+            ("LEITE COND MOCOCA 395G", "Laticínios", "Leite Condensado"),
+            ("CREME DE LEITE 200G", "Laticínios", "Creme de Leite"),
+            ("REQUEIJÃO CREMOSO", "Laticínios", "Requeijão"),
+            ("PEITO DE FRANGO KG", "Carnes e Aves", "Frango"),
+            ("CONTRA FILE KG", "Carnes e Aves", "Carne Bovina"),
+            ("SALMÃO FILE", "Carnes e Aves", "Peixes"),
+            ("SALSICHA HOT DOG", "Frios", "Salsicha"),
+            ("AGUA MINERAL 500ML", "Bebidas", "Águas"),
+            ("ÁGUA SANITÁRIA 2L", "Limpeza", "Água Sanitária"),
+            ("pão francês kg", "Padaria", "Pães"),
+            ("MAÇÃ GALA KG", "Hortifruti", "Frutas"),
+            ("MELANCIA KG", "Hortifruti", "Frutas"),
+            ("tomate italiano", "Hortifruti", "Legumes"),
+            ("BATATA INGLESA KG", "Hortifruti", "Legumes"),
+            ("arroz branco tipo 1", "Mercearia", "Arroz"),
+            ("FEIJÃO CARIOCA 1KG", "Mercearia", "Feijão"),
+            ("AÇÚCAR REFINADO 1KG", "Mercearia", "Açúcar"),
+            ("EXTRATO DE TOMATE", "Mercearia", "Molhos"),
+            ("SABAO EM PO 1KG", "Limpeza", "Sabão em Pó"),
+            ("SACO P/ LIXO 50L", "Limpeza", "Sacos de Lixo"),
+            ("PAPEL HIGIÊNICO 12 ROLOS", "Higiene Pessoal", "Papel Higiênico"),
+            ("CHOCOLATE AO LEITE", "Snacks", "Chocolates"),
+            ("MEL SILVESTRE", "Matinais", "Mel"),
+            ("  Leite Desnatado  ", "Laticínios", "Leite"),
+        ],
+    )
+    def test_hits(self, description, category, subcategory):
+        match = _match_local_rule(description)
+
+        assert match is not None
+        assert _LOCAL_RULES[int(match.lastgroup[1:])][1:] == (category, subcategory)
+
+    @pytest.mark.parametrize(
+        "description",
+        [
+            "LEITE DE COCO 200ML",
+            "LEITE COCO 200ML",
+            "LEITE INFANTIL NAN 800G",
+            "POLPA DE TOMATE",
+            "DOCE DE LEITE 400G",
+            "BATATA PALHA 100G",
+            "BATATA FRITA CONGELADA",
+            "CHOCOLATE EM PO 200G",
+            "TOMATE PELADO LATA",
+            "FRANGO EMPANADO",
+            "BALANCA DIGITAL",
+            "MELITTA CAFE 500G",
+            "COCA COLA 2L",
+            "PAO DE QUEIJO",
+            "",
+            None,
+        ],
+    )
+    def test_misses(self, description):
+        assert _match_local_rule(description) is None
+
+    def test_categorize_locally_returns_residual_items(self):
+        items = [
+            ExtractedItem(description="ARROZ TIPO 1"),
+            # normalized_name tem prioridade sobre a descrição abreviada
+            ExtractedItem(description="CX BOMBOM", normalized_name="Chocolate sortido"),
+            ExtractedItem(description="COCA COLA 2L"),
+            ExtractedItem(),
+        ]
+
+        residual = _categorize_locally(items)
+
+        assert residual == items[2:]
+        assert [(item.category_name, item.subcategory) for item in items] == [
+            ("Mercearia", "Arroz"),
+            ("Snacks", "Chocolates"),
+            (None, None),
+            (None, None),
+        ]
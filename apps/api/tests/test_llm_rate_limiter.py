@@ -0,0 +1,57 @@
+"""Testes para o limitador de taxa das chamadas de chat da IA."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.services.llm_rate_limiter import RateLimitedOpenAI, TokenBucket
+
+
+class TestTokenBucket:
+    """Testes para TokenBucket."""
+
+    def test_starts_full(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(60) == 0
+
+    def test_wait_time_after_consume(self):
+        bucket = TokenBucket(60)
+        bucket.consume(60)
+        # 1 token por segundo
+        assert 0.9 < bucket.wait_time(1) <= 1.0
+
+    def test_request_larger_than_capacity_is_capped(self):
+        bucket = TokenBucket(10)
+        assert bucket.wait_time(1000) == 0
+
+
+class TestRateLimitedOpenAI:
+    """Testes para RateLimitedOpenAI."""
+
+    def test_estimate_tokens(self):
+        kwargs = {
+            "messages": [
+                {"role": "system", "content": "a" * 40},
+                {"role": "user", "content": "b" * 80},
+            ],
+            "max_tokens": 300,
+        }
+        assert RateLimitedOpenAI.estimate_tokens(kwargs) == 330
+
+    def test_delegates_other_attributes(self):
+        client = MagicMock()
+        limited = RateLimitedOpenAI(client, 60, 1000)
+        assert limited.batches is client.batches
+
+    @pytest.mark.asyncio
+    async def test_create_delegates_to_client(self):
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(return_value="ok")
+        limited = RateLimitedOpenAI(client, 60, 1000)
+
+        result = await limited.chat.completions.create(
+            model="m", messages=[{"role": "user", "content": "oi"}], max_tokens=10
+        )
+
+        assert result == "ok"
+        client.chat.completions.create.assert_awaited_once()
@@ -88,6 +88,7 @@ export interface UserActivityResponse {
   page: number;
   per_page: number;
   pages: number;
+  next_cursor: string | null;
 }
 
 // Dashboard Stats